@@ -1,41 +1,146 @@
-from flask import Flask, render_template, request, jsonify, session
+from flask import Flask, render_template, request, jsonify, session, g
 from flask_socketio import SocketIO, emit, join_room as sio_join_room, leave_room as sio_leave_room
+import os
 import uuid
+import logging
+import functools
 import time
-from copy import deepcopy
+import random
+import base64
+import hashlib
+import threading
+import atexit
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 import numpy as np # For matrix operations
-from pymcdm.methods import TOPSIS
-# If you needed a specific normalization from pymcdm, you'd import it like:
-# from pymcdm.normalizations import vector_normalization 
+import decision_engine
+from rating_matrix import RatingMatrix
+from room_journal import RoomJournal
+from room_store import create_room_store
+from catalog import load_catalog
+from serializers import WIRE_FORMATS, FastJSON, FastJSONProvider, encode_payload, negotiate_wire_format, payload_size
+from instrumentation import MetricsRegistry, SlowRequestProfiler, configure_logging, log_event
 
 app = Flask(__name__)
+app.json = FastJSONProvider(app) # orjson-backed jsonify when installed
 app.config['SECRET_KEY'] = 'your_very_secret_key_here!' # Important for session and SocketIO
-socketio = SocketIO(app, cors_allowed_origins="*") # Allow all origins for demo
+app.config['DECISION_METHODS'] = ['scoring', 'topsis'] # Any of decision_engine.DECISION_METHODS, shown in this order
+app.config['DECISION_WORKERS'] = 2 # Worker pool size for decision computation
+app.config['DECISION_PROCESS_POOL_MIN_CELLS'] = 250_000 # items x members from which jobs go to a process pool instead of threads
+app.config['DECISION_CACHE_SIZE'] = 256 # Finished decisions kept in the LRU, keyed by rating matrix + methods
+app.config['BROADCAST_COALESCE_WINDOW_MS'] = 75 # Room patches are flushed at most once per window, 0 = emit immediately
+app.config['ROOM_STORE'] = os.environ.get('ROOM_STORE', 'memory') # 'memory' or 'sqlite:///<dir>' shared by all worker processes
+app.config['ROOM_STORE_SHARDS'] = 4 # Shard files of a shared store, rooms are assigned by a hash of the room ID
+app.config['SOCKETIO_MESSAGE_QUEUE'] = os.environ.get('SOCKETIO_MESSAGE_QUEUE') # e.g. redis://localhost:6379/0, needed to broadcast across workers
+app.config['ROOM_BATCH_MAX_ACTIONS'] = 500 # Largest action list accepted by room_batch
+app.config['MEMBER_DISCONNECT_GRACE_S'] = 30 # A member whose last socket disconnected is removed after this long unless they reconnect
+app.config['ROOM_IDLE_TTL_S'] = 6 * 3600 # Rooms without any update for this long are closed
+app.config['ROOM_SWEEP_INTERVAL_S'] = 10 # How often disconnected members and idle rooms are swept
+app.config['MAX_ROOMS'] = 10_000 # Room count cap, the least recently updated rooms are evicted beyond it
+app.config['ROOM_JOURNAL_DIR'] = os.environ.get('ROOM_JOURNAL_DIR', os.path.join(app.root_path, 'data')) # Journal + snapshot location, empty = rooms are not persisted
+app.config['ROOM_JOURNAL_FSYNC_MS'] = 50 # Journal records are written and fsynced in batches at most this often
+app.config['ROOM_JOURNAL_COMPACT_EVERY'] = 5000 # Journal records between two snapshots
+app.config['CATALOG_FILE'] = os.environ.get('CATALOG_FILE', os.path.join(app.root_path, 'catalog_items.json')) # .json list or .jsonl of { id, name, category, type }
+app.config['CATALOG_SEARCH_CACHE_SIZE'] = 1024 # Hot search queries kept in the LRU
+app.config['CATALOG_SEARCH_PAGE_SIZE'] = 20 # Default results per page
+app.config['CATALOG_SEARCH_MAX_PAGE_SIZE'] = 100
+app.config['LOG_LEVEL'] = os.environ.get('LOG_LEVEL', 'INFO') # DEBUG adds every broadcast and socket join, OFF disables logging
+app.config['LOG_JSON'] = True # JSON lines, False = key=value text
+app.config['LOG_SAMPLE_RATE'] = 1.0 # Fraction of high-volume records (broadcasts, joins, connects) kept
+app.config['WIRE_FORMAT_MSGPACK'] = os.environ.get('WIRE_FORMAT_MSGPACK') == '1' # 1 = offer binary msgpack room updates (needs the msgpack package, the page then loads the browser decoder)
+app.config['METRICS_ENABLED'] = True # Prometheus text on /metrics
+app.config['METRICS_PAYLOAD_SIZE_SAMPLE_RATE'] = 0.01 # Fraction of JSON emits whose size is measured (a second encode) and scaled up into an estimated bytes total; binary emits are always measured
+app.config['PROFILE_SLOW_REQUEST_MS'] = float(os.environ.get('PROFILE_SLOW_REQUEST_MS', 0)) # cProfile dump of requests/socket events slower than this, 0 = off (profiling costs while on)
+app.config['PROFILE_DIR'] = os.environ.get('PROFILE_DIR', os.path.join(app.root_path, 'profiles'))
+socketio = SocketIO(app, cors_allowed_origins="*", message_queue=app.config['SOCKETIO_MESSAGE_QUEUE'], json=FastJSON) # Allow all origins for demo
 
-# --- In-memory data storage (for demo purposes) ---
-rooms_data = {}
+# --- Instrumentation ---
+logger = configure_logging('decider', app.config['LOG_LEVEL'], app.config['LOG_JSON'], app.config['LOG_SAMPLE_RATE'])
+metrics = MetricsRegistry(app.config['METRICS_ENABLED'])
+HTTP_LATENCY = metrics.histogram('decider_http_request_duration_seconds', "HTTP request latency by route", ('method', 'route', 'status'))
+SOCKET_EVENT_LATENCY = metrics.histogram('decider_socketio_event_duration_seconds', "Socket.IO event handler latency", ('event',))
+ROOM_ACTION_LATENCY = metrics.histogram('decider_room_action_duration_seconds', "Room action latency over REST and Socket.IO", ('action',))
+BROADCAST_LATENCY = metrics.histogram('decider_room_broadcast_duration_seconds', "Time to build and emit one room flush")
+BROADCASTS = metrics.counter('decider_room_broadcasts_total', "Room flushes that emitted ops")
+BROADCAST_OPS = metrics.counter('decider_room_broadcast_ops_total', "Ops sent in room patches")
+EMITS = metrics.counter('decider_socketio_emits_total', "Room payload emits, one per channel or SID", ('event', 'format'))
+EMITTED_BYTES = metrics.counter('decider_socketio_emitted_bytes_total', "Encoded room payload bytes per emit, not multiplied by recipients (JSON formats estimated from a sample)", ('event', 'format'))
+PAYLOAD_BYTES = metrics.histogram('decider_socketio_payload_bytes', "Encoded room payload size per emit (every binary emit, a sample of JSON ones), not multiplied by recipients",
+                                  ('event', 'format'), buckets=(256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304))
+DECISION_LATENCY = metrics.histogram('decider_decision_duration_seconds', "Decision computation time per method ('engine' = the shared engine evaluation)", ('method',))
+DECISION_JOB_LATENCY = metrics.histogram('decider_decision_job_duration_seconds', "Finalize to decision result, including time queued in the pool")
+CONNECTED_SOCKETS = metrics.gauge('decider_connected_sockets', "Connected Socket.IO clients")
+metrics.gauge('decider_live_rooms', "Rooms in the room store", function=lambda: len(room_store))
+metrics.gauge('decider_live_members', "Members across all rooms", function=lambda: sum(len(room['members']) for _, room in room_store.items())) # Decodes every room with a shared store
+metrics.gauge('decider_room_sockets', "Sockets subscribed to a room", function=lambda: len(socket_wire_formats))
+slow_request_profiler = SlowRequestProfiler(app.config['PROFILE_SLOW_REQUEST_MS'], app.config['PROFILE_DIR'], logger)
+
+@app.before_request
+def start_request_timing():
+    g.request_started = time.perf_counter()
+    g.request_profile = slow_request_profiler.start()
+
+@app.after_request
+def record_request_timing(response):
+    route = request.url_rule.rule if request.url_rule else 'unmatched' # Route templates keep label cardinality bounded
+    if 'request_started' in g:
+        HTTP_LATENCY.observe(time.perf_counter() - g.request_started, method=request.method, route=route, status=response.status_code)
+    slow_request_profiler.stop(g.pop('request_profile', None), f"{request.method} {route}")
+    return response
+
+def socket_event(event):
+    # socketio.on() with a latency histogram and slow-event profiling
+    def decorator(handler):
+        @functools.wraps(handler)
+        def instrumented(*args):
+            with SOCKET_EVENT_LATENCY.time(event=event), slow_request_profiler.profile(f"sio {event}"):
+                return handler(*args)
+        return socketio.on(event)(instrumented)
+    return decorator
+
+def msgpack_enabled():
+    return app.config['WIRE_FORMAT_MSGPACK'] and 'msgpack' in WIRE_FORMATS
+
+def count_emit(event, wire_format, data):
+    EMITS.inc(event=event, format=wire_format)
+    if not metrics.enabled: return
+    # Binary payloads know their size; JSON ones are only encoded by the packet layer, so measuring costs an encode
+    if isinstance(data, (bytes, bytearray)):
+        size, weight = len(data), 1
+    else:
+        sample_rate = app.config['METRICS_PAYLOAD_SIZE_SAMPLE_RATE']
+        if random.random() >= sample_rate: return
+        size, weight = payload_size(data), 1 / sample_rate # Each sampled emit stands in for the ones skipped
+    EMITTED_BYTES.inc(size * weight, event=event, format=wire_format)
+    PAYLOAD_BYTES.observe(size, event=event, format=wire_format)
+
+# --- Data storage ---
+# Rooms live in room_store (see Room Storage below), an in-memory dict unless a shared store is configured
+room_pending_ops = {} # { room_id: [op, ...] } - versioned change events not yet broadcast
+dirty_rooms = set() # Rooms with pending ops waiting for the next scheduler flush
+broadcast_scheduler = {'task': None}
+background_tasks_lock = threading.Lock() # Background loops are started lazily, exactly once
+persistence = {'journal': None} # RoomJournal once init_room_persistence() ran
 # Example room structure:
-# rooms_data['ROOM-XYZ'] = {
+# room_store.get('ROOM-XYZ') == {
 #     'id': 'ROOM-XYZ',
 #     'name': 'Test Room',
 #     'host_id': 'user_abc',
 #     'host_name': 'Alice',
 #     'members': [{'id': 'user_abc', 'name': 'Alice'}],
-#     'private_items': {'user_abc': []}, # { user_id: [item_obj, ...] }
-#     'public_items': [], # [item_obj_with_ratings, ...]
+#     'private_items': {'user_abc': {}}, # { user_id: { unique_instance_id: item_obj } }, insertion ordered
+#     'public_items': [], # [item_obj, ...] - ratings live in rating_matrix, not on the items
+#     'indexes': new_room_indexes(), # Hash lookups kept in sync on every mutation, see index helpers below
+#     'rating_matrix': RatingMatrix(len(EMOTION_KEY_BY_CODE)), # int8 emotion codes, rows = public_items, columns = members
 #     'users_done_rating': [], # [user_id, ...]
-#     'final_decision_scoring': None,
-#     'final_decision_topsis': None
+#     'final_decisions': None, # [{ 'method', 'label', 'text', 'details', 'winner_id' }, ...] once everyone finalized
+#     'decision_job': None, # Token of the decision computation in flight; results carrying another token are stale
+#     'version': 0 # Bumped on every change event, clients use it to detect missed patches
 # }
 
-FAKE_DATA_ITEMS = [
-    {'id': 'p1', 'name': 'Eiffel Tower', 'category': 'Landmark', 'type': 'place'},
-    {'id': 'r1', 'name': 'Pizza Place Roma', 'category': 'Italian', 'type': 'restaurant'},
-    {'id': 'a1', 'name': 'Cinema City - Action Movie', 'category': 'Entertainment', 'type': 'activity'},
-    {'id': 'p2', 'name': 'Louvre Museum', 'category': 'Art', 'type': 'place'},
-    {'id': 'r2', 'name': 'Sushi Samba', 'category': 'Japanese', 'type': 'restaurant'},
-    {'id': 'a2', 'name': 'The Board Room Cafe', 'category': 'Games', 'type': 'activity'},
-]
+# Searchable catalog of places, restaurants and activities, loaded once at startup (see catalog.py)
+catalog = load_catalog(app.config['CATALOG_FILE'], app.config['CATALOG_SEARCH_CACHE_SIZE'])
 
 EMOTION_RATINGS_CONFIG = {
     'VERY_INTERESTED': {'emoji': '😍', 'score': 5, 'label': 'Very Interested'},
@@ -44,405 +149,1096 @@ EMOTION_RATINGS_CONFIG = {
     'NOT_INTERESTED':  {'emoji': '😕', 'score': -2, 'label': 'Not Interested'},
     'NOT_AT_ALL':      {'emoji': '😠', 'score': -5, 'label': 'Not Interested At All'}
 }
+# Ratings are stored as small integer codes: 0 = not rated, 1..N = EMOTION_RATINGS_CONFIG order
+EMOTION_KEY_BY_CODE = [None] + list(EMOTION_RATINGS_CONFIG)
+EMOTION_CODE_BY_KEY = {key: code for code, key in enumerate(EMOTION_KEY_BY_CODE) if key}
+EMOTION_SCORE_BY_CODE = np.array([0] + [cfg['score'] for cfg in EMOTION_RATINGS_CONFIG.values()], dtype=np.int8)
+# Per-code weights applied to each item's rating histogram to get the Scoring method aggregates
+_scores = EMOTION_SCORE_BY_CODE.astype(np.int64); _okay_score = EMOTION_RATINGS_CONFIG['OKAY']['score']
+POSITIVE_SCORE_BY_CODE = np.where(_scores > _okay_score, _scores, 0)
+NEGATIVE_SCORE_ABS_BY_CODE = np.where(_scores < _okay_score, -_scores, 0)
+DECISION_METHOD_LABELS = {
+    'scoring': 'Scoring Method', 'topsis': 'TOPSIS Method', 'borda': 'Borda Count',
+    'copeland': 'Copeland / Condorcet', 'vikor': 'VIKOR Compromise'
+}
+# Method arguments for decision_engine.evaluate(); the Scoring method counts these scores as VI / NIA
+DECISION_ENGINE_OPTIONS = {'scoring': {'best_score': EMOTION_RATINGS_CONFIG['VERY_INTERESTED']['score'],
+                                       'worst_score': EMOTION_RATINGS_CONFIG['NOT_AT_ALL']['score']}}
+PROVISIONAL_RANKING_SIZE = 5 # Entries of the live leaderboard shipped while rating is in progress
 
 # --- Helper Functions ---
 def generate_unique_id(prefix=""):
     return f"{prefix}{uuid.uuid4().hex[:6].upper()}"
 
-def get_room_or_abort(room_id):
-    room = rooms_data.get(room_id)
-    if not room:
-        return None 
+# --- Room Indexes ---
+# Every lookup on the request path goes through these instead of scanning members/items lists.
+def new_room_indexes():
+    return {
+        'members': {}, # member_id -> member
+        'public_by_id': {}, # unique_instance_id -> public item
+        'public_by_original_id': {}, # item_original_id -> public item
+        'public_host_names': {}, # lowercased name -> host-added public item
+        'private_by_original_id': {}, # user_id -> { item_original_id -> private item }
+        'private_name_counts': {}, # user_id -> { lowercased name -> count }
+    }
+
+def new_room(room_id, name, host_id, host_name):
+    return {
+        'id': room_id, 'name': name, 'host_id': host_id, 'host_name': host_name,
+        'members': [], 'private_items': {}, 'public_items': [],
+        'users_done_rating': [], 'final_decisions': None, 'decision_job': None,
+        'version': 0, 'rating_matrix': RatingMatrix(len(EMOTION_KEY_BY_CODE)), 'indexes': new_room_indexes()
+    }
+
+def add_member_to_room(room, member):
+    room['members'].append(member)
+    room['indexes']['members'][member['id']] = member
+    room['rating_matrix'].add_member(member['id'])
+    room['private_items'].setdefault(member['id'], {})
+    room['indexes']['private_by_original_id'].setdefault(member['id'], {})
+    room['indexes']['private_name_counts'].setdefault(member['id'], {})
+
+def remove_member_from_room(room, member_id):
+    # Returns whether the member had a ratings column, i.e. whether decisions over the matrix are now outdated
+    member = room['indexes']['members'].pop(member_id, None)
+    if member: room['members'].remove(member)
+    had_ratings = room['rating_matrix'].remove_member(member_id) # Their ratings leave with them
+    room['private_items'].pop(member_id, None)
+    room['indexes']['private_by_original_id'].pop(member_id, None)
+    room['indexes']['private_name_counts'].pop(member_id, None)
+    return had_ratings
+
+def find_private_duplicate(room, user_id, item_details):
+    # Catalog items are unique by item_original_id, custom ideas by case-insensitive name
+    if item_details.get('item_original_id'):
+        return item_details['item_original_id'] in room['indexes']['private_by_original_id'].get(user_id, {})
+    return room['indexes']['private_name_counts'].get(user_id, {}).get(item_details['name'].lower(), 0) > 0
+
+def add_private_item(room, user_id, item):
+    room['private_items'][user_id][item['unique_instance_id']] = item
+    if item.get('item_original_id'): room['indexes']['private_by_original_id'][user_id][item['item_original_id']] = item
+    name_counts = room['indexes']['private_name_counts'][user_id]
+    name_counts[item['name'].lower()] = name_counts.get(item['name'].lower(), 0) + 1
+
+def remove_private_item(room, user_id, item_instance_id):
+    item = room['private_items'].get(user_id, {}).pop(item_instance_id, None)
+    if not item: return None
+    if item.get('item_original_id'): room['indexes']['private_by_original_id'][user_id].pop(item['item_original_id'], None)
+    name_counts = room['indexes']['private_name_counts'][user_id]
+    name_counts[item['name'].lower()] -= 1
+    if not name_counts[item['name'].lower()]: del name_counts[item['name'].lower()]
+    return item
+
+def add_public_item(room, item):
+    room['public_items'].append(item)
+    room['rating_matrix'].add_item(item['unique_instance_id'])
+    room['indexes']['public_by_id'][item['unique_instance_id']] = item
+    if item.get('item_original_id'): room['indexes']['public_by_original_id'][item['item_original_id']] = item
+    if item.get('category') == 'Host Added': room['indexes']['public_host_names'][item['name'].lower()] = item
+
+def remove_public_item(room, item_instance_id):
+    item = room['indexes']['public_by_id'].pop(item_instance_id, None)
+    if not item: return None
+    # Matrix rows follow public_items, so the row number is the list position
+    del room['public_items'][room['rating_matrix'].item_index[item_instance_id]]
+    room['rating_matrix'].remove_item(item_instance_id)
+    if item.get('item_original_id'): room['indexes']['public_by_original_id'].pop(item['item_original_id'], None)
+    if item.get('category') == 'Host Added': room['indexes']['public_host_names'].pop(item['name'].lower(), None)
+    return item
+
+INTERNAL_ROOM_KEYS = ('rating_matrix', 'indexes', 'decision_job')
+
+def viewer_private_items(room, viewer_id, encode_item=dict):
+    # Private lists are only ever sent to their owner: { viewer_id: [item, ...] }, or {} for non-members
+    items = room['private_items'].get(viewer_id)
+    return {} if items is None else {viewer_id: [encode_item(item) for item in items.values()]}
+
+def serialize_room(room, viewer_id=None):
+    # JSON-safe view of a room for viewer_id: the rating matrix is expanded back into per-item { user_id: emotion_key } dicts
+    matrix = room['rating_matrix']
+    room_state = {k: v for k, v in room.items() if k not in INTERNAL_ROOM_KEYS}
+    room_state['provisional_ranking'] = provisional_ranking(room)
+    room_state['private_items'] = viewer_private_items(room, viewer_id)
+    room_state['public_items'] = [
+        dict(item, ratings={user_id: EMOTION_KEY_BY_CODE[code] for user_id, code in matrix.item_codes(item['unique_instance_id']).items()})
+        for item in room['public_items']
+    ]
+    return room_state
+
+# Compact wire format: items travel as value lists in ITEM_FIELDS order and ratings as integer codes
+ITEM_FIELDS = ('unique_instance_id', 'name', 'category', 'type', 'item_original_id', 'submitted_by')
+
+def compact_item(item):
+    return [item.get(field) for field in ITEM_FIELDS]
+
+def serialize_room_compact(room, viewer_id=None):
+    # Same content as serialize_room, but ratings are the raw code matrix (rows = public_items, columns = members)
+    room_state = {k: v for k, v in room.items() if k not in INTERNAL_ROOM_KEYS}
+    room_state.update(
+        format='compact', item_fields=ITEM_FIELDS, emotion_keys=EMOTION_KEY_BY_CODE,
+        provisional_ranking=provisional_ranking(room),
+        private_items=viewer_private_items(room, viewer_id, compact_item),
+        public_items=[compact_item(item) for item in room['public_items']],
+        rating_codes=room['rating_matrix'].view().tolist()
+    )
+    return room_state
+
+def compact_op(op):
+    if op['type'] == 'rating_set':
+        return {'v': op['v'], 'type': 'rating_set', 'item_id': op['item_id'], 'user_id': op['user_id'],
+                'code': EMOTION_CODE_BY_KEY.get(op['emotion_key'], 0)}
+    if 'item' in op: return dict(op, item=compact_item(op['item']))
+    return op
+
+def room_channel(room_id, wire_format):
+    # Sockets join one Socket.IO room per (room, wire format); 'json' keeps the plain room ID for older clients
+    return room_id if wire_format == 'json' else f"{room_id}|{wire_format}"
+
+def member_channel(room_id, user_id, wire_format):
+    # Per-member Socket.IO room for ops only that member may see; works across workers like the room channels
+    return f"{room_id}|{wire_format}|{user_id}"
+
+def channel_has_listeners(channel):
+    if app.config['SOCKETIO_MESSAGE_QUEUE']: return True # Listeners may be connected to another worker
+    return next(iter(socketio.server.manager.get_participants('/', channel)), None) is not None
+
+def emit_room_event(room_id, event, payload, compact_payload=None, member_id=None):
+    # Each payload is built and encoded once per wire format in use, not once per recipient.
+    # compact_payload is a callable so the compact form is only built when someone asked for it.
+    # member_id sends to that member's sockets only instead of the whole room.
+    compact = None
+    for wire_format in WIRE_FORMATS:
+        channel = room_channel(room_id, wire_format) if member_id is None else member_channel(room_id, member_id, wire_format)
+        if not channel_has_listeners(channel): continue
+        data = payload
+        if wire_format != 'json' and compact_payload:
+            if compact is None: compact = compact_payload()
+            data = compact
+        data = encode_payload(wire_format, data)
+        socketio.emit(event, data, room=channel)
+        count_emit(event, wire_format, data)
+
+# Private item ops only reach their owner; everyone else gets a bare version step so their sequence has no gap
+PRIVATE_OP_TYPES = {'private_item_added', 'private_item_removed'}
+
+def op_for_viewer(op, viewer_id):
+    if op['type'] in PRIVATE_OP_TYPES and op['user_id'] != viewer_id: return {'v': op['v'], 'type': 'private_hidden'}
+    return op
+
+def room_patch_payload(room_id, ops, wire_format):
+    if wire_format == 'json': return {'room_id': room_id, 'ops': ops}
+    return {'room_id': room_id, 'format': 'compact', 'ops': [compact_op(op) for op in ops]}
+
+def emit_room_patch(room_id, ops):
+    # Everyone gets one shared patch in which private ops are bare version steps. Owners get their own private
+    # ops on their member channel first (same emitter, so they arrive first on any worker) and the client puts
+    # them in place of the matching steps.
+    for owner in {op['user_id'] for op in ops if op['type'] in PRIVATE_OP_TYPES}:
+        own_ops = [op for op in ops if op['type'] in PRIVATE_OP_TYPES and op['user_id'] == owner]
+        emit_room_event(room_id, 'room_private_ops', room_patch_payload(room_id, own_ops, 'json'),
+                        lambda: room_patch_payload(room_id, own_ops, 'compact'), member_id=owner)
+    shared_ops = [op_for_viewer(op, None) for op in ops]
+    emit_room_event(room_id, 'room_patch', room_patch_payload(room_id, shared_ops, 'json'),
+                    lambda: room_patch_payload(room_id, shared_ops, 'compact'))
+
+LEADERBOARD_OP_TYPES = {'rating_set', 'public_item_added', 'public_item_removed', 'member_left'}
+
+def record_room_op(room, op_type, **op_data):
+    # Every mutation bumps the room version and queues a small change event for the next broadcast
+    room['version'] = room.get('version', 0) + 1
+    op = {'v': room['version'], 'type': op_type, **op_data}
+    room_pending_ops.setdefault(room['id'], []).append(op)
+    if op_type not in UNJOURNALED_OP_TYPES: journal_record({'room_id': room['id'], 'type': 'op', 'op': op})
+    return op
+
+def record_rating_status(room):
+    record_room_op(room, 'rating_status', users_done_rating=list(room.get('users_done_rating', [])),
+                   final_decisions=room.get('final_decisions'))
+
+def flush_room_broadcast(room_id):
+    # Sends only the change events queued since the last broadcast; clients that see a version gap resync via /state
+    with BROADCAST_LATENCY.time(), room_store.update(room_id) as room:
+        pending = room_pending_ops.get(room_id)
+        if room and pending and any(op['type'] in LEADERBOARD_OP_TYPES for op in pending):
+            # One leaderboard refresh per flush, not per click
+            record_room_op(room, 'provisional_ranking', ranking=provisional_ranking(room))
+        ops = room_pending_ops.pop(room_id, None)
+        if ops and room:
+            # Emitted under the room lock so concurrent flushes of one room reach clients in version order
+            emit_room_patch(room_id, ops)
+            BROADCASTS.inc(); BROADCAST_OPS.inc(len(ops))
+            log_event(logger, logging.DEBUG, 'room_broadcast', sampled=True, room_id=room_id, ops=len(ops), version=ops[-1]['v'])
+
+def broadcast_scheduler_loop():
+    # Background task: a burst of emoji clicks in one window turns into a single room_patch per room
+    while True:
+        socketio.sleep(app.config['BROADCAST_COALESCE_WINDOW_MS'] / 1000.0)
+        while dirty_rooms:
+            try: room_id = dirty_rooms.pop()
+            except KeyError: break # Flushed immediately by a request in the meantime
+            try: flush_room_broadcast(room_id)
+            except Exception: log_event(logger, logging.ERROR, 'room_broadcast_failed', exc_info=True, room_id=room_id)
+
+def broadcast_room_update(room_id, immediate=False):
+    # immediate=True is for phase changes (finalize/restart) that users should see without delay
+    if immediate or app.config['BROADCAST_COALESCE_WINDOW_MS'] <= 0:
+        dirty_rooms.discard(room_id)
+        flush_room_broadcast(room_id)
+        return
+    dirty_rooms.add(room_id)
+    with background_tasks_lock:
+        if broadcast_scheduler['task'] is None:
+            broadcast_scheduler['task'] = socketio.start_background_task(broadcast_scheduler_loop)
+
+# --- Persistence ---
+# Only used with the in-memory store; a shared room store is durable on its own.
+# The change events above describe every mutation with its generated ids, so they double as the
+# durable journal: record_room_op hands each one to the RoomJournal writer thread (a queue put, no I/O),
+# together with room creation/deletion records. On startup the last snapshot is loaded and the journal
+# tail is replayed through apply_room_op.
+UNJOURNALED_OP_TYPES = {'provisional_ranking'} # Derived from the ratings, recomputed on demand
+
+def journal_record(record):
+    held_back = batch_journal_records.get(record['room_id'])
+    if held_back is not None: held_back.append(record) # Inside a room_batch, see run_room_batch
+    elif persistence['journal']: persistence['journal'].append(record)
+
+def snapshot_room(room):
+    # JSON-safe copy of a room with the rating matrix as base64 int8 codes; indexes are rebuilt on load
+    matrix = room['rating_matrix']
+    data = {k: v for k, v in room.items() if k not in INTERNAL_ROOM_KEYS}
+    data['decision_job'] = room.get('decision_job')
+    data.update(members=list(room['members']), public_items=list(room['public_items']),
+                users_done_rating=list(room['users_done_rating']),
+                private_items={user_id: list(items.values()) for user_id, items in room['private_items'].items()})
+    data['rating_matrix'] = {
+        'item_ids': list(matrix.item_ids), 'member_ids': list(matrix.member_ids),
+        'codes': base64.b64encode(np.ascontiguousarray(matrix.view()).tobytes()).decode('ascii')
+    }
+    return data
+
+def snapshot_all_rooms():
+    # Each room is copied under its own lock, so every room in the snapshot is consistent with its version
+    rooms = {}
+    for room_id in room_store.room_ids():
+        with room_store.read(room_id) as room:
+            if room: rooms[room_id] = snapshot_room(room)
+    return rooms
+
+def room_from_snapshot(data):
+    room = new_room(data['id'], data['name'], data['host_id'], data['host_name'])
+    for member in data['members']: add_member_to_room(room, member)
+    for user_id, items in data['private_items'].items():
+        if user_id not in room['private_items']: continue
+        for item in items: add_private_item(room, user_id, item)
+    for item in data['public_items']: add_public_item(room, item)
+    saved = data['rating_matrix']
+    codes = np.frombuffer(base64.b64decode(saved['codes']), dtype=np.int8).reshape(len(saved['item_ids']), len(saved['member_ids']))
+    room['rating_matrix'].load(saved['item_ids'], saved['member_ids'], codes)
+    room['users_done_rating'] = list(data['users_done_rating'])
+    room['final_decisions'] = data['final_decisions']
+    room['decision_job'] = data.get('decision_job')
+    room['version'] = data['version']
     return room
 
-def broadcast_room_update(room_id):
-    room = get_room_or_abort(room_id)
-    if room:
-        socketio.emit('room_state_updated', {'room': deepcopy(room)}, room=room_id)
-        print(f"Broadcasted update for room {room_id}")
+def apply_room_op(room, op):
+    # Replays one journaled change event. Ops carry absolute state, and each branch is a no-op when the
+    # change is already in place, so an op that raced with the snapshot can safely be applied twice.
+    op_type, indexes, matrix = op['type'], room['indexes'], room['rating_matrix']
+    if op_type == 'member_joined':
+        if op['member']['id'] not in indexes['members']: add_member_to_room(room, dict(op['member']))
+    elif op_type == 'member_left':
+        remove_member_from_room(room, op['member_id'])
+        room['host_id'], room['host_name'] = op['host_id'], op['host_name']
+    elif op_type == 'private_item_added':
+        items = room['private_items'].get(op['user_id'])
+        if items is not None and op['item']['unique_instance_id'] not in items: add_private_item(room, op['user_id'], dict(op['item']))
+    elif op_type == 'private_item_removed':
+        remove_private_item(room, op['user_id'], op['item_id'])
+    elif op_type == 'public_item_added':
+        if op['item']['unique_instance_id'] not in indexes['public_by_id']:
+            add_public_item(room, {k: v for k, v in op['item'].items() if k != 'ratings'})
+    elif op_type == 'public_item_removed':
+        remove_public_item(room, op['item_id'])
+    elif op_type == 'rating_set':
+        if op['item_id'] in matrix.item_index and op['user_id'] in matrix.member_index:
+            matrix.set(op['item_id'], op['user_id'], EMOTION_CODE_BY_KEY.get(op['emotion_key'], 0))
+    elif op_type == 'rating_status':
+        room['users_done_rating'] = list(op['users_done_rating'])
+        room['final_decisions'] = op['final_decisions']
+    room['version'] = max(room['version'], op['v'])
+
+def restore_rooms(snapshot_rooms, records):
+    # Journal ops at or below a room's snapshot version are already in the snapshot
+    rooms, replay_after = {}, {}
+    for room_id, data in snapshot_rooms.items():
+        rooms[room_id] = room_from_snapshot(data); replay_after[room_id] = data['version']
+    for record in records:
+        room_id = record['room_id']
+        if record['type'] == 'room_created':
+            if room_id not in rooms:
+                rooms[room_id] = room_from_snapshot(record['room']); replay_after[room_id] = record['room']['version']
+        elif record['type'] == 'room_deleted':
+            rooms.pop(room_id, None)
+        elif room_id in rooms and record['op']['v'] > replay_after[room_id]:
+            apply_room_op(rooms[room_id], record['op'])
+    for room_id, room in rooms.items():
+        room_store.create(room)
+        # Decisions that were still being computed when the server stopped
+        if room['members'] and room['final_decisions'] is None and len(room['users_done_rating']) == len(room['members']):
+            calculate_final_decisions_for_room(room_id)
+    log_event(logger, logging.INFO, 'rooms_restored', rooms=len(rooms), snapshot_rooms=len(snapshot_rooms), journal_records=len(records))
+
+def init_room_persistence():
+    directory = app.config['ROOM_JOURNAL_DIR']
+    if not directory or room_store.shared or persistence['journal']: return
+    journal = RoomJournal(directory, snapshot_all_rooms,
+                          fsync_interval=app.config['ROOM_JOURNAL_FSYNC_MS'] / 1000.0,
+                          compact_every=app.config['ROOM_JOURNAL_COMPACT_EVERY'])
+    restore_rooms(*journal.load())
+    journal.start()
+    persistence['journal'] = journal
+    atexit.register(journal.close) # Flushes whatever is still queued
+
+# --- Room Storage ---
+# Shared stores hold rooms in the same encoded form as journal snapshots
+room_store = create_room_store(app.config['ROOM_STORE'], snapshot_room, room_from_snapshot, app.config['ROOM_STORE_SHARDS'])
 
 def reset_decisions_and_done_ratings(room):
-    room['final_decision_scoring'] = None
-    room['final_decision_topsis'] = None
+    clear_final_decisions(room)
     room['users_done_rating'] = []
+    record_rating_status(room)
 
 # --- Decision Logic ---
-def calculate_scoring_method_decision(room_state): # Takes a copy of room state
+def item_scoring_aggregates(room_state):
+    # Reads the running per-item rating histograms, so this is O(items) regardless of member count
+    counts = room_state['rating_matrix'].counts_view().astype(np.int64)
+    num_ratings = counts.sum(axis=1)
+    total_raw_score = counts @ _scores
+    return {
+        'sum_positive_scores': counts @ POSITIVE_SCORE_BY_CODE,
+        'sum_negative_scores_abs': counts @ NEGATIVE_SCORE_ABS_BY_CODE,
+        'count_nia': counts[:, EMOTION_CODE_BY_KEY['NOT_AT_ALL']],
+        'count_vi': counts[:, EMOTION_CODE_BY_KEY['VERY_INTERESTED']],
+        'num_ratings': num_ratings,
+        'avg_score': np.divide(total_raw_score, num_ratings, out=np.zeros(len(num_ratings)), where=num_ratings > 0),
+        'total_raw_score': total_raw_score,
+    }
+
+def rank_items_by_scoring(aggregates):
+    return decision_engine.scoring_order(aggregates['count_nia'], aggregates['count_vi'], aggregates['avg_score'], aggregates['total_raw_score'])
+
+def provisional_ranking(room):
+    # Live Scoring method leaderboard, available at any point during rating
+    if not room.get('public_items'): return []
+    aggregates = item_scoring_aggregates(room)
+    return [{
+        'item_id': room['public_items'][idx]['unique_instance_id'],
+        'name': room['public_items'][idx]['name'],
+        'avg_score': round(float(aggregates['avg_score'][idx]), 2),
+        'count_vi': int(aggregates['count_vi'][idx]), 'count_nia': int(aggregates['count_nia'][idx]),
+        'num_ratings': int(aggregates['num_ratings'][idx])
+    } for idx in rank_items_by_scoring(aggregates)[:PROVISIONAL_RANKING_SIZE]]
+
+def calculate_scoring_method_decision(room_state):
     if not room_state or not room_state.get('public_items'):
         return {"text": "No items for Scoring method.", "details": ""}
 
-    decision_candidates = []
-    for item_idx, item_data in enumerate(room_state['public_items']):
-        sum_positive_scores = 0
-        sum_negative_scores_abs = 0
-        count_nia = 0
-        count_vi = 0
-        num_ratings = 0
-        total_raw_score = 0
-        item_ratings = item_data.get('ratings', {})
-
-        for user_id, emotion_key in item_ratings.items():
-            if emotion_key in EMOTION_RATINGS_CONFIG:
-                score = EMOTION_RATINGS_CONFIG[emotion_key]['score']
-                total_raw_score += score
-                num_ratings += 1
-                if score > EMOTION_RATINGS_CONFIG['OKAY']['score']:
-                    sum_positive_scores += score
-                if score < EMOTION_RATINGS_CONFIG['OKAY']['score']:
-                    sum_negative_scores_abs += abs(score)
-                if emotion_key == 'NOT_AT_ALL':
-                    count_nia += 1
-                if emotion_key == 'VERY_INTERESTED':
-                    count_vi += 1
-        
-        decision_candidates.append({
-            'name': item_data['name'],
-            'unique_instance_id': item_data['unique_instance_id'],
-            'sum_positive_scores': sum_positive_scores,
-            'sum_negative_scores_abs': sum_negative_scores_abs,
-            'count_nia': count_nia,
-            'count_vi': count_vi,
-            'num_ratings': num_ratings,
-            'avg_score': total_raw_score / num_ratings if num_ratings > 0 else 0,
-            'total_raw_score': total_raw_score
-        })
-
-    if not decision_candidates:
-        return {"text": "No items were rated for Scoring method.", "details": ""}
-
-    decision_candidates.sort(key=lambda x: (
-        x['count_nia'], -x['count_vi'], -x['avg_score'], -x['total_raw_score']
-    ))
-    
-    winner = decision_candidates[0]
+    alternatives = room_state['public_items']
+    aggregates = item_scoring_aggregates(room_state)
+    avg_score, count_vi, count_nia = aggregates['avg_score'], aggregates['count_vi'], aggregates['count_nia']
+
+    winner_idx = rank_items_by_scoring(aggregates)[0]
+    winner = alternatives[winner_idx]
     decision_text = f"🏆 Top (Scoring Method): {winner['name']}"
     decision_details = (
         f"Prioritizes minimizing strong dislikes, then maximizing high interest.<br>"
-        f"Avg Score: {winner['avg_score']:.2f}, VI: {winner['count_vi']}, NIA: {winner['count_nia']}."
+        f"Avg Score: {avg_score[winner_idx]:.2f}, VI: {count_vi[winner_idx]}, NIA: {count_nia[winner_idx]}."
     )
-    if winner['count_nia'] > 0:
+    if count_nia[winner_idx] > 0:
         decision_details += "<br><b>Warning (Scoring):</b> This choice has strong objection(s)."
     return {"text": decision_text, "details": decision_details, "winner_id": winner['unique_instance_id']}
 
-def calculate_topsis_decision(room_state): # Takes a copy of room state
+def room_decision_problem(room_state):
+    # Scores matrix for the decision engine: columns follow room members, unrated cells count as OKAY
+    codes = room_state['rating_matrix'].view()
+    rated = codes != 0
+    scores = np.where(rated, EMOTION_SCORE_BY_CODE[codes], EMOTION_RATINGS_CONFIG['OKAY']['score']).astype(float)
+    return codes, scores, rated
+
+def winner_rating_summary(codes, winner_idx):
+    winner_codes = codes[winner_idx]
+    winner_scores_values = EMOTION_SCORE_BY_CODE[winner_codes[winner_codes != 0]]
+    avg_winner_score = np.mean(winner_scores_values) if winner_scores_values.size else EMOTION_RATINGS_CONFIG['OKAY']['score']
+    return avg_winner_score, int(np.count_nonzero(winner_codes == EMOTION_CODE_BY_KEY['NOT_AT_ALL']))
+
+def calculate_topsis_decision(room_state, preferences=None):
     if not room_state or not room_state.get('public_items') or not room_state.get('members'):
         return {"text": "Not enough data for TOPSIS.", "details": ""}
 
     alternatives = room_state['public_items']
-    if not alternatives: return {"text": "No items for TOPSIS.", "details": ""}
-    
-    num_alternatives = len(alternatives)
-    num_criteria = len(room_state['members']) 
-    if num_criteria == 0: return {"text": "No members in room for TOPSIS.", "details": ""}
+    codes, scores, rated = room_decision_problem(room_state)
+    if preferences is None: preferences = decision_engine.evaluate(scores, rated, methods=['topsis'], options=DECISION_ENGINE_OPTIONS)['topsis']
 
-    decision_matrix = np.full((num_alternatives, num_criteria), float(EMOTION_RATINGS_CONFIG['OKAY']['score']))
-    member_id_to_idx = {member['id']: i for i, member in enumerate(room_state['members'])}
+    winner_idx = decision_engine.best_alternatives(preferences)
+    if winner_idx < 0:
+        details_str = "TOPSIS could not separate the items."
+        if np.all(scores == scores[0, 0]):
+             details_str = "All ratings in the decision matrix are identical. TOPSIS cannot rank."
+        return {"text": "TOPSIS calculation failed.", "details": f"Error: {details_str}"}
 
-    for alt_idx, item_data in enumerate(alternatives):
-        item_ratings = item_data.get('ratings', {})
-        for user_id, emotion_key in item_ratings.items():
-            if user_id in member_id_to_idx and emotion_key in EMOTION_RATINGS_CONFIG:
-                crit_idx = member_id_to_idx[user_id]
-                decision_matrix[alt_idx, crit_idx] = float(EMOTION_RATINGS_CONFIG[emotion_key]['score'])
+    winner_item = alternatives[winner_idx]
+    avg_winner_score, count_nia_winner = winner_rating_summary(codes, winner_idx)
 
-    weights = np.full(num_criteria, 1.0 / num_criteria)
-    types = np.ones(num_criteria) # All criteria are benefit (higher score is better)
+    decision_text = f"🏅 Top (TOPSIS Method): {winner_item['name']}"
+    decision_details = (
+        f"Selected as closest to the 'ideal group preference' and farthest from 'worst-case'.<br>"
+        f"Avg Score (approx for winner): {avg_winner_score:.2f}, NIA count for winner: {count_nia_winner}."
+    )
+    if count_nia_winner > 0:
+         decision_details += "<br><b>Note (TOPSIS):</b> This choice might still have strong objection(s), but was mathematically optimal given the ratings."
 
-    try:
-        topsis = TOPSIS() # Uses default vector normalization
-        pref = topsis(decision_matrix, weights, types) 
-        ranking = topsis.rank(pref) 
-
-        winner_idx_arr = np.where(ranking == 1)[0]
-        if len(winner_idx_arr) == 0:
-            return {"text": "TOPSIS Error: No winner found from ranking.", "details": "This can happen with unusual data."}
-        winner_idx = winner_idx_arr[0]
-        
-        winner_item = alternatives[winner_idx]
-        
-        winner_ratings_obj = winner_item.get('ratings', {})
-        winner_scores_values = [EMOTION_RATINGS_CONFIG[ek]['score'] for ek in winner_ratings_obj.values() if ek in EMOTION_RATINGS_CONFIG]
-        avg_winner_score = np.mean(winner_scores_values) if winner_scores_values else EMOTION_RATINGS_CONFIG['OKAY']['score']
-        count_nia_winner = sum(1 for emotion_key in winner_ratings_obj.values() if emotion_key == 'NOT_AT_ALL')
+    return {"text": decision_text, "details": decision_details, "winner_id": winner_item['unique_instance_id']}
+
+def calculate_engine_method_decision(room_state, method, preferences):
+    # Borda / Copeland / VIKOR and any other engine method without a hand-written description
+    label = DECISION_METHOD_LABELS.get(method, method)
+    if preferences is None: return {"text": f"Not enough data for {label}.", "details": ""}
+    winner_idx = decision_engine.best_alternatives(preferences)
+    if winner_idx < 0: return {"text": f"{label} calculation failed.", "details": "Error: The ratings do not separate the items."}
+
+    winner_item = room_state['public_items'][winner_idx]
+    codes, _, _ = room_decision_problem(room_state)
+    avg_winner_score, count_nia_winner = winner_rating_summary(codes, winner_idx)
+    decision_details = f"Avg Score (approx for winner): {avg_winner_score:.2f}, NIA count for winner: {count_nia_winner}."
+    if count_nia_winner > 0:
+        decision_details += f"<br><b>Note ({label}):</b> This choice has strong objection(s)."
+    return {"text": f"🥇 Top ({label}): {winner_item['name']}", "details": decision_details, "winner_id": winner_item['unique_instance_id']}
+
+def calculate_decisions(room_state, methods, timings=None):
+    # All engine-backed methods are evaluated together in one vectorized call; Scoring uses the running aggregates.
+    # timings, if given, collects seconds per method ('engine' for the shared evaluation)
+    timings = {} if timings is None else timings
+    engine_methods = [m for m in methods if m != 'scoring']
+    preferences = {}
+    if engine_methods and room_state.get('public_items') and room_state.get('members'):
+        start = time.perf_counter()
+        _, scores, rated = room_decision_problem(room_state)
+        preferences = decision_engine.evaluate(scores, rated, methods=engine_methods, options=DECISION_ENGINE_OPTIONS)
+        timings['engine'] = time.perf_counter() - start
+
+    decisions = []
+    for method in methods:
+        start = time.perf_counter()
+        if method == 'scoring': result = calculate_scoring_method_decision(room_state)
+        elif method == 'topsis': result = calculate_topsis_decision(room_state, preferences.get('topsis'))
+        else: result = calculate_engine_method_decision(room_state, method, preferences.get(method))
+        timings[method] = time.perf_counter() - start
+        decisions.append({'method': method, 'label': DECISION_METHOD_LABELS.get(method, method), **result})
+    return decisions
+
+def run_decision_job(room_state, methods):
+    # Pool entry point; timings travel back with the result because process pool workers have their own metrics
+    timings = {}
+    return calculate_decisions(room_state, methods, timings), timings
+
+# --- Decision Jobs ---
+# Decisions are computed on a worker pool so a large room never blocks the SocketIO loop for the others.
+# Finished results are cached by a hash of everything they depend on, so restart + identical re-finalize
+# (or repeated finalizes) are answered instantly.
+decision_cache = OrderedDict() # cache key -> final_decisions, least recently used first
+decision_cache_lock = threading.Lock()
+decision_pools = {}
+decision_pools_lock = threading.Lock()
+
+def decision_cache_key(room_state, methods):
+    codes = room_state['rating_matrix'].view()
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(np.ascontiguousarray(codes).tobytes())
+    digest.update(repr((codes.shape, tuple(methods), [(i['unique_instance_id'], i['name']) for i in room_state['public_items']])).encode())
+    return digest.hexdigest()
+
+def get_cached_decisions(key):
+    with decision_cache_lock:
+        if key not in decision_cache: return None
+        decision_cache.move_to_end(key)
+        return decision_cache[key]
 
-        decision_text = f"🏅 Top (TOPSIS Method): {winner_item['name']}"
-        decision_details = (
-            f"Selected as closest to the 'ideal group preference' and farthest from 'worst-case'.<br>"
-            f"Avg Score (approx for winner): {avg_winner_score:.2f}, NIA count for winner: {count_nia_winner}."
-        )
-        if count_nia_winner > 0:
-             decision_details += "<br><b>Note (TOPSIS):</b> This choice might still have strong objection(s), but was mathematically optimal given the ratings."
+def store_cached_decisions(key, decisions):
+    with decision_cache_lock:
+        decision_cache[key] = decisions
+        decision_cache.move_to_end(key)
+        while len(decision_cache) > app.config['DECISION_CACHE_SIZE']: decision_cache.popitem(last=False)
 
-        return {"text": decision_text, "details": decision_details, "winner_id": winner_item['unique_instance_id']}
+def get_decision_pool(num_cells):
+    kind = 'process' if num_cells >= app.config['DECISION_PROCESS_POOL_MIN_CELLS'] else 'thread'
+    with decision_pools_lock:
+        if kind not in decision_pools:
+            if kind == 'process':
+                # Forking this multithreaded server could copy a lock some other thread holds; workers start clean instead
+                start_method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+                decision_pools[kind] = ProcessPoolExecutor(max_workers=app.config['DECISION_WORKERS'], mp_context=multiprocessing.get_context(start_method))
+            else:
+                decision_pools[kind] = ThreadPoolExecutor(max_workers=app.config['DECISION_WORKERS'])
+        return decision_pools[kind]
 
+def decision_job_snapshot(room):
+    # Everything calculate_decisions reads, detached from the live room (and picklable for the process pool)
+    return {
+        'public_items': [{'unique_instance_id': i['unique_instance_id'], 'name': i['name']} for i in room['public_items']],
+        'members': [{'id': m['id']} for m in room['members']],
+        'rating_matrix': room['rating_matrix'].copy()
+    }
+
+def clear_final_decisions(room):
+    room['final_decisions'] = None
+    room['decision_job'] = None # Any result still in flight is now stale
+
+def finish_decision_job(room_id, token, cache_key, submitted_at, future):
+    DECISION_JOB_LATENCY.observe(time.perf_counter() - submitted_at)
+    try:
+        decisions, timings = future.result()
+        for method, seconds in timings.items(): DECISION_LATENCY.observe(seconds, method=method)
+        store_cached_decisions(cache_key, decisions)
     except Exception as e:
-        print(f"TOPSIS calculation error: {e}")
-        details_str = str(e)
-        # Check for common issues
-        if decision_matrix.shape[0] > 0 and np.all(decision_matrix == decision_matrix[0,0]):
-             details_str = "All ratings in the decision matrix are identical. TOPSIS cannot rank."
-        elif np.any(np.all(decision_matrix == 0, axis=0)): # A user rated everything 0 (if OKAY was 0)
-             details_str = "One or more users provided only neutral (zero value) ratings for all items. TOPSIS may struggle with this."
-        
-        return {"text": "TOPSIS calculation failed.", "details": f"Error: {details_str}"}
+        log_event(logger, logging.ERROR, 'decision_failed', exc_info=True, room_id=room_id)
+        decisions = [{'method': 'error', 'label': 'Decision', 'text': "Decision calculation failed.", 'details': f"Error: {e}"}]
+
+    with room_store.update(room_id) as room:
+        if not room or room.get('decision_job') != token:
+            log_event(logger, logging.DEBUG, 'stale_decision_discarded', room_id=room_id)
+            return
+        room['decision_job'] = None
+        room['final_decisions'] = decisions
+        record_rating_status(room)
+        # The callback runs inline when the job finished before it was attached; inside a room_batch the ops
+        # must wait for the batch to commit, which broadcasts them itself
+        if room_id not in batch_journal_records: broadcast_room_update(room_id, immediate=True)
 
 def calculate_final_decisions_for_room(room_id):
-    room = get_room_or_abort(room_id)
-    if not room: return
+    # Returns right away: cached results are applied inline, anything else is pushed to the room when ready
+    with room_store.update(room_id) as room:
+        if not room: return
 
-    if len(room.get('users_done_rating', [])) < len(room.get('members', [])):
-        room['final_decision_scoring'] = None 
-        room['final_decision_topsis'] = None
-        return
+        if len(room.get('users_done_rating', [])) < len(room.get('members', [])):
+            clear_final_decisions(room)
+            return
 
-    # Pass deep copies to prevent accidental modification of the main room state by calculation functions
-    room['final_decision_scoring'] = calculate_scoring_method_decision(deepcopy(room))
-    room['final_decision_topsis'] = calculate_topsis_decision(deepcopy(room))
+        methods = list(app.config['DECISION_METHODS'])
+        cache_key = decision_cache_key(room, methods)
+        cached = get_cached_decisions(cache_key)
+        if cached is not None:
+            room['decision_job'] = None
+            room['final_decisions'] = cached
+            return
 
-# --- Flask Routes (API Endpoints) ---
-@app.route('/')
-def index():
-    return render_template('index.html')
+        token = uuid.uuid4().hex # Stored on the room so a restart handled by any worker invalidates it
+        room['decision_job'] = token
+        room['final_decisions'] = None
+        snapshot = decision_job_snapshot(room)
+        submitted_at = time.perf_counter()
+        future = get_decision_pool(snapshot['rating_matrix'].view().size).submit(run_decision_job, snapshot, methods)
+        future.add_done_callback(lambda f: finish_decision_job(room_id, token, cache_key, submitted_at, f))
 
-@app.route('/api/create_room', methods=['POST'])
-def create_room_api():
-    data = request.json
-    room_name = data.get('room_name'); user_name = data.get('user_name'); user_id = data.get('user_id') 
-    if not all([room_name, user_name, user_id]): return jsonify({'error': 'Missing data'}), 400
+# --- Room Lifecycle ---
+# Sockets are mapped to the member they joined as, so a member whose last socket disconnects is removed
+# after a grace period (a page reload or short network drop reconnects in time) and no longer blocks
+# finalize. A background sweeper applies those leaves, closes rooms idle for longer than ROOM_IDLE_TTL_S
+# and keeps the room count under MAX_ROOMS by evicting the least recently updated rooms.
+socket_members = {} # sid -> (room_id, user_id)
+member_sockets = {} # (room_id, user_id) -> {sid, ...}, a member may have several tabs open
+pending_member_leaves = {} # (room_id, user_id) -> time.monotonic() deadline
+socket_members_lock = threading.Lock()
+socket_wire_formats = {} # sid -> wire format negotiated on join_sio_room
+room_sweeper = {'task': None}
 
-    room_id = "ROOM-" + generate_unique_id()
-    rooms_data[room_id] = {
-        'id': room_id, 'name': room_name, 'host_id': user_id, 'host_name': user_name,
-        'members': [{'id': user_id, 'name': user_name}],
-        'private_items': {user_id: []}, 'public_items': [],
-        'users_done_rating': [], 'final_decision_scoring': None, 'final_decision_topsis': None
-    }
-    print(f"Room created: {room_id} by {user_name}")
-    return jsonify({'room': rooms_data[room_id]}), 201
+def track_member_socket(sid, room_id, user_id):
+    untrack_member_socket(sid, schedule_leave=False) # Socket switched rooms
+    with socket_members_lock:
+        socket_members[sid] = (room_id, user_id)
+        member_sockets.setdefault((room_id, user_id), set()).add(sid)
+        pending_member_leaves.pop((room_id, user_id), None) # Reconnected within the grace period
 
-@app.route('/api/join_room', methods=['POST'])
-def join_room_api():
-    data = request.json
-    room_id = data.get('room_id'); user_name = data.get('user_name'); user_id = data.get('user_id')
-    if not all([room_id, user_name, user_id]): return jsonify({'error': 'Missing data'}), 400
+def untrack_member_socket(sid, schedule_leave):
+    with socket_members_lock:
+        member = socket_members.pop(sid, None)
+        if not member: return
+        sockets = member_sockets.get(member, set())
+        sockets.discard(sid)
+        if sockets: return # Still connected from another tab
+        member_sockets.pop(member, None)
+        if schedule_leave: pending_member_leaves[member] = time.monotonic() + app.config['MEMBER_DISCONNECT_GRACE_S']
 
-    room = get_room_or_abort(room_id)
-    if not room: return jsonify({'error': 'Room not found'}), 404
+def member_leave_room(room_id, user_id):
+    # Shared by the leave route and disconnect cleanup; returns False if the room does not exist
+    with room_store.update(room_id) as room:
+        if not room: return False
+        if user_id not in room['indexes']['members']: return True # Already gone, nothing to record
 
-    if not any(m['id'] == user_id for m in room['members']):
-        room['members'].append({'id': user_id, 'name': user_name})
-        if user_id not in room['private_items']: room['private_items'][user_id] = []
-    
-    # Don't broadcast here, let SocketIO join handler send initial state to the joiner
-    # broadcast_room_update(room_id) 
-    print(f"User {user_name} joining room {room_id} (API)")
-    return jsonify({'room': room}) # Return current room state to joiner
+        had_ratings = remove_member_from_room(room, user_id)
+        status_changed = False
+        if user_id in room.get('users_done_rating', []):
+            room['users_done_rating'].remove(user_id); status_changed = True
+        if had_ratings:
+            # Published or in-flight decisions still count the leaver's column
+            status_changed = status_changed or room['final_decisions'] is not None
+            clear_final_decisions(room)
 
-@app.route('/api/room/<room_id>/leave', methods=['POST'])
-def leave_room_api(room_id):
-    data = request.json; user_id = data.get('user_id')
-    room = get_room_or_abort(room_id)
-    if not room: return jsonify({'error': 'Room not found'}), 404
-
-    room['members'] = [m for m in room['members'] if m['id'] != user_id]
-    if user_id in room['private_items']: del room['private_items'][user_id]
-    if user_id in room.get('users_done_rating', []):
-        room['users_done_rating'].remove(user_id)
-        if len(room['users_done_rating']) < len(room['members']):
-            room['final_decision_scoring'] = None; room['final_decision_topsis'] = None
-
-    if not room['members']:
-        del rooms_data[room_id]; print(f"Room {room_id} deleted.")
-    elif room['host_id'] == user_id:
-        room['host_id'] = None; room['host_name'] = None; print(f"Host left room {room_id}.")
-
-    broadcast_room_update(room_id)
-    return jsonify({'message': 'Left room successfully'})
+        if not room['members']:
+            discard_room(room_id); log_event(logger, logging.INFO, 'room_deleted', room_id=room_id)
+        else:
+            if room['host_id'] == user_id:
+                room['host_id'] = None; room['host_name'] = None; log_event(logger, logging.INFO, 'host_left', room_id=room_id)
+            record_room_op(room, 'member_left', member_id=user_id, host_id=room['host_id'], host_name=room['host_name'])
+            # Everyone left has finalized, so the member who was holding the room back no longer blocks the decisions
+            if room['final_decisions'] is None and len(room['users_done_rating']) == len(room['members']):
+                calculate_final_decisions_for_room(room_id); status_changed = True
+            if status_changed: record_rating_status(room)
 
-@app.route('/api/room/<room_id>/item/private', methods=['POST'])
-def add_private_item_api(room_id):
-    data = request.json; user_id = data.get('user_id'); item_details = data.get('item') 
-    room = get_room_or_abort(room_id)
-    if not room: return jsonify({'error': 'Room not found'}), 404
-    if user_id not in room['private_items']: room['private_items'][user_id] = []
-
-    is_duplicate = any(
-        (item_details.get('item_original_id') and ex.get('item_original_id') == item_details['item_original_id']) or
-        (not item_details.get('item_original_id') and ex['name'].lower() == item_details['name'].lower())
-        for ex in room['private_items'][user_id]
-    )
-    if not is_duplicate:
+        broadcast_room_update(room_id, immediate=status_changed)
+        return True
+
+def discard_room(room_id):
+    room_store.delete(room_id); room_pending_ops.pop(room_id, None); dirty_rooms.discard(room_id)
+    journal_record({'room_id': room_id, 'type': 'room_deleted'})
+
+def close_room(room_id, reason):
+    with room_store.update(room_id) as room:
+        if not room: return
+        member_ids = list(room['indexes']['members'])
+        discard_room(room_id)
+    log_event(logger, logging.INFO, 'room_closed', room_id=room_id, reason=reason)
+    emit_room_event(room_id, 'room_closed', {'room_id': room_id, 'reason': reason})
+    for wire_format in WIRE_FORMATS:
+        socketio.close_room(room_channel(room_id, wire_format))
+        for user_id in member_ids: socketio.close_room(member_channel(room_id, user_id, wire_format))
+
+def enforce_room_cap():
+    excess = len(room_store) - app.config['MAX_ROOMS']
+    if excess <= 0: return
+    for room_id in room_store.lru_room_ids(excess): close_room(room_id, 'evicted')
+
+def sweep_rooms():
+    now = time.monotonic()
+    with socket_members_lock:
+        due = [member for member, deadline in pending_member_leaves.items() if deadline <= now]
+        for member in due: del pending_member_leaves[member]
+    for room_id, user_id in due:
+        log_event(logger, logging.INFO, 'disconnected_member_removed', room_id=room_id, user_id=user_id)
+        member_leave_room(room_id, user_id)
+    for room_id in room_store.idle_room_ids(time.time() - app.config['ROOM_IDLE_TTL_S']):
+        close_room(room_id, 'idle')
+    enforce_room_cap()
+
+def room_sweeper_loop():
+    while True:
+        socketio.sleep(app.config['ROOM_SWEEP_INTERVAL_S'])
+        try: sweep_rooms()
+        except Exception: log_event(logger, logging.ERROR, 'room_sweep_failed', exc_info=True)
+
+def ensure_room_sweeper():
+    with background_tasks_lock:
+        if room_sweeper['task'] is None:
+            room_sweeper['task'] = socketio.start_background_task(room_sweeper_loop)
+
+# --- Room Actions ---
+# Every room mutation is an action: (room, data) -> (response body, HTTP-style status), run under the room's
+# update lock. The REST routes, the room_action socket event (answered through the ack callback) and
+# room_batch (several actions applied all-or-nothing with one broadcast) are thin wrappers around them.
+ROOM_ACTIONS = {} # name -> (fn, broadcast immediately)
+batch_journal_records = {} # room_id -> journal records held back until the batch commits
+# A failed batch puts the room back as it was. Ratings changed by the batch are undone from a log of the previous
+# cell codes and BATCH_SAVED_FIELDS are saved up front, which covers everything the actions below change; only
+# the first action that adds or removes items snapshots the whole room, so a rating burst never pays for one.
+BATCH_UNDO_LOG_ACTIONS = {'rate', 'finalize', 'restart'}
+batch_rating_undo = {} # room_id -> [(item_id, user_id, previous code), ...] while a batch runs
+
+def room_action(name, immediate=False):
+    def register(fn):
+        ROOM_ACTIONS[name] = (fn, immediate)
+        return fn
+    return register
+
+def set_rating(room, item_id, user_id, code):
+    matrix = room['rating_matrix']
+    undo = batch_rating_undo.get(room['id'])
+    if undo is not None: undo.append((item_id, user_id, matrix.get(item_id, user_id)))
+    matrix.set(item_id, user_id, code)
+
+def run_room_action(room_id, name, data):
+    action, immediate = ROOM_ACTIONS[name]
+    with ROOM_ACTION_LATENCY.time(action=name), room_store.update(room_id) as room:
+        if not room: return {'error': 'Room not found'}, 404
+        body, status = action(room, data)
+        if status < 400: broadcast_room_update(room_id, immediate=immediate)
+        return body, status
+
+def run_room_batch(room_id, actions):
+    if len(actions) > app.config['ROOM_BATCH_MAX_ACTIONS']: return {'error': 'Too many actions in one batch'}, 400
+    with ROOM_ACTION_LATENCY.time(action='batch'), room_store.update(room_id) as room:
+        if not room: return {'error': 'Room not found'}, 404
+        saved_fields = {'version': room['version'], 'users_done_rating': list(room['users_done_rating']),
+                        'final_decisions': room['final_decisions'], 'decision_job': room['decision_job']}
+        saved, pending_before = None, len(room_pending_ops.get(room_id, []))
+        batch_journal_records[room_id] = []
+        undo = batch_rating_undo[room_id] = []
+        results, failure = [], None
+        try:
+            for index, action_data in enumerate(actions):
+                name = action_data.get('action')
+                if name not in ROOM_ACTIONS: body, status = {'error': f"Unknown action: {name}"}, 400
+                else:
+                    if saved is None and name not in BATCH_UNDO_LOG_ACTIONS: saved, undo_before_snapshot = snapshot_room(room), len(undo)
+                    body, status = ROOM_ACTIONS[name][0](room, action_data)
+                if status >= 400:
+                    failure = (dict(body, failed_index=index), status); break
+                results.append(body)
+        except Exception:
+            failure = ({'error': 'Batch failed'}, 500); raise
+        finally:
+            held_back = batch_journal_records.pop(room_id); batch_rating_undo.pop(room_id)
+            if failure: # Put the room back exactly as it was, nothing was broadcast or journaled yet
+                if saved is not None:
+                    room.clear(); room.update(room_from_snapshot(saved))
+                    del undo[undo_before_snapshot:] # Already undone by the snapshot
+                for item_id, user_id, code in reversed(undo): room['rating_matrix'].set(item_id, user_id, code)
+                room.update(saved_fields)
+                del room_pending_ops.setdefault(room_id, [])[pending_before:]
+        if failure: return failure
+        for record in held_back: journal_record(record)
+        if results: broadcast_room_update(room_id, immediate=any(ROOM_ACTIONS[a['action']][1] for a in actions))
+        return {'message': f"Applied {len(results)} action(s)", 'results': results}, 200
+
+@room_action('add_private_item')
+def add_private_item_action(room, data):
+    user_id = data.get('user_id'); item_details = data.get('item')
+    if user_id not in room['indexes']['members']: return {'error': 'You are not a member of this room'}, 403
+    if item_details.get('item_original_id'):
+        catalog_item = catalog.get(item_details['item_original_id'])
+        if not catalog_item: return {'error': 'Unknown catalog item'}, 400
+        # The catalog is the source of truth for catalog items, not the client's copy
+        item_details = dict(item_details, name=catalog_item['name'], category=catalog_item['category'], type=catalog_item['type'])
+
+    if not find_private_duplicate(room, user_id, item_details):
         new_item = {
             'unique_instance_id': 'priv_' + generate_unique_id(), 'name': item_details['name'],
             'category': item_details.get('category', 'Custom Idea'), 'type': item_details.get('type', 'User Input'),
             'item_original_id': item_details.get('item_original_id')
         }
-        room['private_items'][user_id].append(new_item)
-        broadcast_room_update(room_id)
-        return jsonify({'message': 'Item added to private list', 'item': new_item}), 201
-    return jsonify({'error': 'Item already in your private list'}), 409
+        add_private_item(room, user_id, new_item)
+        record_room_op(room, 'private_item_added', user_id=user_id, item=dict(new_item))
+        return {'message': 'Item added to private list', 'item': new_item}, 201
+    return {'error': 'Item already in your private list'}, 409
 
-@app.route('/api/room/<room_id>/item/private/delete', methods=['POST'])
-def delete_private_item_api(room_id):
-    data = request.json; user_id = data.get('user_id'); item_instance_id = data.get('item_instance_id')
-    room = get_room_or_abort(room_id)
-    if not room or user_id not in room['private_items']: return jsonify({'error': 'Not found or no private items'}), 404
+@room_action('delete_private_item')
+def delete_private_item_action(room, data):
+    user_id = data.get('user_id'); item_instance_id = data.get('item_instance_id')
+    if user_id not in room['private_items']: return {'error': 'Not found or no private items'}, 404
     
-    initial_len = len(room['private_items'][user_id])
-    room['private_items'][user_id] = [i for i in room['private_items'][user_id] if i['unique_instance_id'] != item_instance_id]
-    if len(room['private_items'][user_id]) < initial_len:
-        broadcast_room_update(room_id)
-        return jsonify({'message': 'Private item deleted'})
-    return jsonify({'error': 'Private item not found'}), 404
+    if remove_private_item(room, user_id, item_instance_id):
+        record_room_op(room, 'private_item_removed', user_id=user_id, item_id=item_instance_id)
+        return {'message': 'Private item deleted'}, 200
+    return {'error': 'Private item not found'}, 404
 
-@app.route('/api/room/<room_id>/item/send_to_public', methods=['POST'])
-def send_to_public_api(room_id):
-    data = request.json; user_id = data.get('user_id'); user_name = data.get('user_name')
+@room_action('send_to_public')
+def send_to_public_action(room, data):
+    user_id = data.get('user_id'); user_name = data.get('user_name')
     private_item_instance_id = data.get('private_item_instance_id')
-    room = get_room_or_abort(room_id)
-    if not room or user_id not in room['private_items']: return jsonify({'error': 'Not found or no private items'}), 404
+    if user_id not in room['private_items']: return {'error': 'Not found or no private items'}, 404
 
-    item_to_move = next((i for i in room['private_items'][user_id] if i['unique_instance_id'] == private_item_instance_id), None)
-    if not item_to_move: return jsonify({'error': 'Private item not found'}), 404
+    item_to_move = remove_private_item(room, user_id, private_item_instance_id)
+    if not item_to_move: return {'error': 'Private item not found'}, 404
 
     original_id_check = item_to_move.get('item_original_id') or item_to_move['unique_instance_id']
-    if any(pub_item.get('item_original_id') == original_id_check for pub_item in room['public_items']):
-        room['private_items'][user_id] = [i for i in room['private_items'][user_id] if i['unique_instance_id'] != private_item_instance_id]
-        broadcast_room_update(room_id)
-        return jsonify({'message': 'Item was already public, removed from your private list'})
+    if original_id_check in room['indexes']['public_by_original_id']:
+        record_room_op(room, 'private_item_removed', user_id=user_id, item_id=private_item_instance_id)
+        return {'message': 'Item was already public, removed from your private list'}, 200
 
     public_item = {
         'unique_instance_id': 'pub_' + generate_unique_id(), 'name': item_to_move['name'],
         'category': item_to_move['category'], 'type': item_to_move['type'],
-        'item_original_id': original_id_check, 'submitted_by': user_name, 'ratings': {}
+        'item_original_id': original_id_check, 'submitted_by': user_name
     }
-    room['public_items'].append(public_item)
-    room['private_items'][user_id] = [i for i in room['private_items'][user_id] if i['unique_instance_id'] != private_item_instance_id]
+    add_public_item(room, public_item)
+    record_room_op(room, 'private_item_removed', user_id=user_id, item_id=private_item_instance_id)
+    record_room_op(room, 'public_item_added', item=dict(public_item, ratings={}))
     reset_decisions_and_done_ratings(room)
-    broadcast_room_update(room_id)
-    return jsonify({'message': 'Item sent to public', 'item': public_item})
+    return {'message': 'Item sent to public', 'item': public_item}, 200
 
-@app.route('/api/room/<room_id>/item/public/host_add', methods=['POST'])
-def host_add_public_item_api(room_id):
-    data = request.json; user_id = data.get('user_id'); user_name = data.get('user_name')
+@room_action('host_add_public_item')
+def host_add_public_item_action(room, data):
+    user_id = data.get('user_id'); user_name = data.get('user_name')
     item_details = data.get('item')
-    room = get_room_or_abort(room_id)
-    if not room: return jsonify({'error': 'Room not found'}), 404
-    if room['host_id'] != user_id: return jsonify({'error': 'Only host can perform this action'}), 403
+    if room['host_id'] != user_id: return {'error': 'Only host can perform this action'}, 403
     
-    if any(p['name'].lower() == item_details['name'].lower() and p.get('category') == 'Host Added' for p in room['public_items']):
-        return jsonify({'error': 'Host-added item with this name already exists'}), 409
+    if item_details['name'].lower() in room['indexes']['public_host_names']:
+        return {'error': 'Host-added item with this name already exists'}, 409
 
     public_item = {
         'unique_instance_id': 'pub_host_' + generate_unique_id(), 'name': item_details['name'],
         'category': 'Host Added', 'type': 'User Input', 'item_original_id': None,
-        'submitted_by': f"{user_name} (Host)", 'ratings': {}
+        'submitted_by': f"{user_name} (Host)"
     }
-    room['public_items'].append(public_item)
+    add_public_item(room, public_item)
+    record_room_op(room, 'public_item_added', item=dict(public_item, ratings={}))
     reset_decisions_and_done_ratings(room)
-    broadcast_room_update(room_id)
-    return jsonify({'message': 'Item added to public by host', 'item': public_item})
-
-@app.route('/api/room/<room_id>/item/public/delete', methods=['POST'])
-def delete_public_item_api(room_id):
-    data = request.json; user_id = data.get('user_id'); item_instance_id = data.get('item_instance_id')
-    room = get_room_or_abort(room_id)
-    if not room: return jsonify({'error': 'Room not found'}), 404
+    return {'message': 'Item added to public by host', 'item': public_item}, 200
 
-    item_to_delete = next((i for i in room['public_items'] if i['unique_instance_id'] == item_instance_id), None)
-    if not item_to_delete: return jsonify({'error': 'Public item not found'}), 404
+@room_action('delete_public_item')
+def delete_public_item_action(room, data):
+    user_id = data.get('user_id'); item_instance_id = data.get('item_instance_id')
+    item_to_delete = room['indexes']['public_by_id'].get(item_instance_id)
+    if not item_to_delete: return {'error': 'Public item not found'}, 404
 
     is_host = room['host_id'] == user_id
     is_submitter = item_to_delete['submitted_by'].startswith(data.get('user_name', ''))
     can_delete = is_host or (is_submitter and not item_to_delete['submitted_by'].endswith("(Host)"))
-    if not can_delete: return jsonify({'error': 'Unauthorized to delete this item'}), 403
+    if not can_delete: return {'error': 'Unauthorized to delete this item'}, 403
 
-    room['public_items'] = [i for i in room['public_items'] if i['unique_instance_id'] != item_instance_id]
+    remove_public_item(room, item_instance_id)
+    record_room_op(room, 'public_item_removed', item_id=item_instance_id)
     reset_decisions_and_done_ratings(room)
-    broadcast_room_update(room_id)
-    return jsonify({'message': 'Public item deleted'})
+    return {'message': 'Public item deleted'}, 200
 
-@app.route('/api/room/<room_id>/item/public/rate', methods=['POST'])
-def rate_public_item_api(room_id):
-    data = request.json; user_id = data.get('user_id')
+@room_action('rate')
+def rate_public_item_action(room, data):
+    user_id = data.get('user_id')
     item_instance_id = data.get('item_instance_id'); emotion_key = data.get('emotion_key')
-    room = get_room_or_abort(room_id)
-    if not room: return jsonify({'error': 'Room not found'}), 404
-    if user_id in room.get('users_done_rating', []): return jsonify({'error': 'You have already finalized your ratings'}), 403
-    if emotion_key not in EMOTION_RATINGS_CONFIG: return jsonify({'error': 'Invalid emotion key'}), 400
+    if user_id in room.get('users_done_rating', []): return {'error': 'You have already finalized your ratings'}, 403
+    if emotion_key not in EMOTION_RATINGS_CONFIG: return {'error': 'Invalid emotion key'}, 400
 
-    item = next((i for i in room['public_items'] if i['unique_instance_id'] == item_instance_id), None)
-    if not item: return jsonify({'error': 'Public item not found'}), 404
+    if item_instance_id not in room['indexes']['public_by_id']: return {'error': 'Public item not found'}, 404
+    matrix = room['rating_matrix']
+    if user_id not in matrix.member_index: return {'error': 'You are not a member of this room'}, 403
     
-    if 'ratings' not in item: item['ratings'] = {}
-    if item['ratings'].get(user_id) == emotion_key: del item['ratings'][user_id]
-    else: item['ratings'][user_id] = emotion_key
+    # Clicking the same emotion again clears the rating
+    emotion_code = EMOTION_CODE_BY_KEY[emotion_key]
+    if matrix.get(item_instance_id, user_id) == emotion_code: emotion_code = 0
+    set_rating(room, item_instance_id, user_id, emotion_code)
+    record_room_op(room, 'rating_set', item_id=item_instance_id, user_id=user_id, emotion_key=EMOTION_KEY_BY_CODE[emotion_code])
             
     if len(room.get('users_done_rating', [])) < len(room.get('members', [])):
-        room['final_decision_scoring'] = None; room['final_decision_topsis'] = None
-        
-    broadcast_room_update(room_id)
-    return jsonify({'message': 'Item rated successfully'})
-
-@app.route('/api/room/<room_id>/finalize_ratings', methods=['POST'])
-def finalize_ratings_api(room_id):
-    data = request.json; user_id = data.get('user_id')
-    room = get_room_or_abort(room_id)
-    if not room: return jsonify({'error': 'Room not found'}), 404
+        if room['final_decisions']:
+            clear_final_decisions(room)
+            record_rating_status(room)
+    return {'message': 'Item rated successfully'}, 200
 
+@room_action('finalize', immediate=True)
+def finalize_ratings_action(room, data):
+    user_id = data.get('user_id')
     if 'users_done_rating' not in room: room['users_done_rating'] = []
     if user_id not in room['users_done_rating']: room['users_done_rating'].append(user_id)
 
     if len(room['users_done_rating']) == len(room['members']):
-        calculate_final_decisions_for_room(room_id)
-    
-    broadcast_room_update(room_id)
-    return jsonify({'message': 'Ratings finalized'})
+        calculate_final_decisions_for_room(room['id'])
+    record_rating_status(room)
+    return {'message': 'Ratings finalized'}, 200
+
+@room_action('restart', immediate=True)
+def restart_ratings_action(room, data):
+    if room['host_id'] != data.get('user_id'): return {'error': 'Only host can restart ratings'}, 403
+
+    reset_decisions_and_done_ratings(room)
+    # room['rating_matrix'].clear() # Optional: clear all individual ratings
+    return {'message': 'Rating process restarted'}, 200
+
+# --- Flask Routes (API Endpoints) ---
+@app.route('/')
+def index():
+    return render_template('index.html', msgpack_enabled=msgpack_enabled())
+
+@app.route('/api/create_room', methods=['POST'])
+def create_room_api():
+    data = request.json
+    room_name = data.get('room_name'); user_name = data.get('user_name'); user_id = data.get('user_id') 
+    if not all([room_name, user_name, user_id]): return jsonify({'error': 'Missing data'}), 400
+
+    while True:
+        room_id = "ROOM-" + generate_unique_id()
+        room = new_room(room_id, room_name, user_id, user_name)
+        add_member_to_room(room, {'id': user_id, 'name': user_name})
+        with room_store.create_locked(room) as created:
+            if not created: continue # The ID was taken, try another
+            # Journaled once the room exists (a compaction from now on snapshots it) but before any other
+            # handler can lock it, so none of its ops can reach the journal ahead of this record
+            journal_record({'room_id': room_id, 'type': 'room_created', 'room': snapshot_room(room)})
+            room_state = serialize_room(room, user_id)
+        break
+    log_event(logger, logging.INFO, 'room_created', room_id=room_id, user_id=user_id)
+    enforce_room_cap(); ensure_room_sweeper()
+    return jsonify({'room': room_state}), 201
+
+@app.route('/api/join_room', methods=['POST'])
+def join_room_api():
+    data = request.json
+    room_id = data.get('room_id'); user_name = data.get('user_name'); user_id = data.get('user_id')
+    if not all([room_id, user_name, user_id]): return jsonify({'error': 'Missing data'}), 400
+
+    with room_store.update(room_id) as room:
+        if not room: return jsonify({'error': 'Room not found'}), 404
+
+        if user_id not in room['indexes']['members']:
+            new_member = {'id': user_id, 'name': user_name}
+            add_member_to_room(room, new_member)
+            record_room_op(room, 'member_joined', member=new_member)
+            # Existing members only get the small member_joined op, the SocketIO join handler sends the full state to the joiner
+            broadcast_room_update(room_id)
+        
+        log_event(logger, logging.INFO, 'member_joined', sampled=True, room_id=room_id, user_id=user_id)
+        return jsonify({'room': serialize_room(room, user_id)}) # Return current room state to joiner
+
+@app.route('/api/room/<room_id>/leave', methods=['POST'])
+def leave_room_api(room_id):
+    data = request.json; user_id = data.get('user_id')
+    if not member_leave_room(room_id, user_id): return jsonify({'error': 'Room not found'}), 404
+    return jsonify({'message': 'Left room successfully'})
+
+def room_action_response(room_id, name):
+    body, status = run_room_action(room_id, name, request.json)
+    return jsonify(body), status
+
+@app.route('/api/room/<room_id>/item/private', methods=['POST'])
+def add_private_item_api(room_id):
+    return room_action_response(room_id, 'add_private_item')
+
+@app.route('/api/room/<room_id>/item/private/delete', methods=['POST'])
+def delete_private_item_api(room_id):
+    return room_action_response(room_id, 'delete_private_item')
+
+@app.route('/api/room/<room_id>/item/send_to_public', methods=['POST'])
+def send_to_public_api(room_id):
+    return room_action_response(room_id, 'send_to_public')
+
+@app.route('/api/room/<room_id>/item/public/host_add', methods=['POST'])
+def host_add_public_item_api(room_id):
+    return room_action_response(room_id, 'host_add_public_item')
+
+@app.route('/api/room/<room_id>/item/public/delete', methods=['POST'])
+def delete_public_item_api(room_id):
+    return room_action_response(room_id, 'delete_public_item')
+
+@app.route('/api/room/<room_id>/item/public/rate', methods=['POST'])
+def rate_public_item_api(room_id):
+    return room_action_response(room_id, 'rate')
+
+@app.route('/api/room/<room_id>/finalize_ratings', methods=['POST'])
+def finalize_ratings_api(room_id):
+    return room_action_response(room_id, 'finalize')
 
 @app.route('/api/room/<room_id>/restart_ratings', methods=['POST'])
 def restart_ratings_api(room_id):
-    data = request.json; user_id = data.get('user_id')
-    room = get_room_or_abort(room_id)
-    if not room: return jsonify({'error': 'Room not found'}), 404
-    if room['host_id'] != user_id: return jsonify({'error': 'Only host can restart ratings'}), 403
+    return room_action_response(room_id, 'restart')
 
-    reset_decisions_and_done_ratings(room)
-    # for item in room['public_items']: item['ratings'] = {} # Optional: clear all individual ratings
-    broadcast_room_update(room_id)
-    return jsonify({'message': 'Rating process restarted'})
+@app.route('/api/room/<room_id>/batch', methods=['POST'])
+def room_batch_api(room_id):
+    # { user_id, user_name, actions: [{ 'action': name, ...action fields }, ...] }, all-or-nothing
+    data = request.json
+    body, status = run_room_batch(room_id, batch_actions(data))
+    return jsonify(body), status
+
+@app.route('/api/room/<room_id>/state', methods=['GET'])
+def room_state_api(room_id):
+    # Full snapshot for clients that detected a gap in the room_patch version sequence
+    with room_store.read(room_id) as room:
+        if not room: return jsonify({'error': 'Room not found'}), 404
+        viewer_id = request.args.get('user_id') # Only this member's private items are included
+        if request.args.get('format') == 'compact': return jsonify({'room': serialize_room_compact(room, viewer_id)})
+        return jsonify({'room': serialize_room(room, viewer_id)})
+
+@app.route('/metrics', methods=['GET'])
+def metrics_api():
+    return metrics.render(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
+@app.route('/api/catalog/search', methods=['GET'])
+def catalog_search_api():
+    # ?q=<text>&type=<type>(repeatable)&offset=0&limit=20
+    try:
+        offset = max(int(request.args.get('offset', 0)), 0)
+        limit = min(max(int(request.args.get('limit', app.config['CATALOG_SEARCH_PAGE_SIZE'])), 1), app.config['CATALOG_SEARCH_MAX_PAGE_SIZE'])
+    except ValueError: return jsonify({'error': 'offset and limit must be integers'}), 400
+    items, total = catalog.search(request.args.get('q', ''), request.args.getlist('type'), offset, limit)
+    next_offset = offset + len(items) if offset + len(items) < total else None
+    return jsonify({'items': items, 'total': total, 'offset': offset, 'next_offset': next_offset})
 
 # --- SocketIO Event Handlers ---
 @socketio.on('connect')
 def handle_connect():
-    print(f"Client connected: {request.sid}")
+    CONNECTED_SOCKETS.inc()
+    log_event(logger, logging.DEBUG, 'socket_connected', sampled=True, sid=request.sid)
+    ensure_room_sweeper()
 
 @socketio.on('disconnect')
 def handle_disconnect():
-    print(f"Client disconnected: {request.sid}")
-    # Add logic here to find which user/room this SID was associated with and trigger a leave if necessary
-    # This is more complex and requires mapping SIDs to user_ids/room_ids upon connection/join.
-    # For this demo, explicit leave is primary.
+    CONNECTED_SOCKETS.dec()
+    log_event(logger, logging.DEBUG, 'socket_disconnected', sampled=True, sid=request.sid)
+    # The member is removed by the sweeper unless one of their sockets rejoins within the grace period
+    untrack_member_socket(request.sid, schedule_leave=True)
+    socket_wire_formats.pop(request.sid, None)
 
-@socketio.on('join_sio_room')
+@socket_event('join_sio_room')
 def handle_join_sio_room(data):
+    # data.format picks the wire format ('json' default, 'compact', 'msgpack'); the ack reports what was granted
     room_id = data.get('room_id'); user_id = data.get('user_id') 
     if room_id and user_id:
-        sio_join_room(room_id) 
-        print(f"Socket {request.sid} (user {user_id}) joined SocketIO room {room_id}")
-        room = get_room_or_abort(room_id)
-        if room: # Send full room state to the user who just joined this SIO room
-             emit('room_state_updated', {'room': deepcopy(room)}) 
+        wire_format = negotiate_wire_format(data.get('format', 'json'), msgpack_enabled())
+        socket_wire_formats[request.sid] = wire_format
+        sio_join_room(room_channel(room_id, wire_format)) 
+        log_event(logger, logging.DEBUG, 'socket_joined_room', sampled=True, sid=request.sid, room_id=room_id, user_id=user_id, format=wire_format)
+        with room_store.read(room_id) as room:
+            if room: # Send full room state to the user who just joined this SIO room
+                 if user_id in room['indexes']['members']:
+                     track_member_socket(request.sid, room_id, user_id)
+                     sio_join_room(member_channel(room_id, user_id, wire_format)) # Their own private item ops
+                 room_state = serialize_room(room, user_id) if wire_format == 'json' else serialize_room_compact(room, user_id)
+                 data = encode_payload(wire_format, {'room': room_state})
+                 emit('room_state_updated', data)
+                 count_emit('room_state_updated', wire_format, data)
         # And broadcast a simpler update to others if member list actually changed via API
         # The API join_room should handle the member list update and broadcast.
         # This SIO join is more about subscribing the socket to broadcasts.
+        return {'format': wire_format}
+
+def socket_action_data(data):
+    # A socket that joined the room acts as the member it joined as, whatever user_id the payload claims
+    member = socket_members.get(request.sid)
+    if member and member[0] == data.get('room_id'): data = dict(data, user_id=member[1])
+    return data
+
+def batch_actions(data):
+    # The batch's user_id/user_name apply to every action in it
+    return [dict(action, user_id=data.get('user_id'), user_name=data.get('user_name'))
+            for action in data.get('actions') or [] if isinstance(action, dict)]
 
-@socketio.on('leave_sio_room')
+@socket_event('room_action')
+def handle_room_action(data):
+    # { room_id, action, ...action fields }; the returned dict is delivered to the client's ack callback
+    data = socket_action_data(data or {})
+    if not data.get('room_id') or data.get('action') not in ROOM_ACTIONS: return {'status': 400, 'error': 'Missing or unknown action'}
+    body, status = run_room_action(data['room_id'], data['action'], data)
+    return dict(body, status=status)
+
+@socket_event('room_batch')
+def handle_room_batch(data):
+    # { room_id, user_id, user_name, actions: [{ action, ...action fields }, ...] }
+    data = socket_action_data(data or {})
+    if not data.get('room_id'): return {'status': 400, 'error': 'Missing data'}
+    body, status = run_room_batch(data['room_id'], batch_actions(data))
+    return dict(body, status=status)
+
+@socket_event('leave_sio_room')
 def handle_leave_sio_room(data):
     room_id = data.get('room_id'); user_id = data.get('user_id')
     if room_id:
-        sio_leave_room(room_id)
-        print(f"Socket {request.sid} (user {user_id}) left SocketIO room {room_id}")
+        wire_format = socket_wire_formats.pop(request.sid, 'json')
+        sio_leave_room(room_channel(room_id, wire_format))
+        member = socket_members.get(request.sid)
+        if member and member[0] == room_id: sio_leave_room(member_channel(room_id, member[1], wire_format))
+        untrack_member_socket(request.sid, schedule_leave=False) # Explicit leaves go through the leave route
+        log_event(logger, logging.DEBUG, 'socket_left_room', sampled=True, sid=request.sid, room_id=room_id, user_id=user_id)
+
+if multiprocessing.parent_process() is None: # Skipped in decision worker processes
+    init_room_persistence()
 
 if __name__ == '__main__':
-    print("Starting Flask app with SocketIO for MCDM Decider (TOPSIS)...")
+    log_event(logger, logging.INFO, 'server_starting', decision_methods=app.config['DECISION_METHODS'])
     socketio.run(app, debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
@@ -0,0 +1,283 @@
+import argparse
+import contextlib
+import json
+import os
+import platform
+import random
+import sys
+import time
+import numpy as np
+
+# Load generator and benchmark suite for the room hot paths.
+#
+# Drives the app in-process through the Flask test client (REST routes) and flask_socketio's test client
+# (socket events), simulating rooms whose members join, suggest ideas, rate every public item and finalize.
+# Reports p50/p99 latency per endpoint and socket event, the cost of room broadcasts and the bytes they put
+# on the wire, and micro-benchmarks of the decision functions as the rating matrix grows.
+#
+#   python benchmark.py --rooms 4 --members 8 --items 30 --output benchmark_results.json
+#   python benchmark.py --baseline benchmark_baseline.json   # exit code 1 on regressions
+#   python benchmark.py --output benchmark_baseline.json     # store a new baseline
+#
+# Rooms are not journaled unless --journal-dir is given, so runs leave nothing behind. App logging is off
+# unless LOG_LEVEL is set in the environment.
+
+EMOTION_KEYS = ['VERY_INTERESTED', 'INTERESTED', 'OKAY', 'NOT_INTERESTED', 'NOT_AT_ALL']
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark rooms, ratings and decisions.")
+    parser.add_argument('--rooms', type=int, default=4, help="Rooms simulated in the workload")
+    parser.add_argument('--members', type=int, default=8, help="Members per room, each with one socket")
+    parser.add_argument('--items', type=int, default=30, help="Public items per room, every member rates all of them")
+    parser.add_argument('--wire-format', default='compact', choices=['json', 'compact', 'msgpack'], help="Format the sockets ask for on join_sio_room")
+    parser.add_argument('--coalesce-ms', type=int, default=None, help="Override BROADCAST_COALESCE_WINDOW_MS")
+    parser.add_argument('--matrix-sizes', default='10x5,50x10,200x20,1000x50,5000x100', help="items x members grid for the decision micro-benchmarks")
+    parser.add_argument('--repeat', type=int, default=20, help="Runs per decision micro-benchmark")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--journal-dir', default='', help="Journal rooms to this directory (off by default)")
+    parser.add_argument('--output', default='benchmark_results.json', help="Machine-readable results file")
+    parser.add_argument('--baseline', help="Results file of an earlier run to compare against")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="Allowed slowdown against the baseline (0.25 = 25%%)")
+    parser.add_argument('--min-delta-ms', type=float, default=0.05, help="Differences below this are treated as noise")
+    return parser.parse_args(argv)
+
+class Timings:
+    def __init__(self):
+        self.samples = {} # name -> [seconds, ...]
+
+    def add(self, name, seconds):
+        self.samples.setdefault(name, []).append(seconds)
+
+    @contextlib.contextmanager
+    def measure(self, name):
+        start = time.perf_counter()
+        try: yield
+        finally: self.add(name, time.perf_counter() - start)
+
+    def summary(self):
+        return {name: latency_summary(samples) for name, samples in sorted(self.samples.items())}
+
+def latency_summary(samples):
+    ms = np.array(samples) * 1000.0
+    return {'count': len(samples), 'p50_ms': round(float(np.percentile(ms, 50)), 4), 'p99_ms': round(float(np.percentile(ms, 99)), 4),
+            'mean_ms': round(float(ms.mean()), 4), 'max_ms': round(float(ms.max()), 4)}
+
+# --- Workload ---
+class Workload:
+    def __init__(self, server, args, rng):
+        self.server, self.args, self.rng = server, args, rng
+        self.http = server.app.test_client()
+        self.timings = Timings()
+        self.received = {} # event name -> [payload bytes, ...] as seen by the clients
+        self.sockets = [] # (room_id, user_id, socket test client)
+
+    def call(self, name, method, url, body=None):
+        with self.timings.measure(name):
+            response = self.http.open(url, method=method, json=body)
+        if response.status_code >= 400: raise RuntimeError(f"{name} failed with {response.status_code}: {response.get_data(as_text=True)}")
+        return response.get_json()
+
+    def emit(self, client, event, data, name=None):
+        with self.timings.measure(name or f'sio {event}'):
+            ack = client.emit(event, data, callback=True)
+        if isinstance(ack, dict) and ack.get('status', 200) >= 400: raise RuntimeError(f"{event} failed: {ack}")
+        return ack
+
+    def action(self, client, room_id, user_id, action, **fields):
+        return self.emit(client, 'room_action', dict(fields, room_id=room_id, user_id=user_id, action=action), f'sio room_action {action}')
+
+    def drain(self):
+        # Collects what the sockets received so far
+        for _, _, client in self.sockets:
+            for message in client.get_received():
+                for payload in message['args']: self.received.setdefault(message['name'], []).append(self.server.payload_size(payload))
+
+    def wait_for_broadcasts(self):
+        window = self.server.app.config['BROADCAST_COALESCE_WINDOW_MS'] / 1000.0
+        deadline = time.monotonic() + 10
+        while (self.server.dirty_rooms or self.server.room_pending_ops) and time.monotonic() < deadline: time.sleep(window or 0.01)
+        time.sleep(window * 2)
+        self.drain()
+
+    def run(self):
+        rooms = [self.join_room(r) for r in range(self.args.rooms)]
+        self.wait_for_broadcasts()
+        for room in rooms: self.suggest(room)
+        self.wait_for_broadcasts()
+        for room in rooms: self.rate(room)
+        self.wait_for_broadcasts()
+        for room in rooms: self.finalize(room)
+        self.wait_for_broadcasts()
+        for room in rooms: self.fetch_state(room)
+        for room in rooms: self.leave(room)
+        self.wait_for_broadcasts()
+
+    def join_room(self, index):
+        members = [(f'bench_r{index}_u{m}', f'Member {m}') for m in range(self.args.members)]
+        (host_id, host_name), others = members[0], members[1:]
+        room_id = self.call('POST /api/create_room', 'POST', '/api/create_room',
+                            {'room_name': f'Bench {index}', 'user_name': host_name, 'user_id': host_id})['room']['id']
+        for user_id, user_name in others:
+            self.call('POST /api/join_room', 'POST', '/api/join_room', {'room_id': room_id, 'user_name': user_name, 'user_id': user_id})
+        clients = {}
+        for user_id, _ in members:
+            client = self.server.socketio.test_client(self.server.app, flask_test_client=self.http)
+            self.emit(client, 'join_sio_room', {'room_id': room_id, 'user_id': user_id, 'format': self.args.wire_format})
+            clients[user_id] = client; self.sockets.append((room_id, user_id, client))
+        return {'id': room_id, 'members': members, 'clients': clients, 'public_ids': []}
+
+    def suggest(self, room):
+        # Members take turns: add an idea (from the catalog while it lasts) to their list, then send it to the group
+        catalog_page, _ = self.server.catalog.search('', (), 0, self.args.items)
+        for k in range(self.args.items):
+            user_id, user_name = room['members'][k % len(room['members'])]
+            client = room['clients'][user_id]
+            if k < len(catalog_page):
+                entry = catalog_page[k]
+                self.call('GET /api/catalog/search', 'GET', f"/api/catalog/search?q={entry['name'][:4]}")
+                item = {'name': entry['name'], 'category': entry['category'], 'type': entry['type'], 'item_original_id': entry['id']}
+            else:
+                item = {'name': f'Idea {k}'}
+            private = self.action(client, room['id'], user_id, 'add_private_item', item=item)['item']
+            public = self.action(client, room['id'], user_id, 'send_to_public', user_name=user_name,
+                                 private_item_instance_id=private['unique_instance_id'])
+            room['public_ids'].append(public['item']['unique_instance_id'])
+
+    def rate(self, room):
+        for user_id, _ in room['members']:
+            for item_id in room['public_ids']:
+                self.action(room['clients'][user_id], room['id'], user_id, 'rate',
+                            item_instance_id=item_id, emotion_key=self.rng.choice(EMOTION_KEYS))
+
+    def finalize(self, room):
+        for user_id, _ in room['members']: self.action(room['clients'][user_id], room['id'], user_id, 'finalize')
+        with self.timings.measure('decision job (finalize to result)'):
+            deadline = time.monotonic() + 60
+            while time.monotonic() < deadline:
+                state = self.server.room_store.get(room['id'])
+                if state and state.get('final_decisions'): break
+                time.sleep(0.001)
+
+    def fetch_state(self, room):
+        for user_id, _ in room['members']:
+            self.call('GET /api/room/<id>/state', 'GET', f"/api/room/{room['id']}/state?user_id={user_id}&format={'json' if self.args.wire_format == 'json' else 'compact'}")
+
+    def leave(self, room):
+        for user_id, _ in room['members']:
+            client = room['clients'][user_id]
+            self.emit(client, 'leave_sio_room', {'room_id': room['id'], 'user_id': user_id})
+            self.call('POST /api/room/<id>/leave', 'POST', f"/api/room/{room['id']}/leave", {'user_id': user_id})
+
+def instrument_broadcasts(server, timings):
+    # Times every flush of queued room ops (building, encoding and emitting the patches)
+    flush = server.flush_room_broadcast
+    def timed_flush(room_id):
+        with timings.measure('flush_room_broadcast'): flush(room_id)
+    server.flush_room_broadcast = timed_flush
+
+# --- Decision micro-benchmarks ---
+def synthetic_room(server, num_items, num_members, rng):
+    room = server.new_room('BENCH', 'Bench', 'm0', 'Member 0')
+    for m in range(num_members): server.add_member_to_room(room, {'id': f'm{m}', 'name': f'Member {m}'})
+    for i in range(num_items):
+        server.add_public_item(room, {'unique_instance_id': f'pub_{i}', 'name': f'Item {i}', 'category': 'Bench',
+                                      'type': 'User Input', 'item_original_id': None, 'submitted_by': 'm0'})
+    matrix = room['rating_matrix']
+    codes = np.array([[rng.randrange(len(server.EMOTION_KEY_BY_CODE)) for _ in range(num_members)] for _ in range(num_items)], dtype=np.int8)
+    matrix.load(list(matrix.item_ids), list(matrix.member_ids), codes)
+    return room
+
+def bench_decisions(server, sizes, repeat, rng):
+    functions = [
+        ('calculate_scoring_method_decision', server.calculate_scoring_method_decision),
+        ('calculate_topsis_decision', server.calculate_topsis_decision),
+        ('calculate_decisions', lambda room: server.calculate_decisions(room, server.app.config['DECISION_METHODS'])),
+    ]
+    results = []
+    for num_items, num_members in sizes:
+        room = synthetic_room(server, num_items, num_members, rng)
+        for name, function in functions:
+            function(room) # Warm-up
+            samples = []
+            for _ in range(repeat):
+                start = time.perf_counter(); function(room); samples.append(time.perf_counter() - start)
+            ms = np.array(samples) * 1000.0
+            results.append({'function': name, 'items': num_items, 'members': num_members,
+                            'median_ms': round(float(np.median(ms)), 4), 'min_ms': round(float(ms.min()), 4)})
+    return results
+
+# --- Baseline comparison ---
+def comparable_metrics(results):
+    # Flat { metric name: milliseconds } view used to diff two runs
+    metrics = {}
+    for name, stats in results['endpoints'].items():
+        metrics[f'{name} p50'] = stats['p50_ms']; metrics[f'{name} p99'] = stats['p99_ms']
+    for entry in results['decisions']:
+        metrics[f"{entry['function']} {entry['items']}x{entry['members']} median"] = entry['median_ms']
+    return metrics
+
+def compare_to_baseline(results, baseline, tolerance, min_delta_ms):
+    current, previous = comparable_metrics(results), comparable_metrics(baseline)
+    rows = []
+    for name in sorted(current.keys() & previous.keys()):
+        now, before = current[name], previous[name]
+        regressed = now > before * (1 + tolerance) and now - before > min_delta_ms
+        rows.append({'metric': name, 'baseline_ms': before, 'current_ms': now,
+                     'change': round(now / before - 1, 4) if before else None, 'regressed': regressed})
+    return rows
+
+# --- Reporting ---
+def print_report(results, comparison):
+    print(f"\nWorkload: {results['meta']['rooms']} rooms x {results['meta']['members']} members x {results['meta']['items']} items ({results['meta']['wire_format']})")
+    print(f"{'endpoint / event':<44}{'count':>7}{'p50 ms':>10}{'p99 ms':>10}")
+    for name, stats in results['endpoints'].items():
+        print(f"{name:<44}{stats['count']:>7}{stats['p50_ms']:>10.3f}{stats['p99_ms']:>10.3f}")
+    print(f"\n{'payload':<44}{'count':>7}{'mean B':>10}{'total B':>12}")
+    for name, stats in results['payloads'].items():
+        print(f"{name:<44}{stats['count']:>7}{stats['mean_bytes']:>10.0f}{stats['total_bytes']:>12}")
+    print(f"\n{'decision function':<36}{'items x members':>16}{'median ms':>11}{'min ms':>10}")
+    for entry in results['decisions']:
+        print(f"{entry['function']:<36}{str(entry['items']) + 'x' + str(entry['members']):>16}{entry['median_ms']:>11.3f}{entry['min_ms']:>10.3f}")
+    if comparison is not None:
+        regressions = [row for row in comparison if row['regressed']]
+        print(f"\nBaseline: {len(comparison)} metric(s) compared, {len(regressions)} regression(s)")
+        for row in regressions:
+            print(f"  REGRESSED {row['metric']}: {row['baseline_ms']:.3f} -> {row['current_ms']:.3f} ms ({row['change']:+.0%})")
+
+def main(argv=None):
+    args = parse_args(argv)
+    os.environ['ROOM_JOURNAL_DIR'] = args.journal_dir # Read when the app module is imported
+    os.environ.setdefault('LOG_LEVEL', 'OFF')
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import app as server
+    if args.coalesce_ms is not None: server.app.config['BROADCAST_COALESCE_WINDOW_MS'] = args.coalesce_ms
+    rng = random.Random(args.seed)
+    sizes = [tuple(int(n) for n in size.split('x')) for size in args.matrix_sizes.split(',') if size]
+
+    workload = Workload(server, args, rng)
+    instrument_broadcasts(server, workload.timings)
+    started = time.perf_counter()
+    workload.run()
+    elapsed = time.perf_counter() - started
+    decisions = bench_decisions(server, sizes, args.repeat, rng)
+
+    results = {
+        'meta': {'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'), 'python': platform.python_version(), 'platform': platform.platform(),
+                 'rooms': args.rooms, 'members': args.members, 'items': args.items, 'wire_format': args.wire_format,
+                 'coalesce_ms': server.app.config['BROADCAST_COALESCE_WINDOW_MS'], 'workload_s': round(elapsed, 3)},
+        'endpoints': workload.timings.summary(),
+        'payloads': {name: {'count': len(sizes_), 'total_bytes': int(sum(sizes_)), 'mean_bytes': round(sum(sizes_) / len(sizes_), 1)}
+                     for name, sizes_ in sorted(workload.received.items())},
+        'decisions': decisions,
+    }
+    comparison = None
+    if args.baseline:
+        with open(args.baseline) as f: comparison = compare_to_baseline(results, json.load(f), args.tolerance, args.min_delta_ms)
+        results['baseline'] = {'file': args.baseline, 'comparison': comparison}
+    with open(args.output, 'w') as f: json.dump(results, f, indent=2)
+    print_report(results, comparison)
+    print(f"\nResults written to {args.output}")
+    return 1 if comparison and any(row['regressed'] for row in comparison) else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
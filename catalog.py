@@ -0,0 +1,97 @@
+import json
+import re
+import threading
+from collections import OrderedDict
+import numpy as np
+
+# Searchable catalog of the places, restaurants and activities users pick ideas from.
+#
+# Items are loaded once from a local data file and indexed for case-insensitive substring search
+# over "name category":
+#   - trigram index: trigram -> sorted int32 array of item positions. A term of 3+ characters matches
+#     the items holding all of its trigrams, confirmed by a substring check (trigrams may be out of order)
+#   - short prefix index: 1-2 character word prefixes -> item positions, for terms too short for trigrams
+#   - type_codes: item position -> type code, for the type filter
+# Every term of a query must match. Results are ranked name-prefix first, then name match, then category
+# match, keeping catalog order within a rank. Ordered result arrays of hot queries are kept in a bounded
+# LRU, so paging through a query only slices the cached array.
+
+WORD_SPLIT = re.compile(r'\W+')
+SHORT_PREFIX_LEN = 2
+
+class Catalog:
+    def __init__(self, items, cache_size=1024):
+        self.items = [] # position -> { id, name, category, type }
+        self.by_id = {} # id -> item, for O(1) validation of item_original_id
+        for raw in items:
+            if not isinstance(raw, dict) or not raw.get('id') or not raw.get('name'): continue # Malformed row
+            item = {'id': str(raw['id']), 'name': raw['name'], 'category': raw.get('category', ''), 'type': raw.get('type', '')}
+            if item['id'] in self.by_id: continue # First occurrence wins
+            self.items.append(item); self.by_id[item['id']] = item
+        self.names = [item['name'].lower() for item in self.items]
+        self.texts = [f"{item['name']} {item['category']}".lower() for item in self.items]
+        self.type_index = {} # type -> code
+        self.type_codes = np.array([self.type_index.setdefault(item['type'], len(self.type_index)) for item in self.items], dtype=np.int32)
+        self.trigrams = self._build_index(lambda text: {text[i:i + 3] for i in range(len(text) - 2)})
+        self.short_prefixes = self._build_index(
+            lambda text: {word[:n] for word in WORD_SPLIT.split(text) for n in range(1, min(len(word), SHORT_PREFIX_LEN) + 1)})
+        self.cache = OrderedDict() # (terms, types) -> ordered positions, least recently used first
+        self.cache_size = cache_size
+        self.cache_lock = threading.Lock()
+
+    def _build_index(self, keys_of):
+        postings = {}
+        for pos, text in enumerate(self.texts):
+            for key in keys_of(text): postings.setdefault(key, []).append(pos) # Positions arrive in ascending order
+        return {key: np.array(positions, dtype=np.int32) for key, positions in postings.items()}
+
+    def __len__(self):
+        return len(self.items)
+
+    def get(self, item_id):
+        return self.by_id.get(item_id)
+
+    def search(self, query, types=(), offset=0, limit=20):
+        # -> (items on the requested page, total number of matches)
+        terms = tuple(term for term in WORD_SPLIT.split(query.lower()) if term)
+        key = (terms, tuple(sorted(set(types))))
+        with self.cache_lock:
+            positions = self.cache.get(key)
+            if positions is not None: self.cache.move_to_end(key)
+        if positions is None:
+            positions = self._match(*key)
+            with self.cache_lock:
+                self.cache[key] = positions
+                while len(self.cache) > self.cache_size: self.cache.popitem(last=False)
+        return [self.items[pos] for pos in positions[offset:offset + limit]], len(positions)
+
+    def _match(self, terms, types):
+        postings = []
+        for term in terms:
+            if len(term) < 3: postings.append(self.short_prefixes.get(term))
+            else: postings.extend(self.trigrams.get(term[i:i + 3]) for i in range(len(term) - 2))
+        if any(posting is None for posting in postings): return np.empty(0, dtype=np.int32) # Some key has no items
+        if postings:
+            postings.sort(key=len)
+            matches = postings[0]
+            for posting in postings[1:]: # Probe the smaller candidate set into each larger sorted posting
+                if not len(matches): break
+                idx = np.minimum(np.searchsorted(posting, matches), len(posting) - 1)
+                matches = matches[posting[idx] == matches]
+        else:
+            matches = np.arange(len(self.items), dtype=np.int32)
+        if types:
+            wanted = [self.type_index[t] for t in types if t in self.type_index]
+            matches = matches[np.isin(self.type_codes[matches], wanted)]
+        long_terms = [term for term in terms if len(term) >= 3]
+        if long_terms: matches = np.array([pos for pos in matches.tolist() if all(term in self.texts[pos] for term in long_terms)], dtype=np.int32)
+        if not terms: return matches
+        phrase = ' '.join(terms)
+        rank = lambda pos: 0 if self.names[pos].startswith(phrase) else 1 if terms[0] in self.names[pos] else 2
+        return np.array(sorted(matches.tolist(), key=rank), dtype=np.int32) # Stable, catalog order within a rank
+
+def load_catalog(path, cache_size=1024):
+    # A JSON list of { id, name, category, type } objects, or one object per line for .jsonl files
+    with open(path, encoding='utf-8') as f:
+        items = [json.loads(line) for line in f if line.strip()] if path.endswith('.jsonl') else json.load(f)
+    return Catalog(items, cache_size)
@@ -0,0 +1,176 @@
+import numpy as np
+
+# Vectorized group-decision methods.
+#
+# Every method shares one signature and works on a *stack* of decision problems, so many rooms
+# (or many what-if member weightings of one room) are evaluated in a single call:
+#
+#   method(scores, rated, weights, item_mask, **options) -> preferences
+#
+#   scores    (B, I, C) float  rating score of item i by member c; unrated cells hold the neutral score
+#   rated     (B, I, C) bool   which cells are real ratings (only the Scoring method cares)
+#   weights   (B, C)    float  member weights, each row sums to 1 (padded members get weight 0)
+#   item_mask (B, I)    bool   False for padding rows when problems of different sizes are stacked
+#   preferences (B, I)  float  higher is better, NaN where the method cannot rank the item
+#
+# Methods register themselves in DECISION_METHODS by name; evaluate() is the entry point. Method specific
+# arguments are passed through evaluate(options={name: {...}}); Scoring requires best_score and worst_score.
+
+DECISION_METHODS = {}
+
+def decision_method(name):
+    def register(fn):
+        DECISION_METHODS[name] = fn
+        return fn
+    return register
+
+# --- Helpers ---
+def _masked_max(x, mask, axis):
+    return np.where(mask, x, -np.inf).max(axis=axis, keepdims=True)
+
+def _masked_min(x, mask, axis):
+    return np.where(mask, x, np.inf).min(axis=axis, keepdims=True)
+
+def _safe_divide(numerator, denominator, fill=0.0):
+    return np.where(denominator > 0, numerator / np.where(denominator > 0, denominator, 1), fill)
+
+def _average_ranks(x):
+    # Ascending 0-based ranks along axis 1, tied values share their average rank
+    n = x.shape[1]
+    order = np.argsort(x, axis=1, kind='stable')
+    sorted_x = np.take_along_axis(x, order, axis=1)
+    positions = np.arange(n).reshape((1, n) + (1,) * (x.ndim - 2))
+    group_start = np.ones(sorted_x.shape, dtype=bool); group_start[:, 1:] = sorted_x[:, 1:] != sorted_x[:, :-1]
+    group_end = np.ones(sorted_x.shape, dtype=bool); group_end[:, :-1] = sorted_x[:, 1:] != sorted_x[:, :-1]
+    first = np.maximum.accumulate(np.where(group_start, positions, 0), axis=1)
+    last = np.flip(np.minimum.accumulate(np.flip(np.where(group_end, positions, n - 1), axis=1), axis=1), axis=1)
+    ranks = np.empty(x.shape, dtype=float)
+    np.put_along_axis(ranks, order, (first + last) / 2.0, axis=1)
+    return ranks
+
+def scoring_order(count_nia, count_vi, avg_score, total_raw_score, item_mask=None):
+    # The Scoring method's priority: fewest strong dislikes, most strong likes, best average, best total.
+    # np.lexsort treats the last key as primary and is stable, so ties keep item order.
+    keys = [-total_raw_score, -avg_score, -count_vi, count_nia]
+    if item_mask is not None: keys.append(~item_mask) # Padding rows sort last
+    return np.lexsort(keys, axis=-1)
+
+# --- Methods ---
+@decision_method('topsis')
+def topsis(scores, rated, weights, item_mask):
+    # Min-max normalization per member (constant columns become 1), same as pymcdm's TOPSIS default
+    valid = item_mask[:, :, None]
+    col_max, col_min = _masked_max(scores, valid, 1), _masked_min(scores, valid, 1)
+    normalized = _safe_divide(scores - col_min, col_max - col_min, fill=1.0)
+    weighted = normalized * weights[:, None, :]
+    positive_ideal, negative_ideal = _masked_max(weighted, valid, 1), _masked_min(weighted, valid, 1)
+    dist_positive = np.sqrt(((weighted - positive_ideal) ** 2).sum(axis=2))
+    dist_negative = np.sqrt(((weighted - negative_ideal) ** 2).sum(axis=2))
+    # Undefined when an item is both the ideal and the anti-ideal (e.g. every rating identical)
+    return _safe_divide(dist_negative, dist_positive + dist_negative, fill=np.nan)
+
+@decision_method('scoring')
+def scoring(scores, rated, weights, item_mask, best_score, worst_score):
+    # Weighted version of the room Scoring method; with equal weights it matches the unweighted counts.
+    # best_score / worst_score are the scale's strong like and strong dislike scores (counted as VI / NIA),
+    # so they come from the rating configuration: a room where nobody used them must not promote its extremes.
+    member_weights = weights[:, None, :] * weights.shape[1] # Equal weights -> 1 per member
+    rated_weights = rated * member_weights
+    num_ratings = rated_weights.sum(axis=2)
+    total_raw_score = (rated_weights * scores).sum(axis=2)
+    # Rounded so float noise from the weights can't break ties that are exact in integer counts
+    aggregates = [np.round(a, 9) for a in (
+        (rated_weights * (scores == worst_score)).sum(axis=2),
+        (rated_weights * (scores == best_score)).sum(axis=2),
+        _safe_divide(total_raw_score, num_ratings),
+        total_raw_score,
+    )]
+    order = scoring_order(*aggregates, item_mask=item_mask)
+    # Preference = number of real items ranked at or below this one
+    num_items = item_mask.sum(axis=1, keepdims=True)
+    preferences = np.empty(order.shape, dtype=float)
+    np.put_along_axis(preferences, order, num_items - np.arange(order.shape[1])[None, :], axis=1)
+    return preferences
+
+@decision_method('borda')
+def borda(scores, rated, weights, item_mask):
+    # Each member ranks the items, an item earns one point per item it beats (half per tie)
+    padded = np.where(item_mask[:, :, None], scores, -np.inf)
+    num_padding = (~item_mask).sum(axis=1)[:, None, None]
+    points = _average_ranks(padded) - num_padding
+    return (points * weights[:, None, :]).sum(axis=2)
+
+@decision_method('copeland')
+def copeland(scores, rated, weights, item_mask):
+    # Pairwise weighted majority contests: wins minus losses. A Condorcet winner, when one exists,
+    # beats every other item and therefore always has the top Copeland score.
+    # support[i, k] = weight of members scoring i above k, built one score level at a time, so cost is
+    # (levels x I^2 x C) in BLAS rather than an (I x I x C) boolean tensor. Meant for discrete rating scales.
+    support = np.zeros(scores.shape[:2] + (scores.shape[1],))
+    for level in np.unique(scores[np.broadcast_to(item_mask[:, :, None], scores.shape)]):
+        at_level = (scores == level) * weights[:, None, :]
+        below_level = (scores < level).astype(float)
+        support += at_level @ below_level.transpose(0, 2, 1)
+    margin = support - support.transpose(0, 2, 1)
+    outcome = np.sign(np.where(np.abs(margin) > 1e-12, margin, 0))
+    pair_mask = item_mask[:, :, None] & item_mask[:, None, :]
+    return np.where(pair_mask, outcome, 0).sum(axis=2)
+
+@decision_method('vikor')
+def vikor(scores, rated, weights, item_mask, v=0.5):
+    # Compromise ranking: balances group utility (S) against the worst individual regret (R).
+    # Returned as 1 - Q so that higher is better like the other methods.
+    valid = item_mask[:, :, None]
+    best, worst = _masked_max(scores, valid, 1), _masked_min(scores, valid, 1)
+    regret = _safe_divide(best - scores, best - worst) * weights[:, None, :]
+    group_utility, individual_regret = regret.sum(axis=2), regret.max(axis=2)
+    s_best, s_worst = _masked_min(group_utility, item_mask, 1), _masked_max(group_utility, item_mask, 1)
+    r_best, r_worst = _masked_min(individual_regret, item_mask, 1), _masked_max(individual_regret, item_mask, 1)
+    q = (v * _safe_divide(group_utility - s_best, s_worst - s_best)
+         + (1 - v) * _safe_divide(individual_regret - r_best, r_worst - r_best))
+    return 1.0 - q
+
+# --- Entry points ---
+def evaluate(scores, rated=None, weights=None, methods=None, item_mask=None, options=None):
+    # Accepts a single (I, C) problem or a (B, I, C) stack; returns { method_name: preferences }
+    # shaped (I,) or (B, I) to match. weights may be (C,) shared by the whole stack or (B, C).
+    scores = np.asarray(scores, dtype=float)
+    single = scores.ndim == 2
+    if single: scores = scores[None]
+    num_problems, num_items, num_members = scores.shape
+    rated = np.ones(scores.shape, dtype=bool) if rated is None else np.broadcast_to(np.asarray(rated, dtype=bool).reshape((-1, num_items, num_members)), scores.shape)
+    weights = np.full(num_members, 1.0 / num_members) if weights is None else np.asarray(weights, dtype=float)
+    weights = np.broadcast_to(weights, (num_problems, num_members))
+    item_mask = np.ones((num_problems, num_items), dtype=bool) if item_mask is None else np.broadcast_to(np.asarray(item_mask, dtype=bool).reshape((-1, num_items)), (num_problems, num_items))
+    options = options or {}
+
+    results = {}
+    for name in methods or DECISION_METHODS:
+        if name not in DECISION_METHODS: raise ValueError(f"Unknown decision method: {name}")
+        preferences = DECISION_METHODS[name](scores, rated, weights, item_mask, **options.get(name, {}))
+        preferences = np.where(item_mask, preferences, np.nan)
+        results[name] = preferences[0] if single else preferences
+    return results
+
+def best_alternatives(preferences):
+    # Index of the top item per problem (first one on ties), -1 where nothing could be ranked
+    preferences = np.asarray(preferences, dtype=float)
+    all_undefined = np.isnan(preferences).all(axis=-1)
+    winners = np.argmax(np.where(np.isnan(preferences), -np.inf, preferences), axis=-1)
+    return np.where(all_undefined, -1, winners)
+
+def stack_problems(problems):
+    # Pads (scores, rated) pairs of different sizes into one batch for evaluate().
+    # Padded members get weight 0 and padded items are masked out, so results match per-problem runs.
+    num_items = max(scores.shape[0] for scores, _ in problems)
+    num_members = max(scores.shape[1] for scores, _ in problems)
+    batch_scores = np.zeros((len(problems), num_items, num_members))
+    batch_rated = np.zeros(batch_scores.shape, dtype=bool)
+    weights = np.zeros((len(problems), num_members))
+    item_mask = np.zeros((len(problems), num_items), dtype=bool)
+    for idx, (scores, rated) in enumerate(problems):
+        i, c = scores.shape
+        batch_scores[idx, :i, :c] = scores; batch_rated[idx, :i, :c] = rated
+        weights[idx, :c] = 1.0 / c if c else 0.0
+        item_mask[idx, :i] = True
+    return batch_scores, batch_rated, weights, item_mask
@@ -0,0 +1,225 @@
+import atexit
+import cProfile
+import itertools
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+# Metrics, structured logging and slow-request profiling.
+#
+# Metrics live in a process-local registry and are rendered in the Prometheus text exposition format:
+#   Counter    only goes up, one value per label set
+#   Gauge      set/inc/dec directly, or computed by a callback at scrape time
+#   Histogram  cumulative buckets + sum + count, one series per label set
+# An update takes one lock and bumps a number, cheap enough for the broadcast and action paths.
+#
+# Logs are one record per event: log_event(logger, level, 'room_closed', room_id=..., reason=...) renders
+# as a JSON line (or key=value text). Request threads only enqueue records; a QueueListener thread does
+# the write to stderr. Records logged with sampled=True (per-broadcast, per-join noise) are kept with
+# probability sample_rate, and level 'OFF' disables logging entirely.
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_value(value):
+    if value == float('inf'): return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, label_names=()):
+        self.name, self.documentation, self.label_names = name, documentation, tuple(label_names)
+        self.lock = threading.Lock()
+        self.values = {} # label values tuple -> value
+
+    def _key(self, labels):
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def _series(self, suffix, key, extra=()):
+        pairs = list(zip(self.label_names, key)) + list(extra)
+        labels = ','.join(f'{name}="{_escape(value)}"' for name, value in pairs)
+        return f"{self.name}{suffix}{{{labels}}}" if labels else f"{self.name}{suffix}"
+
+    def samples(self):
+        with self.lock: return [(self._series('', key), value) for key, value in sorted(self.values.items())]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines += [f"{series} {_format_value(value)}" for series, value in self.samples()]
+        return '\n'.join(lines)
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.lock: self.values[key] = self.values.get(key, 0) + amount
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, label_names=(), function=None):
+        super().__init__(name, documentation, label_names)
+        self.function = function # () -> value, evaluated at scrape time
+
+    def set(self, value, **labels):
+        with self.lock: self.values[self._key(labels)] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.lock: self.values[key] = self.values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def samples(self):
+        if self.function is not None: return [(self._series('', ()), self.function())]
+        return super().samples()
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, label_names=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, label_names)
+        self.buckets = tuple(buckets) + (float('inf'),)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self.lock:
+            series = self.values.get(key)
+            if series is None: series = self.values[key] = [[0] * len(self.buckets), 0.0, 0] # bucket counts, sum, count
+            for i, bound in enumerate(self.buckets):
+                if value <= bound: series[0][i] += 1; break
+            series[1] += value; series[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try: yield
+        finally: self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self):
+        samples = []
+        with self.lock:
+            for key, (counts, total, count) in sorted(self.values.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    samples.append((self._series('_bucket', key, [('le', _format_value(bound))]), cumulative))
+                samples.append((self._series('_sum', key), total))
+                samples.append((self._series('_count', key), count))
+        return samples
+
+class MetricsRegistry:
+    def __init__(self, enabled=True):
+        self.enabled = enabled # Disabled registries still hand out metrics, they just render nothing
+        self.metrics = []
+
+    def _register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, label_names=()):
+        return self._register(Counter(name, documentation, label_names))
+
+    def gauge(self, name, documentation, label_names=(), function=None):
+        return self._register(Gauge(name, documentation, label_names, function))
+
+    def histogram(self, name, documentation, label_names=(), buckets=LATENCY_BUCKETS):
+        return self._register(Histogram(name, documentation, label_names, buckets))
+
+    def render(self):
+        if not self.enabled: return ''
+        return '\n'.join(metric.render() for metric in self.metrics) + '\n'
+
+# --- Structured logging ---
+class StructuredFormatter(logging.Formatter):
+    def __init__(self, json_lines=True):
+        super().__init__()
+        self.json_lines = json_lines
+
+    def format(self, record):
+        fields = {'ts': round(record.created, 3), 'level': record.levelname.lower(), 'logger': record.name, 'event': record.getMessage()}
+        fields.update(getattr(record, 'fields', {}))
+        if record.exc_info: fields['exc'] = self.formatException(record.exc_info)
+        if self.json_lines: return json.dumps(fields, default=str, ensure_ascii=False)
+        head = f"{time.strftime('%H:%M:%S', time.localtime(record.created))} {record.levelname:<7} {fields.pop('event')}"
+        for key in ('ts', 'level', 'logger'): fields.pop(key)
+        return ' '.join([head] + [f"{key}={value}" for key, value in fields.items()])
+
+class SamplingFilter(logging.Filter):
+    def __init__(self, sample_rate):
+        super().__init__()
+        self.sample_rate = sample_rate
+
+    def filter(self, record):
+        return not getattr(record, 'sampled', False) or random.random() < self.sample_rate
+
+def configure_logging(name, level='INFO', json_lines=True, sample_rate=1.0):
+    # Sets up the named logger (child loggers such as name.journal share its handler) and returns it
+    logger = logging.getLogger(name)
+    logger.propagate = False
+    for handler in list(logger.handlers): logger.removeHandler(handler)
+    if str(level).upper() == 'OFF':
+        logger.disabled = True
+        logger.setLevel(logging.CRITICAL + 1) # Child loggers inherit this, so their records stop too
+        return logger
+    logger.disabled = False
+    logger.setLevel(str(level).upper())
+    records = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(records)
+    queue_handler.setFormatter(StructuredFormatter(json_lines)) # Formatted by the caller, written by the listener
+    queue_handler.addFilter(SamplingFilter(sample_rate))
+    logger.addHandler(queue_handler)
+    listener = logging.handlers.QueueListener(records, logging.StreamHandler())
+    listener.start()
+    atexit.register(listener.stop)
+    return logger
+
+def log_event(logger, level, event, sampled=False, exc_info=False, **fields):
+    if logger.isEnabledFor(level): logger.log(level, event, exc_info=exc_info, extra={'fields': fields, 'sampled': sampled})
+
+# --- Slow request profiling ---
+class SlowRequestProfiler:
+    # Profiles every request while enabled and keeps a cProfile dump (pstats format) of those slower than the threshold
+    def __init__(self, threshold_ms, directory, logger=None):
+        self.threshold_ms, self.directory, self.logger = threshold_ms, directory, logger
+        self.dump_ids = itertools.count(1) # Keeps file names unique within one second
+
+    @property
+    def enabled(self):
+        return bool(self.threshold_ms)
+
+    def start(self):
+        if not self.enabled: return None
+        profiler = cProfile.Profile()
+        try: profiler.enable()
+        except ValueError: return None # Another profiler is already active in this interpreter
+        return profiler, time.perf_counter()
+
+    def stop(self, token, name):
+        if token is None: return
+        profiler, start = token
+        profiler.disable()
+        elapsed_ms = (time.perf_counter() - start) * 1000.0
+        if elapsed_ms < self.threshold_ms: return
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"{time.strftime('%Y%m%d-%H%M%S')}-{next(self.dump_ids)}-{re.sub(r'[^A-Za-z0-9_.-]+', '_', name).strip('_')}-{elapsed_ms:.0f}ms.prof")
+        profiler.dump_stats(path)
+        if self.logger: log_event(self.logger, logging.WARNING, 'slow_request_profiled', name=name, elapsed_ms=round(elapsed_ms, 1), path=path)
+
+    @contextmanager
+    def profile(self, name):
+        token = self.start()
+        try: yield
+        finally: self.stop(token, name)
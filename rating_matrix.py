@@ -0,0 +1,146 @@
+import numpy as np
+
+# Compact ratings store for one room: an int8 matrix of items x members holding emotion codes
+# (0 = not rated, 1..N = position in EMOTION_RATINGS_CONFIG). Rows follow the order of
+# room['public_items'] and columns follow room['members'], so the active view can be handed
+# straight to the decision functions.
+#
+# Alongside the matrix we keep a running histogram per item (how many members picked each code).
+# It is updated in O(1) on every set/change/clear and adjusted when an item or member is removed,
+# so per-item aggregates (sums, counts, averages) never need a full rescan on the hot path.
+
+MIN_CAPACITY = 8
+
+class RatingMatrix:
+    def __init__(self, num_codes, item_capacity=MIN_CAPACITY, member_capacity=MIN_CAPACITY):
+        self.codes = np.zeros((item_capacity, member_capacity), dtype=np.int8)
+        self.code_counts = np.zeros((item_capacity, num_codes), dtype=np.int32) # column 0 (not rated) stays 0
+        self.item_ids = [] # row -> unique_instance_id
+        self.member_ids = [] # column -> user_id
+        self.item_index = {} # unique_instance_id -> row
+        self.member_index = {} # user_id -> column
+
+    @property
+    def num_items(self): return len(self.item_ids)
+
+    @property
+    def num_members(self): return len(self.member_ids)
+
+    def view(self):
+        # Active (items x members) region, no copy
+        return self.codes[:self.num_items, :self.num_members]
+
+    def counts_view(self):
+        # Active (items x codes) histogram, no copy
+        return self.code_counts[:self.num_items]
+
+    # --- Capacity management (amortized doubling / halving) ---
+    def _resize(self, item_capacity, member_capacity):
+        new_codes = np.zeros((item_capacity, member_capacity), dtype=np.int8)
+        new_codes[:self.num_items, :self.num_members] = self.view()
+        new_counts = np.zeros((item_capacity, self.code_counts.shape[1]), dtype=np.int32)
+        new_counts[:self.num_items] = self.counts_view()
+        self.codes = new_codes; self.code_counts = new_counts
+
+    def _grow_if_full(self):
+        item_cap, member_cap = self.codes.shape
+        if self.num_items >= item_cap or self.num_members >= member_cap:
+            self._resize(max(item_cap * 2, MIN_CAPACITY) if self.num_items >= item_cap else item_cap,
+                         max(member_cap * 2, MIN_CAPACITY) if self.num_members >= member_cap else member_cap)
+
+    def _shrink_if_sparse(self):
+        item_cap, member_cap = self.codes.shape
+        shrink_items = item_cap > MIN_CAPACITY and self.num_items <= item_cap // 4
+        shrink_members = member_cap > MIN_CAPACITY and self.num_members <= member_cap // 4
+        if shrink_items or shrink_members:
+            self._resize(item_cap // 2 if shrink_items else item_cap,
+                         member_cap // 2 if shrink_members else member_cap)
+
+    # --- Items (rows) ---
+    def add_item(self, item_id):
+        if item_id in self.item_index: return self.item_index[item_id]
+        self._grow_if_full()
+        row = self.num_items
+        self.codes[row, :] = 0; self.code_counts[row, :] = 0
+        self.item_ids.append(item_id); self.item_index[item_id] = row
+        return row
+
+    def remove_item(self, item_id):
+        row = self.item_index.pop(item_id, None)
+        if row is None: return False
+        n = self.num_items
+        # Shift later rows up so row order keeps matching room['public_items']
+        self.codes[row:n - 1, :] = self.codes[row + 1:n, :]
+        self.codes[n - 1, :] = 0
+        self.code_counts[row:n - 1] = self.code_counts[row + 1:n]
+        self.code_counts[n - 1] = 0
+        del self.item_ids[row]
+        for shifted_row in range(row, n - 1): self.item_index[self.item_ids[shifted_row]] = shifted_row
+        self._shrink_if_sparse()
+        return True
+
+    # --- Members (columns) ---
+    def add_member(self, member_id):
+        if member_id in self.member_index: return self.member_index[member_id]
+        self._grow_if_full()
+        col = self.num_members
+        self.codes[:, col] = 0
+        self.member_ids.append(member_id); self.member_index[member_id] = col
+        return col
+
+    def remove_member(self, member_id):
+        col = self.member_index.pop(member_id, None)
+        if col is None: return False
+        m = self.num_members
+        # Take the leaving member's ratings out of every item's histogram
+        n = self.num_items
+        np.subtract.at(self.code_counts, (np.arange(n), self.codes[:n, col].astype(np.intp)), 1)
+        self.code_counts[:, 0] = 0
+        self.codes[:, col:m - 1] = self.codes[:, col + 1:m]
+        self.codes[:, m - 1] = 0
+        del self.member_ids[col]
+        for shifted_col in range(col, m - 1): self.member_index[self.member_ids[shifted_col]] = shifted_col
+        self._shrink_if_sparse()
+        return True
+
+    # --- Ratings ---
+    def get(self, item_id, member_id):
+        return int(self.codes[self.item_index[item_id], self.member_index[member_id]])
+
+    def set(self, item_id, member_id, code):
+        row, col = self.item_index[item_id], self.member_index[member_id]
+        old_code = self.codes[row, col]
+        if old_code: self.code_counts[row, old_code] -= 1
+        if code: self.code_counts[row, code] += 1
+        self.codes[row, col] = code
+
+    def item_codes(self, item_id):
+        # { member_id: code } for the members that rated this item
+        row = self.codes[self.item_index[item_id], :self.num_members]
+        return {self.member_ids[col]: int(row[col]) for col in np.flatnonzero(row)}
+
+    def load(self, item_ids, member_ids, codes):
+        # Bulk restore of saved codes onto existing rows/columns (ids no longer present are ignored)
+        rows = [(src, self.item_index[i]) for src, i in enumerate(item_ids) if i in self.item_index]
+        cols = [(src, self.member_index[m]) for src, m in enumerate(member_ids) if m in self.member_index]
+        if rows and cols:
+            (src_rows, dst_rows), (src_cols, dst_cols) = zip(*rows), zip(*cols)
+            self.codes[np.ix_(dst_rows, dst_cols)] = codes[np.ix_(src_rows, src_cols)]
+        self._rebuild_counts()
+
+    def _rebuild_counts(self):
+        active = self.view()
+        for code in range(1, self.code_counts.shape[1]):
+            self.code_counts[:self.num_items, code] = np.count_nonzero(active == code, axis=1)
+
+    def copy(self):
+        # Compact snapshot (active region only), e.g. to hand to a decision worker
+        clone = RatingMatrix.__new__(RatingMatrix)
+        clone.codes = self.view().copy(); clone.code_counts = self.counts_view().copy()
+        clone.item_ids = list(self.item_ids); clone.member_ids = list(self.member_ids)
+        clone.item_index = dict(self.item_index); clone.member_index = dict(self.member_index)
+        return clone
+
+    def clear(self):
+        self.view()[:] = 0
+        self.counts_view()[:] = 0
@@ -0,0 +1,110 @@
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from instrumentation import log_event
+
+# Durable room state: an append-only journal of room change records plus a periodic snapshot.
+#
+# append() only puts the record on a queue, so request handlers never touch the disk. A writer thread
+# drains the queue in batches, writes JSON lines and fsyncs once per batch. After every
+# compact_every records it asks the app for a snapshot of all rooms, writes it atomically and
+# truncates the journal, so recovery cost follows the snapshot size rather than the history length.
+#
+# Records are replayed by the app on startup: snapshot first, then the journal tail. Each snapshotted
+# room carries its version, so journal records already covered by the snapshot can be skipped.
+
+SNAPSHOT_FILE = 'rooms.snapshot.json'
+JOURNAL_FILE = 'rooms.journal'
+
+logger = logging.getLogger('decider.journal')
+
+class RoomJournal:
+    def __init__(self, directory, snapshot_provider, fsync_interval=0.05, compact_every=5000):
+        self.directory = directory
+        self.snapshot_provider = snapshot_provider # () -> JSON-safe dict of all rooms
+        self.fsync_interval = fsync_interval
+        self.compact_every = compact_every
+        self.snapshot_path = os.path.join(directory, SNAPSHOT_FILE)
+        self.journal_path = os.path.join(directory, JOURNAL_FILE)
+        self.records = queue.Queue()
+        self.records_since_snapshot = 0
+        self.journal_file = None
+        self.writer = None
+
+    # --- Startup ---
+    def load(self):
+        # Returns (snapshot rooms dict, list of journal records written after it)
+        os.makedirs(self.directory, exist_ok=True)
+        snapshot_rooms = {}
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, encoding='utf-8') as f:
+                snapshot_rooms = json.load(f).get('rooms', {})
+        records = []
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, encoding='utf-8') as f:
+                for line in f:
+                    try: records.append(json.loads(line))
+                    except json.JSONDecodeError: break # Torn write at the tail from a crash
+        self.records_since_snapshot = len(records)
+        return snapshot_rooms, records
+
+    def start(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self.journal_file = open(self.journal_path, 'a', encoding='utf-8')
+        self.writer = threading.Thread(target=self._writer_loop, name='room-journal-writer', daemon=True)
+        self.writer.start()
+
+    def close(self):
+        if not self.writer: return
+        self.records.put(None)
+        self.writer.join()
+        self.writer = None
+
+    # --- Hot path ---
+    def append(self, record):
+        self.records.put(record)
+
+    # --- Writer thread ---
+    def _writer_loop(self):
+        while True:
+            batch = [self.records.get()]
+            deadline = time.monotonic() + self.fsync_interval
+            while batch[-1] is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0: break
+                try: batch.append(self.records.get(timeout=remaining))
+                except queue.Empty: break
+            stopping = batch[-1] is None
+            records = [r for r in batch if r is not None]
+            if records:
+                try: self._write_batch(records)
+                except Exception: log_event(logger, logging.ERROR, 'journal_write_failed', exc_info=True)
+            if self.records_since_snapshot >= self.compact_every:
+                try: self.compact()
+                except Exception: log_event(logger, logging.ERROR, 'journal_compaction_failed', exc_info=True) # Retried after the next batch
+            if stopping:
+                self.journal_file.close()
+                return
+
+    def _write_batch(self, records):
+        self.journal_file.write(''.join(json.dumps(r, separators=(',', ':')) + '\n' for r in records))
+        self.journal_file.flush()
+        os.fsync(self.journal_file.fileno())
+        self.records_since_snapshot += len(records)
+
+    def compact(self):
+        # Runs on the writer thread, so nothing is appended to the journal while it is rewritten
+        rooms = self.snapshot_provider()
+        tmp_path = self.snapshot_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'created_at': time.time(), 'rooms': rooms}, f, separators=(',', ':'))
+            f.flush(); os.fsync(f.fileno())
+        os.replace(tmp_path, self.snapshot_path)
+        # Records written so far are covered by the snapshot (or skipped by version on replay)
+        self.journal_file.close()
+        self.journal_file = open(self.journal_path, 'w', encoding='utf-8')
+        self.records_since_snapshot = 0
+        log_event(logger, logging.INFO, 'journal_compacted', rooms=len(rooms))
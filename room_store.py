@@ -0,0 +1,215 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from contextlib import contextmanager
+
+# Room storage backends. The app only talks to this interface:
+#
+#   get(room_id) -> room | None      current state, unsynchronized (existence checks)
+#   read(room_id) -> context         yields a consistent room (or None) for serializing
+#   update(room_id) -> context       yields the room (or None); changes are saved atomically on exit
+#   create(room) -> bool             False if the room ID is taken
+#   create_locked(room) -> context   create() that yields the bool and keeps the new room locked like update()
+#                                    until the block exits, so the creator finishes (e.g. journals it) first
+#   delete(room_id), room_ids(), items(), len(store)
+#   idle_room_ids(cutoff)            rooms not updated since the cutoff timestamp
+#   lru_room_ids(count)              the count least recently updated rooms
+#
+# MemoryRoomStore keeps live room objects in a dict (single process, the default). Each room has its own
+# reentrant lock held by read()/update(), so handlers for different rooms run concurrently while those
+# for one room are serialized; a registry lock only guards adding/removing rooms and the LRU order.
+# SQLiteRoomStore keeps encoded rooms in a key-value table shared by every worker process, standing in
+# for an external KV store. Rooms are spread over shard files by a hash of the room ID, and update()
+# holds the shard's write transaction so a read-modify-write of one room is atomic across workers.
+
+class MemoryRoomStore:
+    shared = False # State lives in this process only
+
+    def __init__(self):
+        self.rooms = OrderedDict() # Least recently updated first
+        self.updated_at = {} # room_id -> time.time() of the last update
+        self.locks = {} # room_id -> RLock
+        self.registry_lock = threading.Lock() # Guards the three dicts above, never held while waiting on a room lock
+
+    def get(self, room_id):
+        return self.rooms.get(room_id)
+
+    @contextmanager
+    def _locked(self, room_id, touch):
+        with self.registry_lock: lock = self.locks.get(room_id)
+        if lock is None:
+            yield None
+            return
+        with lock:
+            with self.registry_lock:
+                room = self.rooms.get(room_id) # Deleted while we waited?
+                if room is not None and touch: self._touch(room_id)
+            yield room
+
+    def read(self, room_id):
+        return self._locked(room_id, touch=False)
+
+    def update(self, room_id):
+        return self._locked(room_id, touch=True) # Live object, mutated in place
+
+    def _touch(self, room_id):
+        self.rooms.move_to_end(room_id)
+        self.updated_at[room_id] = time.time()
+
+    def create(self, room):
+        with self.create_locked(room) as created: return created
+
+    @contextmanager
+    def create_locked(self, room):
+        lock = threading.RLock()
+        with lock: # Held before the room is published
+            with self.registry_lock:
+                created = room['id'] not in self.rooms
+                if created:
+                    self.rooms[room['id']] = room
+                    self.locks[room['id']] = lock
+                    self._touch(room['id'])
+            yield created
+
+    def delete(self, room_id):
+        with self.registry_lock:
+            self.rooms.pop(room_id, None)
+            self.updated_at.pop(room_id, None)
+            self.locks.pop(room_id, None)
+
+    def room_ids(self):
+        with self.registry_lock: return list(self.rooms)
+
+    def items(self):
+        with self.registry_lock: return list(self.rooms.items())
+
+    def __len__(self):
+        return len(self.rooms)
+
+    def idle_room_ids(self, cutoff):
+        # Rooms are kept in update order, so this stops at the first recently updated one
+        idle = []
+        with self.registry_lock:
+            for room_id in self.rooms:
+                if self.updated_at[room_id] >= cutoff: break
+                idle.append(room_id)
+        return idle
+
+    def lru_room_ids(self, count):
+        with self.registry_lock: return [room_id for room_id, _ in zip(self.rooms, range(count))]
+
+class SQLiteRoomStore:
+    shared = True # Every worker pointed at the same directory sees the same rooms
+
+    def __init__(self, directory, encode, decode, num_shards=4):
+        # encode(room) -> JSON-safe dict, decode(dict) -> room; the store never looks inside a room
+        self.encode, self.decode = encode, decode
+        os.makedirs(directory, exist_ok=True)
+        self.paths = [os.path.join(directory, f'rooms-{shard}.sqlite3') for shard in range(num_shards)]
+        self.local = threading.local()
+        for shard in range(num_shards):
+            conn = self._connection(shard)
+            conn.execute('CREATE TABLE IF NOT EXISTS rooms (room_id TEXT PRIMARY KEY, data TEXT NOT NULL, updated_at REAL NOT NULL)')
+            conn.execute('CREATE INDEX IF NOT EXISTS rooms_updated_at ON rooms (updated_at)')
+
+    def shard_for(self, room_id):
+        return zlib.crc32(room_id.encode()) % len(self.paths)
+
+    def _connection(self, shard):
+        # One connection per thread and shard; autocommit except inside update()
+        if not hasattr(self.local, 'connections'):
+            self.local.connections = {}; self.local.depth = {}; self.local.open_rooms = {}
+        if shard not in self.local.connections:
+            conn = sqlite3.connect(self.paths[shard], timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL'); conn.execute('PRAGMA synchronous=NORMAL')
+            self.local.connections[shard] = conn; self.local.depth[shard] = 0
+        return self.local.connections[shard]
+
+    def _load(self, conn, room_id):
+        row = conn.execute('SELECT data FROM rooms WHERE room_id = ?', (room_id,)).fetchone()
+        return self.decode(json.loads(row[0])) if row else None
+
+    def _save(self, conn, room):
+        conn.execute('INSERT OR REPLACE INTO rooms (room_id, data, updated_at) VALUES (?, ?, ?)',
+                     (room['id'], json.dumps(self.encode(room), separators=(',', ':')), time.time()))
+
+    def get(self, room_id):
+        conn = self._connection(self.shard_for(room_id))
+        if room_id in self.local.open_rooms: return self.local.open_rooms[room_id] # Read your own update
+        return self._load(conn, room_id)
+
+    @contextmanager
+    def read(self, room_id):
+        yield self.get(room_id) # A decoded copy of the last committed state
+
+    @contextmanager
+    def update(self, room_id):
+        shard = self.shard_for(room_id)
+        conn = self._connection(shard)
+        if room_id in self.local.open_rooms: # Nested update of the same room joins the outer one
+            yield self.local.open_rooms[room_id]
+            return
+        outermost = self.local.depth[shard] == 0
+        if outermost: conn.execute('BEGIN IMMEDIATE') # Takes the shard write lock up front
+        self.local.depth[shard] += 1
+        try:
+            room = self._load(conn, room_id)
+            if room is not None: self.local.open_rooms[room_id] = room
+            yield room
+            if room is not None and room_id in self.local.open_rooms: self._save(conn, room) # Not deleted meanwhile
+            if outermost: conn.execute('COMMIT')
+        except BaseException:
+            if outermost: conn.execute('ROLLBACK')
+            raise
+        finally:
+            self.local.depth[shard] -= 1
+            self.local.open_rooms.pop(room_id, None)
+
+    def create(self, room):
+        with self.create_locked(room) as created: return created
+
+    @contextmanager
+    def create_locked(self, room):
+        # Inserted inside the shard write transaction of update(), other workers only see it on commit
+        with self.update(room['id']) as existing:
+            if existing is not None:
+                yield False
+                return
+            cursor = self._connection(self.shard_for(room['id'])).execute(
+                'INSERT OR IGNORE INTO rooms (room_id, data, updated_at) VALUES (?, ?, ?)',
+                (room['id'], json.dumps(self.encode(room), separators=(',', ':')), time.time()))
+            yield cursor.rowcount == 1
+
+    def delete(self, room_id):
+        self._connection(self.shard_for(room_id)).execute('DELETE FROM rooms WHERE room_id = ?', (room_id,))
+        self.local.open_rooms.pop(room_id, None)
+
+    def room_ids(self):
+        return [row[0] for shard in range(len(self.paths))
+                for row in self._connection(shard).execute('SELECT room_id FROM rooms')]
+
+    def items(self):
+        return [(room_id, self.get(room_id)) for room_id in self.room_ids()]
+
+    def __len__(self):
+        return sum(self._connection(shard).execute('SELECT COUNT(*) FROM rooms').fetchone()[0] for shard in range(len(self.paths)))
+
+    def idle_room_ids(self, cutoff):
+        return [row[0] for shard in range(len(self.paths))
+                for row in self._connection(shard).execute('SELECT room_id FROM rooms WHERE updated_at < ?', (cutoff,))]
+
+    def lru_room_ids(self, count):
+        # Oldest count per shard, then merged
+        candidates = [row for shard in range(len(self.paths))
+                      for row in self._connection(shard).execute('SELECT updated_at, room_id FROM rooms ORDER BY updated_at LIMIT ?', (count,))]
+        return [room_id for _, room_id in sorted(candidates)[:count]]
+
+def create_room_store(url, encode, decode, num_shards=4):
+    # 'memory' or 'sqlite:///path/to/directory'
+    if url in (None, '', 'memory'): return MemoryRoomStore()
+    if url.startswith('sqlite:///'): return SQLiteRoomStore(url[len('sqlite:///'):], encode, decode, num_shards)
+    raise ValueError(f"Unknown room store: {url}")
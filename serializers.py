@@ -0,0 +1,54 @@
+import json
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError: # Optional, falls back to the standard library
+    orjson = None
+
+try:
+    import msgpack
+except ImportError: # Optional, the 'msgpack' wire format is only offered when installed
+    msgpack = None
+
+# Wire formats for room payloads, negotiated per socket on join_sio_room:
+#   'json'     verbose room dicts (emotion keys as strings), for older clients
+#   'compact'  items as value lists + an integer rating code matrix, sent as JSON
+#   'msgpack'  the compact payload packed into a binary MessagePack attachment
+# JSON text (Flask responses and Socket.IO packets) is produced by orjson when it is installed.
+
+WIRE_FORMATS = ('json', 'compact') + (('msgpack',) if msgpack else ())
+
+def negotiate_wire_format(requested, msgpack_enabled=True):
+    if requested in WIRE_FORMATS and (requested != 'msgpack' or msgpack_enabled): return requested
+    return 'compact' if requested == 'msgpack' else 'json' # msgpack asked for but not installed or not enabled
+
+def encode_payload(wire_format, payload):
+    if wire_format == 'msgpack': return msgpack.packb(payload, use_bin_type=True)
+    return payload # Encoded as JSON by the Socket.IO packet layer
+
+def payload_size(payload):
+    # Encoded size in bytes, without Socket.IO packet framing
+    if isinstance(payload, (bytes, bytearray)): return len(payload)
+    return len(FastJSON.dumps(payload).encode())
+
+class FastJSON:
+    # Drop-in for the json module in python-socketio's packet encoder
+    @staticmethod
+    def dumps(obj, **kwargs):
+        if orjson: return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode()
+        return json.dumps(obj, separators=(',', ':'))
+
+    @staticmethod
+    def loads(s, **kwargs):
+        return orjson.loads(s) if orjson else json.loads(s)
+
+class FastJSONProvider(DefaultJSONProvider):
+    # Flask JSON provider (jsonify, request.json) backed by orjson; keys are not sorted
+    def dumps(self, obj, **kwargs):
+        if orjson is None: return super().dumps(obj, **kwargs)
+        option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if kwargs.get('indent') else 0)
+        return orjson.dumps(obj, default=self.default, option=option).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s) if orjson else super().loads(s, **kwargs)
@@ -5,15 +5,6 @@ let currentUserName = sessionStorage.getItem('group_decider_user_name_v4_topsis_
 let currentRoomData = null;
 let isHost = false;
 
-const FAKE_DATA_ITEMS_FRONTEND = [
-    { id: 'p1', name: 'Eiffel Tower', category: 'Landmark', type: 'place' },
-    { id: 'r1', name: 'Pizza Place Roma', category: 'Italian', type: 'restaurant' },
-    { id: 'a1', name: 'Cinema City - Action Movie', category: 'Entertainment', type: 'activity' },
-    { id: 'p2', name: 'Louvre Museum', category: 'Art', type: 'place' },
-    { id: 'r2', name: 'Sushi Samba', category: 'Japanese', type: 'restaurant' },
-    { id: 'a2', name: 'The Board Room Cafe', category: 'Games', type: 'activity' },
-];
-
 const EMOTION_RATINGS_FRONTEND = {
     'VERY_INTERESTED': { emoji: '😍', score: 5, label: 'Very Interested' },
     'INTERESTED': { emoji: '🙂', score: 3, label: 'Interested' },
@@ -23,6 +14,64 @@ const EMOTION_RATINGS_FRONTEND = {
 };
 const EMOTION_KEYS_FRONTEND = Object.keys(EMOTION_RATINGS_FRONTEND);
 
+// --- Wire Format ---
+// Room payloads come in a compact form (items as value lists, ratings as integer codes). MessagePack
+// payloads arrive as binary attachments and are only requested when the page loaded the msgpack library,
+// which it does only when the server enables msgpack.
+const PREFERRED_WIRE_FORMAT = window.MessagePack ? 'msgpack' : 'compact';
+let compactItemFields = null; // Field order of compact items, from the last compact snapshot
+let compactEmotionKeys = null; // Rating code -> emotion key, from the last compact snapshot
+
+function joinSocketRoom(roomId) {
+    socket.emit('join_sio_room', { room_id: roomId, user_id: currentUserId, format: PREFERRED_WIRE_FORMAT }, (ack) => {
+        if (ack) console.log('CLIENT: Room payload format:', ack.format);
+    });
+}
+
+function decodeRoomPayload(data) {
+    if (data instanceof ArrayBuffer) data = MessagePack.decode(new Uint8Array(data));
+    if (!data) return data;
+    // Snapshots ({ room }) mark the room itself as compact, patches ({ room_id, ops }) the payload
+    if (data.room && data.room.format === 'compact') data.room = expandCompactRoom(data.room);
+    if (data.format !== 'compact') return data;
+    if (data.ops) data.ops = data.ops.map(expandCompactOp);
+    delete data.format;
+    return data;
+}
+
+function expandCompactItem(values) {
+    const item = {};
+    compactItemFields.forEach((field, i) => { if (values[i] !== null) item[field] = values[i]; });
+    return item;
+}
+
+function expandCompactRoom(room) {
+    // Back to the verbose shape the rest of this file works with
+    compactItemFields = room.item_fields; compactEmotionKeys = room.emotion_keys;
+    const privateItems = {};
+    Object.entries(room.private_items).forEach(([userId, items]) => { privateItems[userId] = items.map(expandCompactItem); });
+    room.private_items = privateItems;
+    room.public_items = room.public_items.map((values, row) => {
+        const item = expandCompactItem(values);
+        item.ratings = {};
+        room.rating_codes[row].forEach((code, col) => { if (code) item.ratings[room.members[col].id] = compactEmotionKeys[code]; });
+        return item;
+    });
+    delete room.rating_codes; delete room.item_fields; delete room.emotion_keys; delete room.format;
+    return room;
+}
+
+function expandCompactOp(op) {
+    if (op.type === 'rating_set') {
+        op.emotion_key = op.code ? compactEmotionKeys[op.code] : null;
+        delete op.code;
+    } else if (op.item) {
+        op.item = expandCompactItem(op.item);
+        if (op.type === 'public_item_added') op.item.ratings = {};
+    }
+    return op;
+}
+
 // --- Socket.IO Connection ---
 const socket = io();
 
@@ -31,7 +80,7 @@ socket.on('connect', () => {
     // Ensure currentUserId exists before trying to rejoin
     if (currentUserId && currentRoomData && currentRoomData.id) {
         console.log('CLIENT: Re-emitting join_sio_room on connect for room:', currentRoomData.id, "User:", currentUserId);
-        socket.emit('join_sio_room', { room_id: currentRoomData.id, user_id: currentUserId });
+        joinSocketRoom(currentRoomData.id);
     }
 });
 
@@ -45,11 +94,17 @@ socket.on('connect_error', (error) => {
 });
 
 socket.on('room_state_updated', (data) => {
+    data = decodeRoomPayload(data);
     console.log('CLIENT: Received room_state_updated. Raw data snippet:', JSON.stringify(data).substring(0, 200) + "...");
     if (!data || !data.room) {
         console.error("CLIENT: room_state_updated received invalid data or no room object:", data);
         return;
     }
+    applyRoomSnapshot(data);
+});
+
+// Full snapshots arrive on join_sio_room and from the /state resync endpoint
+function applyRoomSnapshot(data) {
     console.log("CLIENT: Processing room_state_updated. Current room ID:", currentRoomData ? currentRoomData.id : "None", "Received room ID:", data.room.id, "My User ID:", currentUserId);
 
     const wasPreviouslyInARoom = !!currentRoomData;
@@ -79,8 +134,136 @@ socket.on('room_state_updated', (data) => {
     } else {
         console.log("CLIENT: Received update for a room I'm not part of or not relevant. Ignoring. Received Room ID:", data.room.id);
     }
+}
+
+// --- Versioned Room Patches ---
+// The server emits small versioned change events instead of the whole room. Ops must apply in order,
+// a gap in the version sequence means we missed something and need a fresh snapshot.
+let resyncInFlight = false;
+let opsBufferedDuringResync = [];
+// Our own private item ops, keyed by version. The room patch only carries a 'private_hidden' step for them,
+// they reach this member's sockets separately and ahead of that patch.
+const ownPrivateOps = new Map();
+
+socket.on('room_patch', (data) => {
+    data = decodeRoomPayload(data);
+    if (!data || !data.ops || !currentRoomData || currentRoomData.id !== data.room_id) return;
+    if (resyncInFlight) { opsBufferedDuringResync.push(...data.ops); return; }
+    applyRoomOps(data.ops);
 });
 
+socket.on('room_private_ops', (data) => {
+    data = decodeRoomPayload(data);
+    if (!data || !data.ops || !currentRoomData || currentRoomData.id !== data.room_id) return;
+    data.ops.forEach(op => ownPrivateOps.set(op.v, op));
+});
+
+// Sent when the server closes a room that sat idle too long or was evicted to stay under its room cap
+socket.on('room_closed', (data) => {
+    data = decodeRoomPayload(data);
+    if (!data || !currentRoomData || currentRoomData.id !== data.room_id) return;
+    console.log("CLIENT: Room", data.room_id, "was closed by the server:", data.reason);
+    alert(data.reason === 'idle' ? "This room was closed due to inactivity." : "This room was closed by the server.");
+    leaveCurrentRoomClientSide();
+});
+
+function applyRoomOps(ops) {
+    let onlyRatingChanges = true;
+    const ratedItemIds = new Set();
+    for (const op of ops) {
+        const currentVersion = currentRoomData.version || 0;
+        if (op.v <= currentVersion) continue; // Already part of our snapshot
+        if (op.v !== currentVersion + 1) {
+            console.warn("CLIENT: Room version gap (have", currentVersion, "got", op.v, "). Resyncing.");
+            resyncRoomState(ops.filter(o => o.v > currentVersion));
+            return;
+        }
+        applyRoomOp(op);
+        if (!currentRoomData) return; // We were removed from the room
+        currentRoomData.version = op.v;
+        if (op.type === 'rating_set') ratedItemIds.add(op.item_id);
+        else if (op.type === 'private_hidden') { if (ownPrivateOps.has(op.v)) onlyRatingChanges = false; }
+        else if (op.type !== 'provisional_ranking') onlyRatingChanges = false;
+    }
+    if (currentRoomData) ownPrivateOps.forEach((op, v) => { if (v <= currentRoomData.version) ownPrivateOps.delete(v); });
+    if (onlyRatingChanges) {
+        ratedItemIds.forEach(itemId => rerenderPublicItem(itemId));
+        renderProvisionalRanking();
+    } else {
+        renderRoomPageUI();
+    }
+}
+
+function applyRoomOp(op) {
+    const room = currentRoomData;
+    switch (op.type) {
+        case 'member_joined':
+            if (!room.members.find(m => m.id === op.member.id)) room.members.push(op.member);
+            if (!room.private_items[op.member.id]) room.private_items[op.member.id] = [];
+            break;
+        case 'member_left':
+            room.members = room.members.filter(m => m.id !== op.member_id);
+            delete room.private_items[op.member_id];
+            room.host_id = op.host_id; room.host_name = op.host_name;
+            if (op.member_id === currentUserId) {
+                alert("You are no longer in this room.");
+                leaveCurrentRoomClientSide();
+            }
+            break;
+        case 'private_item_added':
+            (room.private_items[op.user_id] = room.private_items[op.user_id] || []).push(op.item);
+            break;
+        case 'private_item_removed':
+            room.private_items[op.user_id] = (room.private_items[op.user_id] || []).filter(i => i.unique_instance_id !== op.item_id);
+            break;
+        case 'public_item_added':
+            room.public_items.push(op.item);
+            break;
+        case 'public_item_removed':
+            room.public_items = room.public_items.filter(i => i.unique_instance_id !== op.item_id);
+            break;
+        case 'rating_set': {
+            const item = room.public_items.find(i => i.unique_instance_id === op.item_id);
+            if (!item) break;
+            item.ratings = item.ratings || {};
+            if (op.emotion_key) item.ratings[op.user_id] = op.emotion_key;
+            else delete item.ratings[op.user_id];
+            break;
+        }
+        case 'private_hidden': {
+            // Another member's private list changed and only the version moves, unless the list is ours
+            const ownOp = ownPrivateOps.get(op.v);
+            if (ownOp) applyRoomOp(ownOp);
+            break;
+        }
+        case 'provisional_ranking':
+            room.provisional_ranking = op.ranking;
+            break;
+        case 'rating_status':
+            room.users_done_rating = op.users_done_rating;
+            room.final_decisions = op.final_decisions;
+            break;
+        default:
+            console.warn("CLIENT: Unknown room op type:", op.type);
+    }
+}
+
+async function resyncRoomState(pendingOps = []) {
+    if (!currentRoomData || resyncInFlight) return;
+    resyncInFlight = true;
+    opsBufferedDuringResync = pendingOps;
+    try {
+        const data = await apiCall(`/room/${currentRoomData.id}/state?format=compact&user_id=${encodeURIComponent(currentUserId)}`);
+        applyRoomSnapshot(decodeRoomPayload(data));
+    } catch (error) {
+        console.error("CLIENT: Room resync failed:", error);
+    } finally {
+        resyncInFlight = false;
+        const buffered = opsBufferedDuringResync; opsBufferedDuringResync = [];
+        if (currentRoomData && buffered.length) applyRoomOps(buffered);
+    }
+}
+
 
 // --- API Helper ---
 async function apiCall(endpoint, method = 'GET', body = null) {
@@ -146,7 +329,7 @@ window.onload = () => {
 
 
     showHomePageUI();
-    renderLocalSearchResults('');
+    searchCatalog('');
     setupDragAndDrop();
 };
 
@@ -217,7 +400,7 @@ async function createRoom() {
         // currentRoomData will be set by the 'room_state_updated' event
         // after the server processes the join_sio_room emit.
         console.log("CLIENT: Room created via API (response):", data.room.id, "Emitting join_sio_room.");
-        socket.emit('join_sio_room', { room_id: data.room.id, user_id: currentUserId });
+        joinSocketRoom(data.room.id);
         sessionStorage.setItem('group_decider_current_room_id_tab', data.room.id); // Store current room for this tab
         // The 'room_state_updated' handler will call showRoomPageUI
     } catch (error) {
@@ -239,7 +422,7 @@ async function joinRoom() {
             user_id: currentUserId // Tab-specific user ID
         });
         console.log("CLIENT: Room joined via API (response):", data.room.id, "Emitting join_sio_room.");
-        socket.emit('join_sio_room', { room_id: data.room.id, user_id: currentUserId });
+        joinSocketRoom(data.room.id);
         sessionStorage.setItem('group_decider_current_room_id_tab', data.room.id);
         // The 'room_state_updated' handler will call showRoomPageUI
     } catch (error) {
@@ -252,6 +435,7 @@ function leaveCurrentRoomClientSide() {
     console.log("CLIENT: leaveCurrentRoomClientSide() called.");
     currentRoomData = null;
     isHost = false;
+    ownPrivateOps.clear();
     sessionStorage.removeItem('group_decider_current_room_id_tab');
     showHomePageUI();
 }
@@ -275,24 +459,41 @@ async function leaveCurrentRoom() {
     }
 }
 
-// ... (copyRoomIdToClipboard, filterLocalItems, renderLocalSearchResults - same)
+// ... (copyRoomIdToClipboard - same)
 function copyRoomIdToClipboard() {
     if (!currentRoomData) return;
     navigator.clipboard.writeText(currentRoomData.id).then(() => {
         alert('Room ID copied to clipboard!');
     }).catch(err => { console.error('CLIENT: Failed to copy Room ID: ', err); prompt("Copy Room ID:", currentRoomData.id); });
 }
-function filterLocalItems() {
-    const searchTerm = document.getElementById('searchInput').value.toLowerCase();
-    renderLocalSearchResults(searchTerm);
+// --- Catalog Search ---
+// Searched on the server (indexed, paginated); typing is debounced and stale responses are dropped
+const CATALOG_SEARCH_DEBOUNCE_MS = 150;
+let catalogSearchTimer = null;
+let catalogSearch = { query: '', nextOffset: null, requestId: 0 };
+
+function onCatalogSearchInput() {
+    clearTimeout(catalogSearchTimer);
+    const query = document.getElementById('searchInput').value;
+    catalogSearchTimer = setTimeout(() => searchCatalog(query), CATALOG_SEARCH_DEBOUNCE_MS);
 }
-function renderLocalSearchResults(term) {
+async function searchCatalog(query, offset = 0) {
+    const requestId = ++catalogSearch.requestId;
+    try {
+        const data = await apiCall(`/catalog/search?q=${encodeURIComponent(query)}&offset=${offset}`);
+        if (requestId !== catalogSearch.requestId) return; // A newer search superseded this one
+        catalogSearch.query = query; catalogSearch.nextOffset = data.next_offset;
+        renderCatalogSearchResults(data.items, offset > 0);
+    } catch (error) {
+        console.error("CLIENT: Catalog search failed:", error);
+    }
+}
+function renderCatalogSearchResults(items, append) {
     const resultsUl = document.getElementById('searchResults');
-    resultsUl.innerHTML = '';
-    const filtered = FAKE_DATA_ITEMS_FRONTEND.filter(item =>
-        item.name.toLowerCase().includes(term) || item.category.toLowerCase().includes(term) || item.type.toLowerCase().includes(term)
-    );
-    filtered.forEach(item => {
+    if (!append) resultsUl.innerHTML = '';
+    const loadMore = resultsUl.querySelector('.load-more');
+    if (loadMore) loadMore.remove();
+    items.forEach(item => {
         const li = document.createElement('li');
         li.innerHTML = `<div class="item-main-info"><span class="item-text">${item.name} (${item.category})</span></div>`;
         li.draggable = true;
@@ -301,6 +502,13 @@ function renderLocalSearchResults(term) {
         li.addEventListener('dragstart', handleDragStart);
         resultsUl.appendChild(li);
     });
+    if (catalogSearch.nextOffset !== null) {
+        const li = document.createElement('li');
+        li.className = 'load-more';
+        li.textContent = 'Show more results';
+        li.addEventListener('click', () => searchCatalog(catalogSearch.query, catalogSearch.nextOffset));
+        resultsUl.appendChild(li);
+    }
 }
 
 
@@ -334,14 +542,12 @@ async function handleDrop(event) {
     const targetZoneId = event.currentTarget.id;
     try {
         if (targetZoneId === 'myRoomDropZone') {
-            await apiCall(`/room/${currentRoomData.id}/item/private`, 'POST', {
-                user_id: currentUserId, // Use tab-specific user ID
+            await roomAction('add_private_item', {
                 item: { name: droppedItem.name, category: droppedItem.category, type: droppedItem.type, item_original_id: droppedItem.id }
             });
         } else if (targetZoneId === 'publicRoomDropZone') {
             if (droppedItem.isCustomFromPrivate) {
-                await apiCall(`/room/${currentRoomData.id}/item/send_to_public`, 'POST', {
-                    user_id: currentUserId, // Tab-specific user ID
+                await roomAction('send_to_public', {
                     user_name: currentUserName, private_item_instance_id: droppedItem.uniqueInstanceId
                 });
             } else {
@@ -352,6 +558,46 @@ async function handleDrop(event) {
     } catch (error) { alert(`Error handling drop: ${error.message}`); }
 }
 
+// --- Room Actions over Socket.IO ---
+// Mutations travel over the already open socket and are answered through the ack callback,
+// so a click costs one socket message instead of an HTTP round-trip plus a socket push.
+const SOCKET_ACTION_TIMEOUT_MS = 10000;
+const RATING_BATCH_DELAY_MS = 50; // Rating clicks within this window are sent as one room_batch
+
+function socketAck(event, payload) {
+    return new Promise((resolve, reject) => {
+        socket.timeout(SOCKET_ACTION_TIMEOUT_MS).emit(event, payload, (err, response) => {
+            if (err) return reject(new Error("Server did not respond in time"));
+            if (!response || response.status >= 400) {
+                console.error(`CLIENT: ${event} error (${response ? response.status : '?'}):`, response && response.error);
+                return reject(new Error((response && response.error) || "Request failed"));
+            }
+            resolve(response);
+        });
+    });
+}
+
+function roomAction(action, fields = {}) {
+    return socketAck('room_action', { room_id: currentRoomData.id, action, user_id: currentUserId, ...fields });
+}
+
+let pendingRatingActions = [];
+let ratingBatchTimer = null;
+let ratingBatchChain = Promise.resolve(); // Batches are sent one after another so clicks apply in order
+
+function flushRatingBatch() {
+    clearTimeout(ratingBatchTimer); ratingBatchTimer = null;
+    const actions = pendingRatingActions;
+    pendingRatingActions = [];
+    if (actions.length && currentRoomData) {
+        const payload = { room_id: currentRoomData.id, user_id: currentUserId, actions };
+        ratingBatchChain = ratingBatchChain
+            .then(() => socketAck('room_batch', payload))
+            .catch(error => alert(`Failed to rate item: ${error.message}`));
+    }
+    return ratingBatchChain;
+}
+
 // --- Item Actions (Private & Public - ensure currentUserId is used) ---
 async function addCustomItemToPrivate() {
     if (!currentRoomData || !currentUserId) return;
@@ -359,26 +605,20 @@ async function addCustomItemToPrivate() {
     const itemName = inputEl.value.trim();
     if (!itemName) return;
     try {
-        await apiCall(`/room/${currentRoomData.id}/item/private`, 'POST', {
-            user_id: currentUserId, item: { name: itemName, category: 'Custom Idea', type: 'User Input' }
-        });
+        await roomAction('add_private_item', { item: { name: itemName, category: 'Custom Idea', type: 'User Input' } });
         inputEl.value = '';
     } catch (error) { alert(`Failed to add custom item: ${error.message}`); }
 }
 async function deletePrivateItem(privateItemInstanceId) {
     if (!currentRoomData || !currentUserId || !confirm("Delete this private item?")) return;
     try {
-        await apiCall(`/room/${currentRoomData.id}/item/private/delete`, 'POST', {
-            user_id: currentUserId, item_instance_id: privateItemInstanceId
-        });
+        await roomAction('delete_private_item', { item_instance_id: privateItemInstanceId });
     } catch (error) { alert(`Failed to delete private item: ${error.message}`); }
 }
 async function sendToPublic(privateItemInstanceId) {
     if (!currentRoomData || !currentUserId || !currentUserName) return;
     try {
-        await apiCall(`/room/${currentRoomData.id}/item/send_to_public`, 'POST', {
-            user_id: currentUserId, user_name: currentUserName, private_item_instance_id: privateItemInstanceId
-        });
+        await roomAction('send_to_public', { user_name: currentUserName, private_item_instance_id: privateItemInstanceId });
     } catch (error) { alert(`Failed to send item to public: ${error.message}`); }
 }
 async function addCustomItemToPublicByHost() {
@@ -387,40 +627,34 @@ async function addCustomItemToPublicByHost() {
     const itemName = inputEl.value.trim();
     if (!itemName) return;
     try {
-        await apiCall(`/room/${currentRoomData.id}/item/public/host_add`, 'POST', {
-            user_id: currentUserId, user_name: currentUserName, item: { name: itemName }
-        });
+        await roomAction('host_add_public_item', { user_name: currentUserName, item: { name: itemName } });
         inputEl.value = '';
     } catch (error) { alert(`Failed to add public item: ${error.message}`); }
 }
 async function deletePublicItem(publicItemInstanceId) {
     if (!currentRoomData || !currentUserId || !currentUserName || !confirm("Delete this public item?")) return;
     try {
-        await apiCall(`/room/${currentRoomData.id}/item/public/delete`, 'POST', {
-            user_id: currentUserId, user_name: currentUserName, item_instance_id: publicItemInstanceId
-        });
+        await roomAction('delete_public_item', { user_name: currentUserName, item_instance_id: publicItemInstanceId });
     } catch (error) { alert(`Failed to delete public item: ${error.message}`); }
 }
 
 // --- Rating Actions (ensure currentUserId is used) ---
-async function rateItem(publicItemInstanceId, emotionKey) {
+function rateItem(publicItemInstanceId, emotionKey) {
     if (!currentRoomData || !currentUserId) return;
-    try {
-        await apiCall(`/room/${currentRoomData.id}/item/public/rate`, 'POST', {
-            user_id: currentUserId, item_instance_id: publicItemInstanceId, emotion_key: emotionKey
-        });
-    } catch (error) { alert(`Failed to rate item: ${error.message}`); }
+    pendingRatingActions.push({ action: 'rate', item_instance_id: publicItemInstanceId, emotion_key: emotionKey });
+    if (!ratingBatchTimer) ratingBatchTimer = setTimeout(flushRatingBatch, RATING_BATCH_DELAY_MS);
 }
 async function finalizeRatings() {
     if (!currentRoomData || !currentUserId) return;
     try {
-        await apiCall(`/room/${currentRoomData.id}/finalize_ratings`, 'POST', { user_id: currentUserId });
+        await flushRatingBatch(); // Ratings still waiting in the batch window must land before finalizing
+        await roomAction('finalize');
     } catch (error) { alert(`Failed to finalize ratings: ${error.message}`); }
 }
 async function restartRatingProcess() {
     if (!currentRoomData || !isHost || !currentUserId || !confirm("Restart rating process for everyone?")) return;
     try {
-        await apiCall(`/room/${currentRoomData.id}/restart_ratings`, 'POST', { user_id: currentUserId });
+        await roomAction('restart');
     } catch (error) { alert(`Failed to restart ratings: ${error.message}`); }
 }
 
@@ -491,47 +725,10 @@ function renderRoomPageUI() {
         const publicRoomItemsUl = document.getElementById('publicRoomItems');
         publicRoomItemsUl.innerHTML = '';
         (currentRoomData.public_items || []).forEach(item => {
-            const li = document.createElement('li');
-            const itemMainInfo = document.createElement('div'); itemMainInfo.classList.add('item-main-info');
-            const itemDesc = document.createElement('span'); itemDesc.classList.add('item-text');
-            itemDesc.textContent = `${item.name} (${item.category || 'N/A'}) - Added by ${item.submitted_by}`;
-            itemMainInfo.appendChild(itemDesc);
-            const actionsDiv = document.createElement('div'); actionsDiv.classList.add('item-actions');
-            // Use currentUserName of this tab for submitter check
-            let canDeletePublic = isHost || (item.submitted_by && item.submitted_by.startsWith(currentUserName) && !item.submitted_by.endsWith("(Host)"));
-            if (canDeletePublic) {
-                const deletePublicBtn = document.createElement('button'); deletePublicBtn.innerHTML = '';
-                deletePublicBtn.title = "Delete public item"; deletePublicBtn.classList.add('delete-icon');
-                deletePublicBtn.onclick = () => deletePublicItem(item.unique_instance_id);
-                actionsDiv.appendChild(deletePublicBtn);
-            }
-            itemMainInfo.appendChild(actionsDiv); li.appendChild(itemMainInfo);
-            const ratingBar = document.createElement('div'); ratingBar.classList.add('emotion-rating-bar');
-            const userHasFinalized = usersDoneRating.includes(currentUserId); // Use tab-specific user ID
-            const itemRatings = item.ratings || {};
-            EMOTION_KEYS_FRONTEND.forEach(key => {
-                const emotion = EMOTION_RATINGS_FRONTEND[key];
-                const btn = document.createElement('button'); btn.innerHTML = emotion.emoji; btn.title = emotion.label;
-                btn.dataset.emotionKey = key;
-                if (itemRatings[currentUserId] === key) btn.classList.add('selected-emotion'); // Use tab-specific user ID
-                btn.disabled = userHasFinalized; btn.onclick = () => rateItem(item.unique_instance_id, key);
-                ratingBar.appendChild(btn);
-            });
-            li.appendChild(ratingBar);
-            let sumScoresDisplay = 0; let countNIADisplay = 0; let numActualRatingsDisplay = 0;
-            Object.values(itemRatings).forEach(emotionKey => {
-                if (EMOTION_RATINGS_FRONTEND[emotionKey]) {
-                    const score = EMOTION_RATINGS_FRONTEND[emotionKey].score; sumScoresDisplay += score; numActualRatingsDisplay++;
-                    if (emotionKey === 'NOT_AT_ALL') countNIADisplay++;
-                }
-            });
-            const avgScoreDisplay = numActualRatingsDisplay > 0 ? sumScoresDisplay / numActualRatingsDisplay : 0;
-            const scoreDisplayDiv = document.createElement('div'); scoreDisplayDiv.classList.add('item-scores');
-            scoreDisplayDiv.textContent = `Avg Score (approx): ${avgScoreDisplay.toFixed(2)}, NIA: ${countNIADisplay}`;
-            li.appendChild(scoreDisplayDiv);
-            publicRoomItemsUl.appendChild(li);
+            publicRoomItemsUl.appendChild(buildPublicItemLi(item));
         });
 
+        renderProvisionalRanking();
         updateRatingStatusAndFinalDecisionUI();
         console.log("CLIENT: renderRoomPageUI() completed successfully for user", currentUserId);
     } catch (error) {
@@ -540,16 +737,77 @@ function renderRoomPageUI() {
     }
 }
 
+function buildPublicItemLi(item) {
+    const li = document.createElement('li');
+    li.dataset.publicItemId = item.unique_instance_id;
+    const itemMainInfo = document.createElement('div'); itemMainInfo.classList.add('item-main-info');
+    const itemDesc = document.createElement('span'); itemDesc.classList.add('item-text');
+    itemDesc.textContent = `${item.name} (${item.category || 'N/A'}) - Added by ${item.submitted_by}`;
+    itemMainInfo.appendChild(itemDesc);
+    const actionsDiv = document.createElement('div'); actionsDiv.classList.add('item-actions');
+    // Use currentUserName of this tab for submitter check
+    let canDeletePublic = isHost || (item.submitted_by && item.submitted_by.startsWith(currentUserName) && !item.submitted_by.endsWith("(Host)"));
+    if (canDeletePublic) {
+        const deletePublicBtn = document.createElement('button'); deletePublicBtn.innerHTML = '';
+        deletePublicBtn.title = "Delete public item"; deletePublicBtn.classList.add('delete-icon');
+        deletePublicBtn.onclick = () => deletePublicItem(item.unique_instance_id);
+        actionsDiv.appendChild(deletePublicBtn);
+    }
+    itemMainInfo.appendChild(actionsDiv); li.appendChild(itemMainInfo);
+    const ratingBar = document.createElement('div'); ratingBar.classList.add('emotion-rating-bar');
+    const userHasFinalized = (currentRoomData.users_done_rating || []).includes(currentUserId); // Use tab-specific user ID
+    const itemRatings = item.ratings || {};
+    EMOTION_KEYS_FRONTEND.forEach(key => {
+        const emotion = EMOTION_RATINGS_FRONTEND[key];
+        const btn = document.createElement('button'); btn.innerHTML = emotion.emoji; btn.title = emotion.label;
+        btn.dataset.emotionKey = key;
+        if (itemRatings[currentUserId] === key) btn.classList.add('selected-emotion'); // Use tab-specific user ID
+        btn.disabled = userHasFinalized; btn.onclick = () => rateItem(item.unique_instance_id, key);
+        ratingBar.appendChild(btn);
+    });
+    li.appendChild(ratingBar);
+    let sumScoresDisplay = 0; let countNIADisplay = 0; let numActualRatingsDisplay = 0;
+    Object.values(itemRatings).forEach(emotionKey => {
+        if (EMOTION_RATINGS_FRONTEND[emotionKey]) {
+            const score = EMOTION_RATINGS_FRONTEND[emotionKey].score; sumScoresDisplay += score; numActualRatingsDisplay++;
+            if (emotionKey === 'NOT_AT_ALL') countNIADisplay++;
+        }
+    });
+    const avgScoreDisplay = numActualRatingsDisplay > 0 ? sumScoresDisplay / numActualRatingsDisplay : 0;
+    const scoreDisplayDiv = document.createElement('div'); scoreDisplayDiv.classList.add('item-scores');
+    scoreDisplayDiv.textContent = `Avg Score (approx): ${avgScoreDisplay.toFixed(2)}, NIA: ${countNIADisplay}`;
+    li.appendChild(scoreDisplayDiv);
+    return li;
+}
+
+// Rating-only patches touch a single item, so only that list entry is rebuilt
+function rerenderPublicItem(itemId) {
+    const item = (currentRoomData.public_items || []).find(i => i.unique_instance_id === itemId);
+    const existingLi = document.querySelector(`#publicRoomItems li[data-public-item-id="${itemId}"]`);
+    if (!item || !existingLi) { renderRoomPageUI(); return; }
+    existingLi.replaceWith(buildPublicItemLi(item));
+}
+
+function renderProvisionalRanking() {
+    const container = document.getElementById('provisionalRanking');
+    const listEl = document.getElementById('provisionalRankingList');
+    const ranking = currentRoomData.provisional_ranking || [];
+    const allFinalized = (currentRoomData.users_done_rating || []).length >= (currentRoomData.members || []).length;
+    container.classList.toggle('hidden', ranking.length === 0 || allFinalized);
+    listEl.innerHTML = '';
+    ranking.forEach(entry => {
+        const li = document.createElement('li');
+        li.textContent = `${entry.name} - Avg: ${entry.avg_score.toFixed(2)}, VI: ${entry.count_vi}, NIA: ${entry.count_nia} (${entry.num_ratings} rating(s))`;
+        listEl.appendChild(li);
+    });
+}
+
 function updateRatingStatusAndFinalDecisionUI() {
     if (!currentRoomData || !currentUserId) return; // Ensure context
 
     const ratingStatusEl = document.getElementById('ratingStatus');
     const finalizeButton = document.getElementById('finalizeRatingsButton');
     const allDecisionsContainerEl = document.getElementById('allDecisionsContainer');
-    const scoringDecisionTextEl = document.getElementById('scoringDecisionText');
-    const scoringDecisionDetailsEl = document.getElementById('scoringDecisionDetails');
-    const topsisDecisionTextEl = document.getElementById('topsisDecisionText');
-    const topsisDecisionDetailsEl = document.getElementById('topsisDecisionDetails');
 
     const usersWhoFinalized = currentRoomData.users_done_rating || [];
     const allMembers = currentRoomData.members || [];
@@ -564,21 +822,22 @@ function updateRatingStatusAndFinalDecisionUI() {
     } else {
         ratingStatusEl.textContent = "All users have finalized their ratings!";
         allDecisionsContainerEl.classList.remove('hidden');
+        allDecisionsContainerEl.innerHTML = '';
 
-        if (currentRoomData.final_decision_scoring && currentRoomData.final_decision_scoring.text) {
-            scoringDecisionTextEl.innerHTML = currentRoomData.final_decision_scoring.text;
-            scoringDecisionDetailsEl.innerHTML = currentRoomData.final_decision_scoring.details || "";
-        } else {
-            scoringDecisionTextEl.innerHTML = "Scoring decision not available or still calculating.";
-            scoringDecisionDetailsEl.innerHTML = "";
-        }
-
-        if (currentRoomData.final_decision_topsis && currentRoomData.final_decision_topsis.text) {
-            topsisDecisionTextEl.innerHTML = currentRoomData.final_decision_topsis.text;
-            topsisDecisionDetailsEl.innerHTML = currentRoomData.final_decision_topsis.details || "";
-        } else {
-            topsisDecisionTextEl.innerHTML = "TOPSIS decision not available or still calculating.";
-            topsisDecisionDetailsEl.innerHTML = "";
+        // One result box per decision method configured on the server, in server order
+        const decisions = currentRoomData.final_decisions || [];
+        if (decisions.length === 0) {
+            allDecisionsContainerEl.textContent = "Decisions not available or still calculating.";
         }
+        decisions.forEach(decision => {
+            const box = document.createElement('div');
+            box.classList.add('final-decision', `method-${decision.method}`);
+            const heading = document.createElement('h4'); heading.textContent = `${decision.label} Result`;
+            const textEl = document.createElement('span'); textEl.innerHTML = decision.text || `${decision.label} decision not available.`;
+            const detailsEl = document.createElement('div'); detailsEl.classList.add('final-decision-details');
+            detailsEl.innerHTML = decision.details || "";
+            box.appendChild(heading); box.appendChild(textEl); box.appendChild(detailsEl);
+            allDecisionsContainerEl.appendChild(box);
+        });
     }
 }
\ No newline at end of file
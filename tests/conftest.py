@@ -0,0 +1,42 @@
+import os
+import sys
+from concurrent.futures import Future
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+# The app module persists rooms and logs on import unless told otherwise
+os.environ['ROOM_JOURNAL_DIR'] = ''
+os.environ.setdefault('LOG_LEVEL', 'OFF')
+
+@pytest.fixture
+def server():
+    import app
+    app.app.config['BROADCAST_COALESCE_WINDOW_MS'] = 0 # Patches are emitted as soon as an action returns
+    return app
+
+@pytest.fixture
+def http(server):
+    return server.app.test_client()
+
+def create_room(http, members=('u1',)):
+    # -> room ID, with members[0] as host and the rest joined over REST
+    host, others = members[0], members[1:]
+    room_id = http.post('/api/create_room', json={'room_name': 'Test', 'user_name': host, 'user_id': host}).get_json()['room']['id']
+    for user_id in others: http.post('/api/join_room', json={'room_id': room_id, 'user_name': user_id, 'user_id': user_id})
+    return room_id
+
+def join_socket(server, room_id, user_id, wire_format='json'):
+    client = server.socketio.test_client(server.app)
+    ack = client.emit('join_sio_room', {'room_id': room_id, 'user_id': user_id, 'format': wire_format}, callback=True)
+    return client, ack
+
+class HeldJobs: # Decision jobs only finish when the test releases them
+    def __init__(self): self.jobs = []
+    def submit(self, fn, *args):
+        future = Future(); self.jobs.append((future, fn, args))
+        return future
+    def release(self):
+        future, fn, args = self.jobs.pop(0)
+        future.set_result(fn(*args))
+        return future.result()[0]
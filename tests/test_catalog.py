@@ -0,0 +1,63 @@
+import json
+import random
+from catalog import Catalog, WORD_SPLIT, load_catalog
+
+WORDS = ['sushi', 'bar', 'park', 'museum', 'art', 'cafe', 'pizza', 'hike', 'lake', 'zoo', 'bowling', 'thai', 'taco', 'spa']
+TYPES = ['Restaurant', 'Place', 'Activity']
+
+def random_catalog(rng, size=2000):
+    return [{'id': f'item{n}', 'name': ' '.join(rng.choice(WORDS) for _ in range(rng.randint(1, 3))).title(),
+             'category': rng.choice(WORDS).title(), 'type': rng.choice(TYPES)} for n in range(size)]
+
+def brute_force_search(items, query, types=()):
+    # Every term must match: 3+ characters anywhere in "name category", shorter ones as a word prefix
+    terms = [term for term in WORD_SPLIT.split(query.lower()) if term]
+    def matches(item):
+        text = f"{item['name']} {item['category']}".lower()
+        words = [word for word in WORD_SPLIT.split(text) if word]
+        return all(term in text if len(term) >= 3 else any(word.startswith(term) for word in words) for term in terms)
+    found = [item for item in items if matches(item) and (not types or item['type'] in types)]
+    if not terms: return found
+    phrase = ' '.join(terms)
+    rank = lambda item: 0 if item['name'].lower().startswith(phrase) else 1 if terms[0] in item['name'].lower() else 2
+    return sorted(found, key=rank)
+
+def test_search_matches_a_brute_force_scan():
+    rng = random.Random(15)
+    items = random_catalog(rng)
+    catalog = Catalog(items)
+    queries = ['', 'su', 'p', 'piz', 'art cafe', 'museum art', 'ake', 'z', 'thai ta', 'nothing', 'ba sp', 'arkl']
+    queries += [rng.choice(WORDS)[rng.randint(0, 2):][:rng.randint(1, 5)] for _ in range(50)]
+    for query in queries:
+        for types in ((), ('Place',), ('Restaurant', 'Activity'), ('Unknown',)):
+            expected = brute_force_search(items, query, types)
+            results, total = catalog.search(query, types, 0, len(items))
+            assert total == len(expected), (query, types)
+            assert [item['id'] for item in results] == [item['id'] for item in expected], (query, types)
+
+def test_pages_slice_one_ordered_result():
+    catalog = Catalog(random_catalog(random.Random(4)))
+    everything, total = catalog.search('a', (), 0, 10_000)
+    pages = [catalog.search('a', (), offset, 7)[0] for offset in range(0, total, 7)]
+    assert [item for page in pages for item in page] == everything
+    assert catalog.search('a', (), total, 7) == ([], total)
+
+def test_hot_queries_are_cached_and_the_cache_is_bounded():
+    catalog = Catalog(random_catalog(random.Random(5)), cache_size=3)
+    first = catalog.search('Park  ', ('Place',))
+    assert catalog.search(' park', ('Place', 'Place')) == first # Same normalized key
+    assert len(catalog.cache) == 1
+    for query in ('a', 'b', 'c', 'd'): catalog.search(query)
+    assert len(catalog.cache) == 3 and (('park',), ('Place',)) not in catalog.cache
+
+def test_malformed_and_duplicate_rows_are_skipped():
+    catalog = Catalog([{'id': 1, 'name': 'One'}, {'id': '1', 'name': 'Duplicate'}, {'name': 'No id'}, {'id': '2'}, 'junk'])
+    assert len(catalog) == 1 and catalog.get('1') == {'id': '1', 'name': 'One', 'category': '', 'type': ''}
+    assert catalog.get('2') is None
+
+def test_load_catalog_reads_json_lists_and_json_lines(tmp_path):
+    items = random_catalog(random.Random(6), size=20)
+    (tmp_path / 'items.json').write_text(json.dumps(items))
+    (tmp_path / 'items.jsonl').write_text('\n'.join(json.dumps(item) for item in items) + '\n\n')
+    for name in ('items.json', 'items.jsonl'):
+        assert load_catalog(str(tmp_path / name)).items == items
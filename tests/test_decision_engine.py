@@ -0,0 +1,98 @@
+import numpy as np
+import pytest
+import decision_engine
+
+LEVELS = np.array([5, 3, 1, -2, -5], dtype=float)
+SCORING_OPTIONS = {'scoring': {'best_score': 5, 'worst_score': -5}}
+
+def random_problem(rng, max_items=8, max_members=5):
+    num_items, num_members = rng.integers(1, max_items + 1), rng.integers(1, max_members + 1)
+    rated = rng.random((num_items, num_members)) < 0.7
+    scores = np.where(rated, rng.choice(LEVELS, (num_items, num_members)), 1.0)
+    return scores, rated
+
+def random_weights(rng, num_members):
+    weights = rng.random(num_members) + 0.1
+    return weights / weights.sum()
+
+# Straightforward per-item references for the vectorized methods
+def reference_topsis(s, w):
+    spread = s.max(axis=0) - s.min(axis=0)
+    normalized = np.where(spread > 0, (s - s.min(axis=0)) / np.where(spread > 0, spread, 1), 1.0) * w
+    d_pos = np.sqrt(((normalized - normalized.max(axis=0)) ** 2).sum(axis=1))
+    d_neg = np.sqrt(((normalized - normalized.min(axis=0)) ** 2).sum(axis=1))
+    return np.array([n / (p + n) if p + n > 0 else np.nan for p, n in zip(d_pos, d_neg)])
+
+def reference_borda(s, w):
+    num_items, num_members = s.shape
+    return np.array([sum(w[c] * (sum(s[i, c] > s[k, c] for k in range(num_items)) + 0.5 * (sum(s[i, c] == s[k, c] for k in range(num_items)) - 1))
+                         for c in range(num_members)) for i in range(num_items)])
+
+def reference_copeland(s, w):
+    num_items, num_members = s.shape
+    result = []
+    for i in range(num_items):
+        total = 0
+        for k in range(num_items):
+            if k == i: continue
+            for_i = sum(w[c] for c in range(num_members) if s[i, c] > s[k, c])
+            for_k = sum(w[c] for c in range(num_members) if s[k, c] > s[i, c])
+            total += int(for_i > for_k + 1e-12) - int(for_k > for_i + 1e-12)
+        result.append(total)
+    return np.array(result, dtype=float)
+
+def reference_vikor(s, w, v=0.5):
+    best, worst = s.max(axis=0), s.min(axis=0)
+    spread = best - worst
+    regret = np.where(spread > 0, (best - s) / np.where(spread > 0, spread, 1), 0) * w
+    group, individual = regret.sum(axis=1), regret.max(axis=1)
+    scale = lambda x: (x - x.min()) / (x.max() - x.min()) if x.max() > x.min() else 0 * x
+    return 1 - (v * scale(group) + (1 - v) * scale(individual))
+
+@pytest.mark.parametrize('method, reference', [
+    ('topsis', reference_topsis), ('borda', reference_borda), ('copeland', reference_copeland), ('vikor', reference_vikor)])
+def test_methods_match_per_item_references(method, reference):
+    rng = np.random.default_rng(1)
+    for _ in range(200):
+        scores, rated = random_problem(rng)
+        weights = random_weights(rng, scores.shape[1])
+        preferences = decision_engine.evaluate(scores, rated, weights, methods=[method])[method]
+        assert np.allclose(preferences, reference(scores, weights), equal_nan=True)
+
+def test_stacked_evaluation_matches_single_problems():
+    rng = np.random.default_rng(2)
+    problems = [random_problem(rng) for _ in range(100)]
+    scores, rated, weights, item_mask = decision_engine.stack_problems(problems)
+    stacked = decision_engine.evaluate(scores, rated, weights, item_mask=item_mask, options=SCORING_OPTIONS)
+    for idx, (scores, rated) in enumerate(problems):
+        single = decision_engine.evaluate(scores, rated, options=SCORING_OPTIONS)
+        for method, preferences in single.items():
+            assert np.allclose(stacked[method][idx, :scores.shape[0]], preferences, equal_nan=True), method
+            assert np.isnan(stacked[method][idx, scores.shape[0]:]).all() # Padding rows are never ranked
+
+def test_best_alternatives_skips_undefined_preferences():
+    assert decision_engine.best_alternatives([np.nan, 0.2, 0.7, 0.7]) == 2
+    assert list(decision_engine.best_alternatives([[np.nan, np.nan], [0.1, np.nan]])) == [-1, 0]
+
+def test_unknown_methods_and_missing_scoring_options_are_rejected():
+    with pytest.raises(ValueError): decision_engine.evaluate(np.ones((2, 2)), methods=['nope'])
+    with pytest.raises(TypeError): decision_engine.evaluate(np.ones((2, 2)), methods=['scoring'])
+
+def random_room(server, rng):
+    room = server.new_room('ROOM-TEST', 'Test', 'u0', 'u0')
+    for m in range(rng.integers(1, 7)): server.add_member_to_room(room, {'id': f'u{m}', 'name': f'u{m}'})
+    for i in range(rng.integers(1, 9)):
+        server.add_public_item(room, {'unique_instance_id': f'pub_{i}', 'name': f'Item {i}', 'category': '', 'type': ''})
+    for item_id in room['rating_matrix'].item_ids:
+        for member_id in room['rating_matrix'].member_ids:
+            room['rating_matrix'].set(item_id, member_id, int(rng.integers(0, len(server.EMOTION_KEY_BY_CODE))))
+    return room
+
+def test_engine_scoring_with_equal_weights_matches_the_scoring_method(server):
+    rng = np.random.default_rng(6)
+    for _ in range(2000):
+        room = random_room(server, rng)
+        _, scores, rated = server.room_decision_problem(room)
+        preferences = decision_engine.evaluate(scores, rated, methods=['scoring'], options=server.DECISION_ENGINE_OPTIONS)['scoring']
+        winner = room['public_items'][decision_engine.best_alternatives(preferences)]
+        assert winner['unique_instance_id'] == server.calculate_scoring_method_decision(room)['winner_id']
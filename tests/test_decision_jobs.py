@@ -0,0 +1,47 @@
+from collections import OrderedDict
+import pytest
+from conftest import HeldJobs, create_room
+
+@pytest.fixture
+def pool(server, monkeypatch):
+    pool = HeldJobs()
+    monkeypatch.setattr(server, 'get_decision_pool', lambda num_cells: pool)
+    return pool
+
+def rated_room(server, http):
+    room_id = create_room(http, ('u1',))
+    for name in ('Beach', 'Museum'):
+        http.post(f'/api/room/{room_id}/item/public/host_add', json={'user_id': 'u1', 'user_name': 'u1', 'item': {'name': name}})
+    for item, emotion_key in zip(server.room_store.get(room_id)['public_items'], ('OKAY', 'VERY_INTERESTED')):
+        server.run_room_action(room_id, 'rate', {'user_id': 'u1', 'item_instance_id': item['unique_instance_id'], 'emotion_key': emotion_key})
+    return room_id
+
+def finalize(server, room_id):
+    server.run_room_action(room_id, 'finalize', {'user_id': 'u1'})
+    return server.room_store.get(room_id)['final_decisions']
+
+def test_unchanged_ratings_reuse_cached_decisions(server, http, pool):
+    room_id = rated_room(server, http)
+    assert finalize(server, room_id) is None and len(pool.jobs) == 1
+    decisions = pool.release()
+    assert server.room_store.get(room_id)['final_decisions'] == decisions
+
+    server.run_room_action(room_id, 'restart', {'user_id': 'u1'}) # Ratings are kept
+    assert finalize(server, room_id) == decisions and pool.jobs == [] # Applied inline, no job
+
+def test_results_of_superseded_jobs_are_discarded_but_cached(server, http, pool):
+    room_id = rated_room(server, http)
+    finalize(server, room_id)
+    server.run_room_action(room_id, 'restart', {'user_id': 'u1'})
+    decisions = pool.release()
+    room = server.room_store.get(room_id)
+    assert room['final_decisions'] is None and room['decision_job'] is None
+    assert finalize(server, room_id) == decisions and pool.jobs == [] # Still right for these ratings
+
+def test_decision_cache_evicts_the_least_recently_used(server, monkeypatch):
+    monkeypatch.setattr(server, 'decision_cache', OrderedDict())
+    monkeypatch.setitem(server.app.config, 'DECISION_CACHE_SIZE', 2)
+    server.store_cached_decisions('a', ['A']); server.store_cached_decisions('b', ['B'])
+    assert server.get_cached_decisions('a') == ['A'] # Now the most recently used
+    server.store_cached_decisions('c', ['C'])
+    assert list(server.decision_cache) == ['a', 'c'] and server.get_cached_decisions('b') is None
@@ -0,0 +1,52 @@
+import re
+from conftest import create_room, join_socket
+
+SAMPLE_LINE = re.compile(r'^([a-z_]+)(\{[^}]*\})? (\S+)$')
+
+def scrape(http):
+    # -> {series: value}, checking the exposition format on the way
+    response = http.get('/metrics')
+    assert response.status_code == 200 and response.content_type.startswith('text/plain; version=0.0.4')
+    samples, declared = {}, set()
+    for line in response.get_data(as_text=True).splitlines():
+        if line.startswith('# TYPE '):
+            name, kind = line.split()[2:]
+            assert kind in ('counter', 'gauge', 'histogram'); declared.add(name)
+        elif not line.startswith('# HELP '):
+            name, labels, value = SAMPLE_LINE.match(line).groups()
+            assert re.sub(r'_(bucket|sum|count)$', '', name) in declared, line
+            samples[name + (labels or '')] = float(value)
+    return samples
+
+def delta(before, after, series):
+    return after.get(series, 0) - before.get(series, 0)
+
+def test_metrics_follow_room_actions_and_emits(server, http):
+    room_id = create_room(http, ('u1',))
+    http.post(f'/api/room/{room_id}/item/public/host_add', json={'user_id': 'u1', 'user_name': 'u1', 'item': {'name': 'Beach'}})
+    client, _ = join_socket(server, room_id, 'u1', 'compact')
+    item_id = server.room_store.get(room_id)['public_items'][0]['unique_instance_id']
+    before = scrape(http)
+    client.emit('room_action', {'room_id': room_id, 'action': 'rate', 'item_instance_id': item_id, 'emotion_key': 'OKAY'}, callback=True)
+    after = scrape(http)
+
+    assert delta(before, after, 'decider_room_action_duration_seconds_count{action="rate"}') == 1
+    assert delta(before, after, 'decider_socketio_event_duration_seconds_count{event="room_action"}') == 1
+    assert delta(before, after, 'decider_socketio_emits_total{event="room_patch",format="compact"}') == 1
+    assert delta(before, after, 'decider_room_broadcasts_total') == 1
+    assert after['decider_live_rooms'] >= 1
+    buckets = [value for series, value in after.items() if series.startswith('decider_room_action_duration_seconds_bucket{action="rate"')]
+    assert buckets == sorted(buckets) and buckets[-1] == after['decider_room_action_duration_seconds_count{action="rate"}']
+
+def test_emitted_bytes_are_exact_for_binary_and_scaled_up_for_sampled_json(server, http, monkeypatch):
+    series = 'decider_socketio_emitted_bytes_total{event="room_patch",format="%s"}'
+    payload = {'ops': [{'v': 1, 'type': 'rating_set'}]}
+    before = scrape(http)
+    server.count_emit('room_patch', 'msgpack', b'x' * 10)
+    monkeypatch.setitem(server.app.config, 'METRICS_PAYLOAD_SIZE_SAMPLE_RATE', 0.25)
+    monkeypatch.setattr(server.random, 'random', iter([0.1, 0.9, 0.9, 0.9]).__next__) # One emit in four is measured
+    for _ in range(4): server.count_emit('room_patch', 'json', payload)
+    after = scrape(http)
+    assert delta(before, after, series % 'msgpack') == 10
+    assert delta(before, after, series % 'json') == 4 * server.payload_size(payload)
+    assert delta(before, after, 'decider_socketio_payload_bytes_count{event="room_patch",format="json"}') == 1
@@ -0,0 +1,88 @@
+import numpy as np
+from rating_matrix import RatingMatrix
+
+NUM_CODES = 6
+
+def assert_matches(matrix, items, members, ratings):
+    # ratings: { (item_id, member_id): code } for the reference model
+    assert matrix.item_ids == items and matrix.member_ids == members
+    expected = np.array([[ratings.get((i, m), 0) for m in members] for i in items], dtype=np.int8).reshape(len(items), len(members))
+    assert np.array_equal(matrix.view(), expected)
+    histogram = np.zeros((len(items), NUM_CODES), dtype=np.int32)
+    for row, item_id in enumerate(items):
+        for member_id in members:
+            code = ratings.get((item_id, member_id), 0)
+            if code: histogram[row, code] += 1
+    assert np.array_equal(matrix.counts_view(), histogram)
+    assert all(matrix.item_index[i] == row for row, i in enumerate(items))
+    assert all(matrix.member_index[m] == col for col, m in enumerate(members))
+
+def test_random_changes_keep_codes_and_histograms_in_sync():
+    rng = np.random.default_rng(3)
+    matrix, items, members, ratings = RatingMatrix(NUM_CODES), [], [], {}
+    next_id = 0
+    for step in range(3000):
+        roll = rng.random()
+        if roll < 0.15 or not items:
+            item_id = f'i{next_id}'; next_id += 1
+            matrix.add_item(item_id); items.append(item_id)
+        elif roll < 0.3 or not members:
+            member_id = f'm{next_id}'; next_id += 1
+            matrix.add_member(member_id); members.append(member_id)
+        elif roll < 0.4:
+            item_id = items.pop(int(rng.integers(len(items))))
+            assert matrix.remove_item(item_id)
+            ratings = {key: code for key, code in ratings.items() if key[0] != item_id}
+        elif roll < 0.5:
+            member_id = members.pop(int(rng.integers(len(members))))
+            assert matrix.remove_member(member_id)
+            ratings = {key: code for key, code in ratings.items() if key[1] != member_id}
+        else:
+            key = (items[int(rng.integers(len(items)))], members[int(rng.integers(len(members)))])
+            code = int(rng.integers(NUM_CODES))
+            matrix.set(*key, code); ratings[key] = code
+            assert matrix.get(*key) == code
+        if step % 50 == 0: assert_matches(matrix, items, members, ratings)
+    assert_matches(matrix, items, members, ratings)
+
+def test_capacity_grows_and_shrinks_with_contents():
+    matrix = RatingMatrix(NUM_CODES)
+    for i in range(100): matrix.add_item(f'i{i}')
+    matrix.add_member('m')
+    for i in range(100): matrix.set(f'i{i}', 'm', i % NUM_CODES)
+    assert matrix.codes.shape[0] >= 100
+    for i in range(95): matrix.remove_item(f'i{i}')
+    assert matrix.codes.shape[0] < 100
+    assert_matches(matrix, [f'i{i}' for i in range(95, 100)], ['m'], {(f'i{i}', 'm'): i % NUM_CODES for i in range(95, 100)})
+
+def test_adding_existing_ids_and_removing_unknown_ones_is_a_no_op():
+    matrix = RatingMatrix(NUM_CODES)
+    assert matrix.add_item('i') == matrix.add_item('i') == 0
+    assert matrix.add_member('m') == matrix.add_member('m') == 0
+    assert not matrix.remove_item('missing') and not matrix.remove_member('missing')
+    assert matrix.num_items == matrix.num_members == 1
+
+def test_copy_is_detached_and_load_restores_by_id():
+    matrix = RatingMatrix(NUM_CODES)
+    for i in range(3): matrix.add_item(f'i{i}')
+    for m in range(2): matrix.add_member(f'm{m}')
+    matrix.set('i1', 'm0', 4); matrix.set('i2', 'm1', 2)
+    clone = matrix.copy()
+    matrix.set('i1', 'm0', 1)
+    assert clone.get('i1', 'm0') == 4 and clone.counts_view()[1, 4] == 1
+
+    restored = RatingMatrix(NUM_CODES)
+    for item_id in ('i2', 'i0', 'new'): restored.add_item(item_id)
+    restored.add_member('m1')
+    restored.load(clone.item_ids, clone.member_ids, clone.view())
+    assert restored.item_codes('i2') == {'m1': 2} and restored.item_codes('new') == {}
+    assert np.array_equal(restored.counts_view().sum(axis=0), [0, 0, 1, 0, 0, 0])
+
+def test_item_codes_and_clear():
+    matrix = RatingMatrix(NUM_CODES)
+    matrix.add_item('i')
+    for m in range(3): matrix.add_member(f'm{m}')
+    matrix.set('i', 'm0', 5); matrix.set('i', 'm2', 3); matrix.set('i', 'm2', 0)
+    assert matrix.item_codes('i') == {'m0': 5}
+    matrix.clear()
+    assert not matrix.view().any() and not matrix.counts_view().any()
@@ -0,0 +1,60 @@
+from concurrent.futures import Future
+from conftest import create_room, join_socket
+
+def add_public_items(http, room_id, names):
+    for name in names:
+        http.post(f'/api/room/{room_id}/item/public/host_add', json={'user_id': 'u1', 'user_name': 'u1', 'item': {'name': name}})
+    return [item['unique_instance_id'] for item in http.get(f'/api/room/{room_id}/state').get_json()['room']['public_items']]
+
+def rate(item_id, emotion_key='INTERESTED'):
+    return {'action': 'rate', 'item_instance_id': item_id, 'emotion_key': emotion_key}
+
+def batch(server, room_id, user_id, actions):
+    return server.run_room_batch(room_id, [dict(action, user_id=user_id, user_name=user_id) for action in actions])
+
+def assert_rolled_back(server, room_id, actions):
+    before = server.snapshot_room(server.room_store.get(room_id))
+    pending_before = list(server.room_pending_ops.get(room_id, []))
+    body, status = batch(server, room_id, 'u1', actions + [{'action': 'no_such_action'}])
+    assert status == 400 and body['failed_index'] == len(actions)
+    assert server.snapshot_room(server.room_store.get(room_id)) == before
+    assert server.room_pending_ops.get(room_id, []) == pending_before
+
+def test_failed_rating_batch_is_undone(server, http):
+    room_id = create_room(http, ('u1', 'u2'))
+    first, second = add_public_items(http, room_id, ['Beach', 'Museum'])
+    batch(server, room_id, 'u1', [rate(first, 'OKAY')])
+    assert_rolled_back(server, room_id, [rate(first), rate(second), rate(first, 'NOT_AT_ALL'), rate(second)])
+
+def test_failed_batch_with_item_changes_is_undone(server, http):
+    room_id = create_room(http, ('u1', 'u2'))
+    first, second = add_public_items(http, room_id, ['Beach', 'Museum'])
+    body, _ = batch(server, room_id, 'u1', [{'action': 'add_private_item', 'item': {'name': 'Hike'}}])
+    private_id = body['results'][0]['item']['unique_instance_id']
+    assert_rolled_back(server, room_id, [
+        rate(first), {'action': 'send_to_public', 'private_item_instance_id': private_id}, rate(second, 'OKAY'),
+        {'action': 'delete_public_item', 'item_instance_id': first}, rate(second), {'action': 'finalize'}])
+
+def test_failed_finalize_batch_is_undone(server, http):
+    room_id = create_room(http, ('u1',))
+    item_id, = add_public_items(http, room_id, ['Beach'])
+    assert_rolled_back(server, room_id, [rate(item_id), {'action': 'finalize'}])
+    assert_rolled_back(server, room_id, [{'action': 'restart'}, rate(item_id, 'OKAY')])
+
+def test_decisions_finished_inside_a_batch_wait_for_the_commit(server, http, monkeypatch):
+    class FinishedJobs: # The done callback then runs inline, while the batch is still open
+        def submit(self, fn, *args):
+            future = Future(); future.set_result(fn(*args))
+            return future
+    monkeypatch.setattr(server, 'get_decision_pool', lambda num_cells: FinishedJobs())
+    room_id = create_room(http, ('u1',))
+    item_id, = add_public_items(http, room_id, ['Beach'])
+    client, _ = join_socket(server, room_id, 'u1')
+    client.get_received()
+
+    assert_rolled_back(server, room_id, [rate(item_id), {'action': 'finalize'}])
+    assert client.get_received() == []
+    body, status = batch(server, room_id, 'u1', [rate(item_id, 'VERY_INTERESTED'), {'action': 'finalize'}])
+    assert status == 200 and server.room_store.get(room_id)['final_decisions']
+    op_types = [op['type'] for message in client.get_received() for op in message['args'][0]['ops']]
+    assert op_types[:1] == ['rating_set'] and 'rating_status' in op_types
@@ -0,0 +1,47 @@
+import threading
+from conftest import create_room, join_socket
+
+class OneWindow: # Stands in for socketio.sleep: the scheduler waits until released, flushes once, then parks
+    def __init__(self):
+        self.release, self.flushed, self.calls = threading.Event(), threading.Event(), 0
+    def __call__(self, seconds):
+        self.calls += 1
+        if self.calls > 1:
+            self.flushed.set()
+            threading.Event().wait() # Background tasks are daemon threads
+        self.release.wait(10)
+
+def rated_room(server, http, monkeypatch, names):
+    room_id = create_room(http, ('u1', 'u2'))
+    for name in names:
+        http.post(f'/api/room/{room_id}/item/public/host_add', json={'user_id': 'u1', 'user_name': 'u1', 'item': {'name': name}})
+    client, _ = join_socket(server, room_id, 'u2')
+    client.get_received()
+    window = OneWindow()
+    monkeypatch.setitem(server.app.config, 'BROADCAST_COALESCE_WINDOW_MS', 50)
+    monkeypatch.setitem(server.broadcast_scheduler, 'task', None)
+    monkeypatch.setattr(server.socketio, 'sleep', window)
+    for item in server.room_store.get(room_id)['public_items']:
+        for emotion_key in ('OKAY', 'INTERESTED'):
+            server.run_room_action(room_id, 'rate', {'user_id': 'u1', 'item_instance_id': item['unique_instance_id'], 'emotion_key': emotion_key})
+    return room_id, client, window
+
+def patch_op_types(client):
+    return [[op['type'] for op in message['args'][0]['ops']] for message in client.get_received() if message['name'] == 'room_patch']
+
+def test_a_burst_of_ratings_is_sent_as_one_patch(server, http, monkeypatch):
+    room_id, client, window = rated_room(server, http, monkeypatch, ['Beach', 'Museum', 'Zoo'])
+    assert client.get_received() == [] and room_id in server.dirty_rooms
+    window.release.set()
+    assert window.flushed.wait(10)
+    assert patch_op_types(client) == [['rating_set'] * 6 + ['provisional_ranking']]
+    assert room_id not in server.dirty_rooms
+
+def test_immediate_updates_flush_the_pending_burst(server, http, monkeypatch):
+    room_id, client, window = rated_room(server, http, monkeypatch, ['Beach', 'Museum'])
+    server.run_room_action(room_id, 'finalize', {'user_id': 'u1'})
+    op_types, = patch_op_types(client)
+    assert op_types[:4] == ['rating_set'] * 4 and 'rating_status' in op_types
+    assert room_id not in server.dirty_rooms
+    window.release.set()
+    assert window.flushed.wait(10) and client.get_received() == [] # Nothing left for the scheduler
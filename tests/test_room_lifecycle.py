@@ -0,0 +1,79 @@
+import time
+from conftest import HeldJobs, create_room, join_socket
+
+def wait_for_decisions(server, room_id, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        room = server.room_store.get(room_id)
+        if room['final_decisions'] is not None: return room['final_decisions']
+        time.sleep(0.02)
+    raise AssertionError("decisions were never computed")
+
+def test_removing_a_disconnected_member_unblocks_finalize(server, http):
+    room_id = create_room(http, ('u1', 'u2'))
+    http.post(f'/api/room/{room_id}/item/public/host_add', json={'user_id': 'u1', 'user_name': 'u1', 'item': {'name': 'Beach'}})
+    ghost, _ = join_socket(server, room_id, 'u2')
+    http.post(f'/api/room/{room_id}/finalize_ratings', json={'user_id': 'u1'})
+    assert server.room_store.get(room_id)['final_decisions'] is None
+
+    ghost.disconnect()
+    server.pending_member_leaves[room_id, 'u2'] = time.monotonic() # Grace period is over
+    server.sweep_rooms()
+    room = server.room_store.get(room_id)
+    assert [m['id'] for m in room['members']] == room['users_done_rating'] == ['u1']
+    assert [d['method'] for d in wait_for_decisions(server, room_id)] == server.app.config['DECISION_METHODS']
+
+def test_a_finalized_member_leaving_discards_decisions_that_count_them(server, http, monkeypatch):
+    pool = HeldJobs()
+    monkeypatch.setattr(server, 'get_decision_pool', lambda num_cells: pool)
+    room_id = create_room(http, ('u1', 'u2'))
+    for name in ('Beach', 'Museum'):
+        http.post(f'/api/room/{room_id}/item/public/host_add', json={'user_id': 'u1', 'user_name': 'u1', 'item': {'name': name}})
+    beach, museum = [item['unique_instance_id'] for item in server.room_store.get(room_id)['public_items']]
+    for user_id, ratings in (('u1', {beach: 'OKAY', museum: 'NOT_INTERESTED'}), ('u2', {beach: 'NOT_AT_ALL', museum: 'VERY_INTERESTED'})):
+        for item_id, emotion_key in ratings.items():
+            server.run_room_action(room_id, 'rate', {'user_id': user_id, 'item_instance_id': item_id, 'emotion_key': emotion_key})
+        server.run_room_action(room_id, 'finalize', {'user_id': user_id})
+    assert len(pool.jobs) == 1
+
+    server.member_leave_room(room_id, 'u2')
+    assert len(pool.jobs) == 2 # Recomputed without u2's column
+    stale = pool.release()
+    assert server.room_store.get(room_id)['final_decisions'] is None
+    fresh = pool.release()
+    assert server.room_store.get(room_id)['final_decisions'] == fresh != stale
+    expected, _ = server.run_decision_job(server.decision_job_snapshot(server.room_store.get(room_id)), server.app.config['DECISION_METHODS'])
+    assert fresh == expected
+
+def test_leaving_as_a_non_member_records_nothing(server, http):
+    room_id = create_room(http, ('u1',))
+    version = server.room_store.get(room_id)['version']
+    assert http.post(f'/api/room/{room_id}/leave', json={'user_id': 'stranger'}).status_code == 200
+    assert server.room_store.get(room_id)['version'] == version
+    assert not server.room_pending_ops.get(room_id)
+
+def test_private_ops_reach_only_their_owner(server, http):
+    room_id = create_room(http, ('u1', 'u2'))
+    owner, _ = join_socket(server, room_id, 'u1', 'compact')
+    other, _ = join_socket(server, room_id, 'u2', 'json')
+    owner.get_received(); other.get_received()
+    server.member_sockets.clear() # Routing must not depend on this worker's socket bookkeeping
+
+    owner.emit('room_action', {'room_id': room_id, 'action': 'add_private_item', 'item': {'name': 'Secret'}}, callback=True)
+    owner_events, other_events = owner.get_received(), other.get_received()
+    assert [m['name'] for m in owner_events] == ['room_private_ops', 'room_patch']
+    own_op, = owner_events[0]['args'][0]['ops']
+    assert own_op['type'] == 'private_item_added' and own_op['item'][1] == 'Secret'
+    assert owner_events[1]['args'][0]['ops'][0] == other_events[-1]['args'][0]['ops'][0] == {'v': own_op['v'], 'type': 'private_hidden'}
+    assert [m['name'] for m in other_events] == ['room_patch'] and 'Secret' not in str(other_events)
+
+def test_room_created_is_journaled_once_the_room_exists(server, http, monkeypatch):
+    taken_id = create_room(http, ('u1',))
+    ids = iter([taken_id[len('ROOM-'):], 'FRESH1'])
+    monkeypatch.setattr(server, 'generate_unique_id', lambda prefix='': prefix + next(ids))
+    records = []
+    monkeypatch.setattr(server, 'journal_record', lambda record: records.append((record, server.room_store.get(record['room_id']))))
+    room = http.post('/api/create_room', json={'room_name': 'Second', 'user_name': 'u2', 'user_id': 'u2'}).get_json()['room']
+    assert room['id'] == 'ROOM-FRESH1'
+    (record, stored), = records
+    assert record['type'] == 'room_created' and record['room_id'] == 'ROOM-FRESH1' and stored is not None
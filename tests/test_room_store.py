@@ -0,0 +1,77 @@
+import threading
+import time
+import pytest
+from room_store import MemoryRoomStore, SQLiteRoomStore, create_room_store
+
+def new_room(room_id):
+    return {'id': room_id, 'counter': 0, 'log': []}
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def store(request, tmp_path):
+    if request.param == 'memory': return MemoryRoomStore()
+    return SQLiteRoomStore(str(tmp_path), dict, dict, num_shards=2)
+
+def test_concurrent_updates_are_not_lost(store):
+    # 12 threads hammering 3 rooms: every read-modify-write must see the previous one
+    room_ids = ['ROOM-A', 'ROOM-B', 'ROOM-C']
+    for room_id in room_ids: assert store.create(new_room(room_id))
+
+    def hammer(worker):
+        for n in range(100):
+            room_id = room_ids[(worker + n) % len(room_ids)]
+            with store.update(room_id) as room:
+                counter = room['counter']
+                time.sleep(0) # Let another thread in between the read and the write
+                room['counter'] = counter + 1
+                room['log'].append(worker)
+    threads = [threading.Thread(target=hammer, args=(worker,)) for worker in range(12)]
+    for thread in threads: thread.start()
+    for thread in threads: thread.join()
+    rooms = [store.get(room_id) for room_id in room_ids]
+    assert [room['counter'] for room in rooms] == [400, 400, 400]
+    assert all(len(room['log']) == room['counter'] for room in rooms)
+
+def test_create_refuses_taken_ids_and_create_locked_holds_the_room(store):
+    assert store.create(new_room('ROOM-A')) and not store.create(new_room('ROOM-A'))
+    entered = threading.Event()
+    def update_new_room():
+        with store.update('ROOM-B') as room: room['log'].append('other')
+        entered.set()
+    with store.create_locked(new_room('ROOM-B')) as created:
+        assert created
+        other = threading.Thread(target=update_new_room); other.start()
+        assert not entered.wait(0.2) # Blocked until the creator is done
+        with store.update('ROOM-B') as room: room['log'].append('creator')
+    other.join()
+    assert store.get('ROOM-B')['log'] == ['creator', 'other']
+    with store.create_locked(new_room('ROOM-A')) as created: assert not created
+
+def test_nested_updates_share_the_room_and_deletes_stick(store):
+    store.create(new_room('ROOM-A'))
+    with store.update('ROOM-A') as outer:
+        outer['counter'] = 1
+        with store.update('ROOM-A') as inner: inner['counter'] += 1
+    assert store.get('ROOM-A')['counter'] == 2
+    with store.update('ROOM-A') as room:
+        room['counter'] = 99
+        store.delete('ROOM-A')
+    assert store.get('ROOM-A') is None and len(store) == 0
+    with store.update('ROOM-A') as room: assert room is None
+
+def test_idle_and_least_recently_updated_rooms(store):
+    for room_id in ('ROOM-A', 'ROOM-B', 'ROOM-C'):
+        store.create(new_room(room_id)); time.sleep(0.01)
+    cutoff = time.time()
+    time.sleep(0.01)
+    with store.update('ROOM-A'): pass
+    assert sorted(store.idle_room_ids(cutoff)) == ['ROOM-B', 'ROOM-C']
+    assert store.lru_room_ids(2) == ['ROOM-B', 'ROOM-C']
+    assert sorted(store.room_ids()) == sorted(room_id for room_id, _ in store.items()) == ['ROOM-A', 'ROOM-B', 'ROOM-C']
+
+def test_sqlite_store_is_shared_between_instances(tmp_path):
+    url = f'sqlite:///{tmp_path}'
+    first, second = (create_room_store(url, dict, dict, num_shards=3) for _ in range(2))
+    first.create(new_room('ROOM-A'))
+    with second.update('ROOM-A') as room: room['counter'] = 5
+    assert first.get('ROOM-A')['counter'] == 5
+    with pytest.raises(ValueError): create_room_store('redis://nowhere', dict, dict)
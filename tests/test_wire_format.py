@@ -0,0 +1,69 @@
+import json
+import os
+import shutil
+import subprocess
+import pytest
+from conftest import ROOT, create_room, join_socket
+
+# Runs the browser client's Wire Format section (static/script.js) in node on payloads the server really emits,
+# and checks that compact snapshots and patches expand to exactly what the verbose 'json' format carries.
+
+NODE = shutil.which('node')
+
+DECODE_SCRIPT = """
+const window = {};
+%s
+const payloads = JSON.parse(require('fs').readFileSync(0, 'utf8'));
+process.stdout.write(JSON.stringify(payloads.map(decodeRoomPayload)));
+"""
+
+def client_wire_format_section():
+    with open(os.path.join(ROOT, 'static', 'script.js'), encoding='utf-8') as f: source = f.read()
+    start, end = source.index('// --- Wire Format ---'), source.index('// --- Socket.IO Connection ---')
+    return source[start:end]
+
+def decode_in_browser_client(payloads):
+    result = subprocess.run([NODE, '-e', DECODE_SCRIPT % client_wire_format_section()], input=json.dumps(payloads),
+                            capture_output=True, text=True, timeout=30)
+    assert result.returncode == 0, result.stderr
+    return json.loads(result.stdout)
+
+def without_nulls(value):
+    # Compact items have no way to tell a null field from a missing one, and the client treats both alike
+    if isinstance(value, dict): return {k: without_nulls(v) for k, v in value.items() if v is not None}
+    if isinstance(value, list): return [without_nulls(v) for v in value]
+    return value
+
+def received(client, event):
+    return [message['args'][0] for message in client.get_received() if message['name'] == event]
+
+@pytest.mark.skipif(NODE is None, reason="node is not installed")
+def test_compact_payloads_expand_to_the_json_format(server, http):
+    room_id = create_room(http, ('u1', 'u2'))
+    verbose, _ = join_socket(server, room_id, 'u1', 'json')
+    compact, ack = join_socket(server, room_id, 'u1', 'compact')
+    assert ack == {'format': 'compact'}
+    snapshots = [received(verbose, 'room_state_updated')[0], received(compact, 'room_state_updated')[0]]
+
+    item = compact.emit('room_action', {'room_id': room_id, 'action': 'add_private_item', 'item': {'name': 'Picnic'}}, callback=True)['item']
+    compact.emit('room_action', {'room_id': room_id, 'action': 'send_to_public', 'user_name': 'u1', 'private_item_instance_id': item['unique_instance_id']}, callback=True)
+    public_id = http.get(f'/api/room/{room_id}/state').get_json()['room']['public_items'][0]['unique_instance_id']
+    compact.emit('room_action', {'room_id': room_id, 'action': 'rate', 'item_instance_id': public_id, 'emotion_key': 'INTERESTED'}, callback=True)
+    patches = [received(verbose, 'room_patch'), received(compact, 'room_patch')]
+    assert patches[0] and len(patches[0]) == len(patches[1])
+
+    resync = http.get(f'/api/room/{room_id}/state?format=compact&user_id=u1').get_json()
+    decoded = decode_in_browser_client([snapshots[1]] + patches[1] + [resync])
+    assert without_nulls(decoded[0]) == without_nulls(snapshots[0])
+    assert without_nulls(decoded[1:-1]) == without_nulls(patches[0])
+    assert without_nulls(decoded[-1]) == without_nulls(http.get(f'/api/room/{room_id}/state?user_id=u1').get_json())
+
+def test_msgpack_is_only_offered_when_enabled(server, http, monkeypatch):
+    room_id = create_room(http, ('u1',))
+    monkeypatch.setitem(server.app.config, 'WIRE_FORMAT_MSGPACK', False)
+    assert b'msgpack.min.js' not in http.get('/').data # The client then asks for compact
+    _, ack = join_socket(server, room_id, 'u1', 'msgpack')
+    assert ack == {'format': 'compact'}
+    monkeypatch.setattr(server, 'WIRE_FORMATS', server.WIRE_FORMATS + ('msgpack',))
+    monkeypatch.setitem(server.app.config, 'WIRE_FORMAT_MSGPACK', True)
+    assert b'msgpack.min.js' in http.get('/').data